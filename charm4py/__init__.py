@@ -27,9 +27,10 @@ if os.environ.get('CHARM_NOLOAD', '0') == '0':
     Future = charm.createFuture
 
     from .entry_method import when, coro, coro_ext, coro as threaded
+    from .threads import Charm4PyTimeoutError
 
     from .chare import Chare, Group, Array, ArrayMap
-    from .channel import Channel
+    from .channel import Channel, ChannelGroup
 
     def checkCharmStarted():
         if not charm.started:
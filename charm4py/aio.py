@@ -0,0 +1,153 @@
+# Integration of Charm4py with asyncio (requires Python >= 3.5).
+#
+# Each PE has its own asyncio event loop, which is not run forever (that would
+# block the Charm++ scheduler). Instead, the loop is stepped (one iteration that
+# doesn't block) when an 'async def' entry method starts, when a Charm4py
+# object that a coroutine awaits becomes ready, and periodically (using
+# charm.scheduleCallableAfter) while there are pending asyncio tasks on the PE,
+# so that asyncio I/O and timers make progress between messages.
+import asyncio
+import sys
+from .charm import charm
+
+
+driver = None  # AsyncioDriver of this PE
+
+
+class AsyncioDriver(object):
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        # asyncio.get_event_loop() on this PE returns the PE's loop
+        asyncio.set_event_loop(self.loop)
+        self.threadMgr = charm.threadMgr
+        self.poll_interval = charm.options.asyncio_poll_interval
+        self.polling = False  # True if a call to poll() is scheduled
+
+    def step(self):
+        """ Run one iteration of the event loop. This doesn't block waiting
+            for I/O, it only runs the callbacks and tasks that are ready """
+        loop = self.loop
+        if loop.is_running():
+            # this can happen if a coroutine running on the loop triggers
+            # (locally) the condition that another coroutine is waiting for.
+            # The loop will resume the waiter in its next iteration
+            return
+        threadMgr = self.threadMgr
+        threadMgr.in_asyncio = True
+        try:
+            loop.call_soon(loop.stop)
+            loop.run_forever()
+        except SystemExit:
+            exit_code = sys.exc_info()[1].code
+            if exit_code is None:
+                exit_code = 0
+            if not isinstance(exit_code, int):
+                print(exit_code)
+                exit_code = 1
+            charm.exit(exit_code)
+        finally:
+            threadMgr.in_asyncio = False
+        if not self.polling and len(all_tasks(loop)) > 0:
+            self.polling = True
+            charm.scheduleCallableAfter(self.poll, self.poll_interval)
+
+    def poll(self):
+        self.polling = False
+        self.step()
+
+
+if sys.version_info >= (3, 7, 0):
+    all_tasks = asyncio.all_tasks
+    import contextvars
+    # chare of the 'async def' entry method that a task is running
+    running_chare = contextvars.ContextVar('running_chare', default=None)
+else:
+    def all_tasks(loop):
+        return {t for t in asyncio.Task.all_tasks(loop) if not t.done()}
+    running_chare = None
+
+
+def runningChare():
+    """ Returns the chare whose 'async def' entry method is running (None if
+        unknown) """
+    if running_chare is None:
+        return None
+    return running_chare.get()
+
+
+def getDriver():
+    global driver
+    if driver is None:
+        driver = AsyncioDriver()
+    return driver
+
+
+class AsyncioWaiter(object):
+    """ Used in place of a LocalFuture by coroutines running on the asyncio
+        loop, to wait for Charm4py futures and channels to become ready """
+
+    def __init__(self):
+        self.driver = getDriver()
+        self.fut = self.driver.loop.create_future()
+
+    def send(self, result=None):
+        if not self.fut.done():  # the waiting task could have been cancelled
+            self.fut.set_result(result)
+            self.driver.step()
+
+
+async def waitFuture(f):
+    if not f.gotvalues:
+        waiter = AsyncioWaiter()
+        f.blocked = 3
+        f.waiter = waiter
+        await waiter.fut
+    if f.error is not None:
+        raise f.error
+    if f.nvals == 1:
+        return f.values[0]
+    return f.values
+
+
+async def channelRecv(ch):
+    if not ch.ready():
+        waiter = AsyncioWaiter()
+        ch.waitReady(waiter)
+        await waiter.fut
+    return ch.recv()
+
+
+async def runEntryMethod(em, obj, header, args):
+    if running_chare is not None:
+        running_chare.set(obj)
+    try:
+        ret = await getattr(obj, em.name)(*args)
+    except Exception as e:
+        try:
+            charm.process_em_exc(e, obj, header)
+        except Exception:
+            # this is what would happen with an exception in a regular
+            # entry method (the exception is not handled by the application)
+            charm.handleGeneralError()
+        return
+    finally:
+        obj._numthreads -= 1
+        if charm.options.auto_flush_wait_queues and len(obj._conds) > 0:
+            obj.__flush_wait_queues__()
+        if obj._numthreads == 0 and obj._drain_actions is not None:
+            obj.__drained__()
+    if b'block' in header:
+        em.sendReturnValue(obj, header, ret)
+
+
+def startEntryMethod(em, obj, header, args):
+    """ Start running an 'async def' entry method as a task on the asyncio
+        event loop of this PE. The task runs until it first awaits before
+        this returns """
+    d = getDriver()
+    # like coroutines, a chare can't migrate while it has running async
+    # entry methods (AtSync and migrate are delayed until they finish)
+    obj._numthreads += 1
+    d.loop.create_task(runEntryMethod(em, obj, header, args))
+    d.step()
@@ -1,30 +1,81 @@
+from .charm import charm
+from .charm import Charm4PyError
 from .threads import LocalFuture
+from collections import defaultdict
+try:
+    import numpy
+except ImportError:
+    # this is to avoid numpy dependency
+    class NumpyDummy:
+        ndarray = None
+    numpy = NumpyDummy()
 
 
 class Channel(object):
 
-    def __new__(cls, chare, remote, local=None):
-        if not hasattr(chare, '__channels__'):
-            chare.__initchannelattrs__()
-        ch = chare.__findPendingChannel__(remote, False)
-        if ch is None:
-            local_port = len(chare.__channels__)
-            ch = _Channel(local_port, remote, True)
-            chare.__channels__.append(ch)
-            chare.__pendingChannels__.append(ch)
-        else:
-            ch.setEstablished()
+    def __new__(cls, chare, remote, local=None, window=None):
+        if window is None:
+            window = charm.options.channel_window
         if local is None:
-            # if local is None, we assume local endpoint is the individual chare
-            if hasattr(chare, 'thisIndex'):
-                local = chare.thisProxy[chare.thisIndex]
-            else:
-                local = chare.thisProxy
-        remote._channelConnect__(local, ch.port)
+            local = localProxy(chare)
+        ch = openChannel(chare, remote, window)
+        remote._channelConnect__(local, ch.port, window)
         return ch
 
+    @staticmethod
+    def open_many(chare, remotes, local=None, window=None, pes=None):
+        """ Establish channels between *chare* and each of the chares in
+            *remotes*, returning the list of channels. Handshakes with
+            remotes on the same PE are sent in one message. *pes* optionally
+            gives the PE where each remote is expected to be (used for array
+            elements, whose location is not known otherwise) """
+        if window is None:
+            window = charm.options.channel_window
+        if local is None:
+            local = localProxy(chare)
+        channels = []
+        batches = defaultdict(list)  # PE -> list of (remote, local port)
+        for i, remote in enumerate(remotes):
+            ch = openChannel(chare, remote, window)
+            channels.append(ch)
+            pe = remotePe(remote)
+            if pe is None and pes is not None:
+                pe = pes[i]
+            if pe is None:
+                remote._channelConnect__(local, ch.port, window)
+            else:
+                batches[pe].append((remote, ch.port))
+        for pe, conns in batches.items():
+            if len(conns) == 1:
+                remote, port = conns[0]
+                remote._channelConnect__(local, port, window)
+            else:
+                charm.thisProxy[pe]._channel_connect_many(local, window, conns)
+        return channels
+
+
+def openChannel(chare, remote, window):
+    if not hasattr(chare, '__channels__'):
+        chare.__initchannelattrs__()
+    ch = chare.__findPendingChannel__(remote, False)
+    if ch is None:
+        local_port = len(chare.__channels__)
+        ch = _Channel(local_port, remote, True)
+        chare.__channels__.append(ch)
+        chare.__addPendingChannel__(ch)
+    else:
+        ch.setEstablished()
+    ch.setWindow(window)
+    return ch
+
+
+def localProxy(chare):
+    # the local endpoint is the individual chare
+    if hasattr(chare, 'thisIndex'):
+        return chare.thisProxy[chare.thisIndex]
+    else:
+        return chare.thisProxy
 
-CHAN_BUF_SIZE = 40000
 
 class _Channel(object):
 
@@ -32,14 +83,48 @@ class _Channel(object):
         self.port = port
         self.remote = remote
         self.remote_port = -1
+        # sequence numbers are not bounded, so that any number of messages
+        # can be buffered at the receiver if flow control is disabled
         self.send_seqno = 0
         self.recv_seqno = 0
         self.data = {}
         self.recv_fut = None  # this future is used to block on self.recv()
         self.wait_ready = None  # this future is used to block on ready (by charm.iwait())
+        self.recv_ep = None
         self.established = False
         self.established_fut = None
         self.locally_initiated = locally_initiated
+        # flow control (disabled if window is 0)
+        self.window = 0  # max number of sent messages not yet received by the remote
+        self.credits = 0  # number of messages that can be sent before blocking
+        self.credit_fut = None  # this future is used to block on self.send() waiting for credits
+        self.remote_window = 0  # window of the remote endpoint
+        self.ack_batch = 0  # credits are returned to the remote in batches of this size
+        self.consumed = 0  # number of messages received for which credits haven't been returned
+        # receive buffers (see recv_into)
+        self.recv_bufs = None  # arrays that the message being waited for is copied into
+        self.buf_pool = None  # (shape, dtype) -> list of free persistent buffers (None if not in use)
+        self.pooled = None  # seqno -> list of (key, buffer) taken from the pool for buffered messages
+
+    def setWindow(self, window):
+        self.window = self.credits = window
+
+    def setRemotePort(self, remote_port, remote_window):
+        self.remote_port = remote_port
+        self.remote_window = remote_window
+        if remote_window > 0:
+            self.ack_batch = max(remote_window // 4, 1)
+            if self.consumed >= self.ack_batch:
+                self.sendCredits()
+
+    def sendCredits(self):
+        self.remote._channelCredits__(self.remote_port, self.consumed)
+        self.consumed = 0
+
+    def addCredits(self, n):
+        self.credits += n
+        if self.credit_fut is not None:
+            self.credit_fut.send()
 
     def setEstablished(self):
         self.established = True
@@ -52,20 +137,265 @@ class _Channel(object):
     def waitReady(self, f):
         self.wait_ready = f
 
+    def cancelWaitReady(self, f):
+        if self.wait_ready is f:
+            self.wait_ready = None
+
     def send(self, *msg):
+        self.waitSend()
+        if self.recv_ep is None:
+            self.recv_ep = self.remote._channelRecv__.ep
+        # the header tells the receiver that arrays in the message can be
+        # copied into the buffers of the channel
+        sendToChare(self.remote, self.recv_ep, {b'chan': 1},
+                    [self.remote_port, self.send_seqno] + list(msg))
+        self.send_seqno += 1
+
+    def waitSend(self):
+        """ Suspend the caller until a message can be sent """
         if not self.established:
             self.established_fut = LocalFuture()
             self.established_fut.get()
             self.setEstablished()
-        self.remote._channelRecv__(self.remote_port, self.send_seqno, *msg)
-        self.send_seqno = (self.send_seqno + 1) % CHAN_BUF_SIZE
+        if self.window > 0:
+            if self.credits == 0:
+                # wait until the remote has received enough messages
+                self.credit_fut = LocalFuture()
+                self.credit_fut.get()
+                self.credit_fut = None
+            self.credits -= 1
+
+    def __await__(self):
+        """ Receive a message from an asyncio coroutine, with 'await channel' """
+        from . import aio
+        return aio.channelRecv(self).__await__()
+
+    def getRecvBuffer(self, seqno, i, nargs, shape, dt):
+        """ Called when unpacking message *seqno* (with *nargs* arguments) from
+            the network, to get the array that argument *i* (a direct-copy
+            NumPy array) is copied into. Returns None if the array has to be
+            allocated as usual """
+        bufs = self.recv_bufs
+        if bufs is not None and seqno == self.recv_seqno:
+            # recv_into is waiting for this message (if the number of arrays
+            # doesn't match, it raises an error without modifying them)
+            if len(bufs) == nargs:
+                out = bufs[i]
+                if out is not None and out.shape == shape and out.dtype == dt:
+                    return out
+        pool = self.buf_pool
+        if pool is not None:
+            # the message is buffered until recv_into is called. Use a
+            # persistent buffer, which is returned to the pool when recv_into
+            # copies it into the array of the caller
+            key = (shape, dt)
+            free = pool.get(key)
+            if free:
+                out = free.pop()
+            else:
+                out = numpy.empty(shape, dtype=dt)
+            self.pooled.setdefault(seqno, []).append((key, out))
+            return out
+        return None
+
+    def recv(self, timeout=None):
+        ret = self._recv(timeout)
+        if self.pooled:
+            # the caller owns any persistent buffers in the message
+            self.pooled.pop(self.recv_seqno - 1, None)
+        return ret
+
+    def recv_into(self, out, timeout=None):
+        """ Receive a message, copying the arrays in it into the given
+            preallocated arrays. *out* is an array, or a list with one array
+            (or None) per argument of the message """
+        multi = isinstance(out, (list, tuple))
+        if multi:
+            bufs = out
+        else:
+            bufs = (out,)
+        if self.buf_pool is None:
+            self.buf_pool = {}
+            self.pooled = {}
+        if self.recv_seqno in self.data:
+            msg = self._recv(timeout)
+        else:
+            # arrays in the message are copied into bufs when it is unpacked
+            self.recv_bufs = bufs
+            try:
+                msg = self._recv(timeout)
+            finally:
+                self.recv_bufs = None
+        if isinstance(msg, tuple):
+            args = list(msg)
+        else:
+            args = [msg]
+        if len(args) != len(bufs):
+            # the message is discarded
+            pooled = self.pooled.pop(self.recv_seqno - 1, ())
+            for key, buf in pooled:
+                self.buf_pool.setdefault(key, []).append(buf)
+            raise Charm4PyError('recv_into: received a message with ' + str(len(args)) +
+                                ' arguments, but ' + str(len(bufs)) + ' output arrays were '
+                                'given (out must have one entry per argument of the message)')
+        for i, buf in enumerate(bufs):
+            if buf is not None and args[i] is not buf:
+                numpy.copyto(buf, args[i])
+                args[i] = buf
+        pooled = self.pooled.pop(self.recv_seqno - 1, None)
+        if pooled is not None:
+            pool = self.buf_pool
+            for key, buf in pooled:
+                # buffers of arguments not copied (no array given in out)
+                # are returned to the caller
+                if not any(buf is arg for arg in args):
+                    pool.setdefault(key, []).append(buf)
+        if len(args) > 1:
+            return tuple(args)
+        return args[0]
 
-    def recv(self):
+    def _recv(self, timeout):
         if self.recv_seqno in self.data:
             ret = self.data.pop(self.recv_seqno)
         else:
             self.recv_fut = LocalFuture()
-            ret = self.recv_fut.get()
-            self.recv_fut = None
-        self.recv_seqno = (self.recv_seqno + 1) % CHAN_BUF_SIZE
+            try:
+                ret = self.recv_fut.get(timeout)
+            finally:
+                # if timed out, a message received later is buffered and
+                # returned by the next call to recv
+                self.recv_fut = None
+        self.recv_seqno += 1
+        if self.remote_window > 0:
+            self.consumed += 1
+            if self.consumed >= self.ack_batch:
+                self.sendCredits()
         return ret
+
+
+# max number of PEs that a message can be multicast to at once
+MAX_MULTICAST = 99
+
+
+class ChannelGroup(object):
+
+    def __init__(self, channels):
+        self.channels = list(channels)
+        # the message can be multicast if the remotes are elements of the
+        # same array or group
+        remotes = [ch.remote for ch in self.channels]
+        self.aid = self.gid = None
+        if all(hasattr(r, 'aid') for r in remotes):
+            if len(set([r.aid for r in remotes])) == 1:
+                self.aid = remotes[0].aid
+        elif all(hasattr(r, 'gid') for r in remotes):
+            if len(set([r.gid for r in remotes])) == 1:
+                self.gid = remotes[0].gid
+        self.multicast = (self.aid is not None or self.gid is not None) and \
+                         len(set([r.elemIdx for r in remotes])) == len(remotes) > 1
+        self.recv_ep = None
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def send(self, *msg):
+        if not self.multicast:
+            for ch in self.channels:
+                ch.send(*msg)
+            return
+        channels = self.channels
+        dests = {}  # index of remote -> (remote port, seqno of message)
+        for ch in channels:
+            ch.waitSend()
+        for ch in channels:
+            dests[ch.remote.elemIdx] = (ch.remote_port, ch.send_seqno)
+            ch.send_seqno += 1
+        if self.recv_ep is None:
+            self.recv_ep = channels[0].remote._channelRecvMulti__.ep
+        ep = self.recv_ep
+        args = [dests] + list(msg)
+        remote_idxs = []
+        for ch in channels:
+            if isLocal(ch.remote):
+                # the local destination receives the message by reference
+                sendToChare(ch.remote, ep, {b'chan': 2}, args)
+            else:
+                remote_idxs.append(ch.remote.elemIdx)
+        if len(remote_idxs) == 0:
+            return
+        if self.aid is not None:
+            msg = charm.packMsg(None, args, {b'chan': 2})
+            charm.lib.CkArraySendMulti(self.aid, remote_idxs, ep, msg)
+        else:
+            for i in range(0, len(remote_idxs), MAX_MULTICAST):
+                msg = charm.packMsg(None, args, {b'chan': 2})
+                charm.lib.CkGroupSendMulti(self.gid, remote_idxs[i:i+MAX_MULTICAST], ep, msg)
+
+    def recv(self, timeout=None):
+        """ Receive the next message from every channel. Returns the list of
+            messages (in the order of the channels) """
+        if timeout is not None:
+            charm.wait(self.channels, timeout)
+        return [ch.recv() for ch in self.channels]
+
+    def iwait(self, timeout=None):
+        """ Iteratively yield the channels as they become ready to receive """
+        return charm.iwait(self.channels, timeout)
+
+
+def localObject(proxy):
+    """ Returns the chare referenced by *proxy* if it is on this PE,
+        otherwise None """
+    if hasattr(proxy, 'aid'):
+        return charm.arrays[proxy.aid].get(proxy.elemIdx)
+    elif hasattr(proxy, 'gid'):
+        if proxy.elemIdx == charm._myPe:
+            return charm.groups.get(proxy.gid)
+        return None
+    else:
+        return charm.chares.get(proxy.cid)
+
+
+def remotePe(proxy):
+    """ Returns the PE of the chare referenced by *proxy* if it is known,
+        otherwise None """
+    if hasattr(proxy, 'aid'):
+        if proxy.elemIdx in charm.arrays[proxy.aid]:
+            return charm._myPe
+        return None  # array elements can be anywhere
+    elif hasattr(proxy, 'gid'):
+        return proxy.elemIdx
+    else:
+        return proxy.cid[0]
+
+
+def isLocal(proxy):
+    """ Returns True if local messages can be sent to the chare referenced
+        by *proxy* """
+    return charm.options.local_msg_optim and localObject(proxy) is not None
+
+
+def sendToChare(proxy, ep, header, args):
+    """ Send a message to the individual chare referenced by *proxy* """
+    destObj = None
+    local_msg_optim = charm.options.local_msg_optim
+    if hasattr(proxy, 'aid'):
+        if local_msg_optim:
+            array = charm.arrays[proxy.aid]
+            if proxy.elemIdx in array:
+                destObj = array[proxy.elemIdx]
+        msg = charm.packMsg(destObj, args, header)
+        charm.CkArraySend(proxy.aid, proxy.elemIdx, ep, msg)
+    elif hasattr(proxy, 'gid'):
+        if local_msg_optim and proxy.elemIdx == charm._myPe:
+            destObj = charm.groups[proxy.gid]
+        msg = charm.packMsg(destObj, args, header)
+        charm.CkGroupSend(proxy.gid, proxy.elemIdx, ep, msg)
+    else:
+        if local_msg_optim and proxy.cid in charm.chares:
+            destObj = charm.chares[proxy.cid]
+        msg = charm.packMsg(destObj, args, header)
+        charm.CkChareSend(proxy.cid, ep, msg)
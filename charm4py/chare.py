@@ -1,4 +1,6 @@
 from . import wait
+from . import lb
+from .threads import CollectiveFuture
 import sys
 from greenlet import getcurrent
 from collections import defaultdict
@@ -42,12 +44,17 @@ class Chare(object):
         self._local = [i for i in range(1, Options.local_msg_buf_size + 1)]
         self._local[-1] = None
         self._local_free_head = 0
-        # stores condition objects which group all elements waiting on same condition string
-        self._active_grp_conds = {}
-        # linked list of active wait condition objects
-        self._cond_next = None
-        self._cond_last = self
+        # active wait condition objects, which group all elements waiting on the
+        # same condition (condition string -> condition object)
+        self._conds = {}
+        self._cond_seq = 0  # creation number of the next condition (they are checked in this order)
+        # attribute name -> [value when it was last checked, conditions that read it]
+        self._cond_watch = {}
+        self._cond_untracked = set()  # conditions that can read any state
+        self._cond_new = set()  # conditions with elements enqueued after the last flush
         self._numthreads = 0
+        # actions delayed until the coroutines of the chare have finished (see __drained__)
+        self._drain_actions = None
 
     def __addLocal__(self, msg):
         if self._local_free_head is None:
@@ -64,25 +71,35 @@ class Chare(object):
         return msg
 
     def __flush_wait_queues__(self):
-        while True:
-            # go through linked list of active wait condition objects
-            cond, prev = self._cond_next, self
-            if cond is None:
+        conds = self._conds
+        watch = self._cond_watch
+        changed = wait.changed
+        while len(conds) > 0:
+            # only the conditions that read attributes whose value changed since
+            # the last check (and those that can read any state) are checked for
+            # all of their elements. Other conditions are only checked for the
+            # elements enqueued after the last flush
+            stale = set(self._cond_untracked)
+            for name, w in watch.items():
+                value = getattr(self, name, wait.MISSING)
+                if changed(w[0], value):
+                    w[0] = value
+                    stale.update(w[1])
+            new = self._cond_new
+            if len(stale) == 0 and len(new) == 0:
                 break
+            self._cond_new = set()
             dequeued = False
-            while cond is not None:
-                deq, done = cond.check(self)
+            for cond in sorted(stale | new, key=wait.cond_seq):
+                if conds.get(cond.cond_str if cond.group else cond) is not cond:
+                    # removed while checking a previous condition (by a flush
+                    # in an entry method that it activated)
+                    continue
+                deq, done = cond.check(self, cond in stale)
                 dequeued |= deq
                 if done:
                     # all elements waiting on this condition have been flushed, remove the condition
-                    prev._cond_next = cond._cond_next
-                    if cond == self._cond_last:
-                        self._cond_last = prev
-                    if cond.group:
-                        del self._active_grp_conds[cond.cond_str]
-                else:
-                    prev = cond
-                cond = cond._cond_next
+                    self.__removeCond__(cond)
             if not dequeued:
                 break
             # if I dequeued waiting elements, chare state might have changed as a result of
@@ -90,17 +107,38 @@ class Chare(object):
 
     def __waitEnqueue__(self, cond_template, elem):
         cond_str = cond_template.cond_str
-        if cond_template.group and cond_str in self._active_grp_conds:
-            self._active_grp_conds[cond_str].enqueue(elem)
+        if cond_template.group and cond_str in self._conds:
+            c = self._conds[cond_str]
+            c.enqueue(elem)
         else:
             c = cond_template.createWaitCondition()
             c.enqueue(elem)
-            # add to end of linked list of wait condition objects
-            self._cond_last._cond_next = c
-            self._cond_last = c
-            c._cond_next = None
-            if cond_template.group:
-                self._active_grp_conds[cond_str] = c
+            c.seq = self._cond_seq
+            self._cond_seq += 1
+            self._conds[cond_str if c.group else c] = c
+            if c.deps is None:
+                self._cond_untracked.add(c)
+            else:
+                watch = self._cond_watch
+                for name in c.deps:
+                    if name in watch:
+                        watch[name][1].add(c)
+                    else:
+                        watch[name] = [getattr(self, name, wait.MISSING), {c}]
+        self._cond_new.add(c)
+
+    def __removeCond__(self, cond):
+        del self._conds[cond.cond_str if cond.group else cond]
+        self._cond_new.discard(cond)
+        if cond.deps is None:
+            self._cond_untracked.remove(cond)
+        else:
+            watch = self._cond_watch
+            for name in cond.deps:
+                conds = watch[name][1]
+                conds.remove(cond)
+                if len(conds) == 0:
+                    del watch[name]
 
     def wait(self, cond_str):
         wait_conditions = self.__class__.__charm_wait_conds__
@@ -128,6 +166,13 @@ class Chare(object):
             # fid==0 because that means no fid
             fid = self.__getRedNo__() % 65535 + 1
             proxy = self.thisProxy
+            if self.__cancelledRed__(None, fid):
+                # the reduction was cancelled before this chare joined it. The
+                # chare still contributes, because a reduction over the whole
+                # collection can't complete otherwise, but the result is discarded
+                charm.threadMgr.cancelled_coll_futures.add((fid, self))
+                charm.contribute(data, reducer, CollectiveFuture(fid, None, proxy, 1), self)
+                return self.__cancelledFuture__(fid, proxy)
         else:
             # Note that this currently works because section reductions are
             # entirely implemented in sections.py. Some adjustments will be
@@ -136,22 +181,90 @@ class Chare(object):
             # can only contain the 'redno' part
             sid = section.section[1]
             assert self._scookies[sid] < 65535
-            redno = self._scookies[sid] % 65535
+            redno = self._scookies[sid]
             # An object can participate in multiple sections. fids need to be
             # unique across sections, and not conflict with non-section fids
-            fid = (redno, sid[0], sid[1])
+            fid = (redno % 65535, sid[0], sid[1])
             proxy = section
+            if self.__cancelledRed__(sid, redno):
+                # the reduction was cancelled before this chare joined it, and
+                # its contribution was already made (see _coll_future_cancel)
+                self._scookies[sid] += 1
+                return self.__cancelledFuture__(fid, proxy)
         f = charm.threadMgr.createCollectiveFuture(fid, self, proxy)
         charm.contribute(data, reducer, f, self, section)
         return f
 
+    def __cancelledFuture__(self, fid, proxy):
+        # future returned by allreduce for an operation that was cancelled
+        f = CollectiveFuture(fid, getcurrent(), proxy, 1)
+        f.values = [None]
+        f.gotvalues = True
+        return f
+
     def AtSync(self):
         # NOTE this will fail if called from a chare that is not in an array (as it should be)
-        charm.CkArraySend(self.thisProxy.aid, self.thisIndex, self.thisProxy.AtSync.ep, (b'', []))
+        if self._numthreads > 0:
+            # the chare can't migrate while it has coroutines in progress (they
+            # can't be serialized). It is ready for load balancing once they finish
+            self.__whenDrained__('AtSync', self.AtSync)
+            return
+        if charm.lb_strategy is not None:
+            lb.atSync(self)
+        else:
+            charm.CkArraySend(self.thisProxy.aid, self.thisIndex, self.thisProxy.AtSync.ep, (b'', []))
 
     def migrate(self, toPe):
+        if self._numthreads > 0:
+            # migrate once the coroutines of the chare have finished. The request
+            # goes through the scheduler, so that the chare doesn't migrate while
+            # the last coroutine is completing
+            self.__whenDrained__('migrate', self.__sendMigrate__, toPe)
+            return
         charm.lib.CkMigrate(self.thisProxy.aid, self.thisIndex, toPe)
 
+    def __sendMigrate__(self, toPe):
+        msg = charm.packMsg(None, [toPe], {})
+        charm.CkArraySend(self.thisProxy.aid, self.thisIndex, self.thisProxy.migrate.ep, msg)
+
+    def __whenDrained__(self, name, action, *args):
+        gr = getcurrent()
+        if gr.obj is self:
+            # requested by a coroutine of this chare, which must finish without
+            # suspending again (see EntryMethodThreadManager.pauseThread)
+            caller = (gr, gr.gen)
+        else:
+            if charm.threadMgr.in_asyncio:
+                from . import aio
+                if aio.runningChare() is self:
+                    # can't detect if the task waits for the migration to happen
+                    raise Charm4PyError(name + ' cannot be called from an async def method '
+                                        'of the chare, because the chare can only migrate '
+                                        'once its async def methods have finished')
+            caller = None
+        if self._drain_actions is None:
+            self._drain_actions = []
+        self._drain_actions.append((name, action, args, caller))
+
+    def __checkDrainCaller__(self, gr):
+        """ Called when coroutine gr of this chare is going to suspend. Raises
+            an error if gr has called AtSync or migrate, since it would wait for
+            something that can't happen until it finishes """
+        gen = gr.gen
+        for name, _, _, caller in self._drain_actions:
+            if caller is not None and caller[0] is gr and caller[1] == gen:
+                raise Charm4PyError('A coroutine that calls ' + name + ' cannot suspend '
+                                    'afterwards, because the chare can only migrate once its '
+                                    'coroutines have finished (continue the work in '
+                                    'resumeFromSync or migrated instead)')
+
+    # called when the last coroutine of the chare in progress has finished
+    def __drained__(self):
+        actions = self._drain_actions
+        self._drain_actions = None
+        for _, action, args, _ in actions:
+            action(*args)
+
     # called after the chare has migrated to a new PE
     def migrated(self):
         pass
@@ -164,6 +277,59 @@ class Chare(object):
     def _coll_future_deposit_result(self, fid, result=None):
         charm.threadMgr.depositCollectiveFuture(fid, result, self)
 
+    # cancel the reduction (with future fid) that this chare participates in.
+    # section is None for reductions over the whole collection (see
+    # CollectiveFuture.cancel)
+    def _coll_future_cancel(self, fid, section):
+        threadMgr = charm.threadMgr
+        if threadMgr.cancelCollectiveFuture(fid, self):
+            return
+        if section is None:
+            # this chare doesn't have a pending future for the operation. If it
+            # hasn't contributed yet, its result is discarded when it joins
+            # the operation (see allreduce)
+            dist = (fid - (self.__getRedNo__() % 65535 + 1)) % 65535
+            if dist >= 32768:
+                return  # already contributed
+            if not hasattr(self, '_scancelled'):
+                self._scancelled = defaultdict(set)
+            self._scancelled[None].add(fid)
+            return
+        # this chare doesn't have a pending future for the operation. If it
+        # hasn't contributed yet, it contributes now (with the cancel flag, so
+        # that the reduction completes without reducing the data), and skips
+        # the operation when it calls it later (see __cancelledRed__)
+        sid = section.section[1]
+        next_redno = self._scookies[sid]
+        dist = (fid[0] - next_redno) % 65535
+        if dist >= 32768:
+            return  # already contributed
+        redno = next_redno + dist
+        if not hasattr(self, '_scancelled'):
+            # sid -> rednos of cancelled reductions not joined yet (the key None
+            # has the fids of cancelled reductions over the whole collection)
+            self._scancelled = defaultdict(set)
+        if redno in self._scancelled[sid]:
+            return  # already contributed
+        self._scancelled[sid].add(redno)
+        f = CollectiveFuture(fid, None, section, 1)
+        charm.sectionMgr.contribElem(self, sid, redno, None, None, f, True)
+        threadMgr.cancelled_coll_futures.add((fid, self))
+
+    def __cancelledRed__(self, sid, redno):
+        """ Returns True if section reduction redno (or, if sid is None, the
+            reduction over the whole collection with future ID redno) was
+            cancelled before this chare joined it (see _coll_future_cancel) """
+        cancelled = getattr(self, '_scancelled', None)
+        if cancelled is None or redno not in cancelled.get(sid, ()):
+            return False
+        cancelled[sid].remove(redno)
+        if len(cancelled[sid]) == 0:
+            del cancelled[sid]
+            if len(cancelled) == 0:
+                del self._scancelled
+        return True
+
     def __getRedNo__(self):
         proxy = self.thisProxy
         if hasattr(proxy, 'aid'):
@@ -225,22 +391,35 @@ class Chare(object):
 
     def __initchannelattrs__(self):
         self.__channels__ = []  # port -> channel._Channel object
-        self.__pendingChannels__ = []  # channels that have not finished establishing connections
+        # channels that have not finished establishing connections:
+        # (remote, locally_initiated) -> list of channels (in order of creation)
+        self.__pendingChannels__ = {}
+
+    def __addPendingChannel__(self, ch):
+        key = (ch.remote, ch.locally_initiated)
+        pending = self.__pendingChannels__.get(key)
+        if pending is None:
+            self.__pendingChannels__[key] = [ch]
+        else:
+            pending.append(ch)
 
     def __findPendingChannel__(self, remote, started_locally):
-        for i, ch in enumerate(self.__pendingChannels__):
-            if ch.locally_initiated == started_locally and ch.remote == remote:
-                del self.__pendingChannels__[i]
-                return ch
-        return None
-
-    def _channelConnect__(self, remote_proxy, remote_port):  # entry method
+        key = (remote, started_locally)
+        pending = self.__pendingChannels__.get(key)
+        if pending is None:
+            return None
+        ch = pending.pop(0)
+        if len(pending) == 0:
+            del self.__pendingChannels__[key]
+        return ch
+
+    def _channelConnect__(self, remote_proxy, remote_port, remote_window=0):  # entry method
         if not hasattr(self, '__channels__'):
             self.__initchannelattrs__()
         ch = self.__findPendingChannel__(remote_proxy, True)
         if ch is not None:
             assert not ch.established
-            ch.remote_port = remote_port
+            ch.setRemotePort(remote_port, remote_window)
             if ch.established_fut is not None:
                 ch.established_fut.send()
             else:
@@ -250,8 +429,8 @@ class Chare(object):
             local_port = len(self.__channels__)
             ch = _Channel(local_port, remote_proxy, False)
             self.__channels__.append(ch)
-            self.__pendingChannels__.append(ch)
-            ch.remote_port = remote_port
+            self.__addPendingChannel__(ch)
+            ch.setRemotePort(remote_port, remote_window)
 
     def _channelRecv__(self, port, seqno, *msg):  # entry method
         ch = self.__channels__[port]
@@ -269,16 +448,42 @@ class Chare(object):
             assert seqno not in ch.data, 'Channel buffer is full'
             ch.data[seqno] = msg
 
+    def _channelRecvMulti__(self, dests, *msg):  # entry method
+        # message sent by a ChannelGroup. dests maps the index of each
+        # destination to its port and the seqno of the message
+        port, seqno = dests[self.thisIndex]
+        self._channelRecv__(port, seqno, *msg)
+
+    def _channelCredits__(self, port, n):  # entry method
+        self.__channels__[port].addCredits(n)
+
+    def __msgChannel__(self, chan_type, args):
+        """ Called when unpacking a channel message with direct-copy arrays.
+            Returns the channel that the message is for if it has receive
+            buffers (otherwise None), the seqno of the message and the
+            position in args of the first argument sent """
+        if chan_type == 1:
+            port, seqno = args[0], args[1]
+            first_arg = 2
+        else:
+            port, seqno = args[0][self.thisIndex]
+            first_arg = 1
+        ch = self.__channels__[port]
+        if ch.buf_pool is None and ch.recv_bufs is None:
+            ch = None
+        return ch, seqno, first_arg
+
 
 method_restrictions = {
     # reserved methods are those that can't be redefined in user subclass
     'reserved': {'__addLocal__', '__removeLocal__', '__flush_wait_queues__',
-                 '__waitEnqueue__', 'wait', 'contribute', 'reduce', 'allreduce',
+                 '__waitEnqueue__', '__removeCond__', 'wait', 'contribute', 'reduce', 'allreduce',
                  'AtSync', 'migrate', 'setMigratable',
-                 '_coll_future_deposit_result', '__getRedNo__',
+                 '_coll_future_deposit_result', '_coll_future_cancel', '__getRedNo__',
                  '__addThreadEventSubscriber__', '_getSectionLocations_',
                  '__initchannelattrs__', '__findPendingChannel__',
-                 '_channelConnect__', '_channelRecv__'},
+                 '_channelConnect__', '_channelRecv__', '_channelRecvMulti__',
+                 '_channelCredits__'},
 
     # these methods of Chare cannot be entry methods. NOTE that any methods starting
     # and ending with '__' are automatically excluded from being entry methods
@@ -451,7 +656,12 @@ def group_proxy_elem(proxy, pe):  # group proxy [] overload method
             stop = charm.numPes()
         if step is None:
             step = 1
-        return charm.split(proxy, 1, elems=[list(range(start, stop, step))])[0]
+        key = sliceKey(proxy, (start, stop, step))
+        secproxy = charm.section_cache.get(key)
+        if secproxy is None:
+            secproxy = charm.split(proxy, 1, elems=[list(range(start, stop, step))])[0]
+            charm.section_cache.put(key, secproxy)
+        return secproxy
 
 def group_proxy_method_gen(ep, argcount, argnames, defaults):  # decorator, generates proxy entry methods
     def proxy_entry_method(proxy, *args, **kwargs):
@@ -493,7 +703,7 @@ def group_proxy_method_gen(ep, argcount, argnames, defaults):  # decorator, gene
             if Options.local_msg_optim and root == charm._myPe:
                 charm.sectionMgr.thisProxy[root].sendToSectionLocal(sid, ep, header, *args)
             else:
-                charm.sectionMgr.thisProxy[root].sendToSection(sid, ep, header, *args)
+                charm.sectionMgr.sendToRoot(root, sid, ep, header, args)
         return blockFuture
     proxy_entry_method.ep = ep
     return proxy_entry_method
@@ -535,7 +745,7 @@ def update_globals_proxy_method_gen(ep):
             if Options.local_msg_optim and root == charm._myPe:
                 charm.sectionMgr.thisProxy[root].sendToSectionLocal(sid, ep, header, *args)
             else:
-                charm.sectionMgr.thisProxy[root].sendToSection(sid, ep, header, *args)
+                charm.sectionMgr.sendToRoot(root, sid, ep, header, args)
         return blockFuture
     proxy_entry_method.ep = ep
     return proxy_entry_method
@@ -658,10 +868,17 @@ def array_proxy_ctor(proxy, aid, ndims):
     proxy.elemIdx = ()  # entry method calls will be to elemIdx array element (broadcast if empty tuple)
 
 def array_proxy__getstate__(proxy):
-    return (proxy.aid, proxy.ndims, proxy.elemIdx)
+    if proxy.epoch is None:
+        return (proxy.aid, proxy.ndims, proxy.elemIdx)
+    return (proxy.aid, proxy.ndims, proxy.elemIdx, proxy.epoch)
 
 def array_proxy__setstate__(proxy, state):
-    proxy.aid, proxy.ndims, proxy.elemIdx = state
+    if len(state) == 4:
+        # membership epoch of the array after an insertion (see SectionProxyCache)
+        proxy.aid, proxy.ndims, proxy.elemIdx, proxy.epoch = state
+        charm.section_cache.observe(proxy.aid, proxy.epoch)
+    else:
+        proxy.aid, proxy.ndims, proxy.elemIdx = state
 
 def array_proxy__eq__(proxy, other):
     if proxy.issec:
@@ -711,7 +928,12 @@ def array_proxy_elem(proxy, idx):  # array proxy [] overload method
     else:
         for _slice in idx:
             assert _slice.start is not None and _slice.stop is not None, 'Must specify start and stop indexes for array slicing'
-        return charm.split(proxy, 1, slicing=idx)[0]
+        key = sliceKey(proxy, tuple([(_slice.start, _slice.stop, _slice.step) for _slice in idx]))
+        secproxy = charm.section_cache.get(key, proxy.epoch)
+        if secproxy is None:
+            secproxy = charm.split(proxy, 1, slicing=idx)[0]
+            charm.section_cache.put(key, secproxy)
+        return secproxy
 
 def array_proxy_method_gen(ep, argcount, argnames, defaults):  # decorator, generates proxy entry methods
     def proxy_entry_method(proxy, *args, **kwargs):
@@ -755,7 +977,7 @@ def array_proxy_method_gen(ep, argcount, argnames, defaults):  # decorator, gene
             if Options.local_msg_optim and root == charm._myPe:
                 charm.sectionMgr.thisProxy[root].sendToSectionLocal(sid, ep, header, *args)
             else:
-                charm.sectionMgr.thisProxy[root].sendToSection(sid, ep, header, *args)
+                charm.sectionMgr.sendToRoot(root, sid, ep, header, args)
         return blockFuture
     proxy_entry_method.ep = ep
     return proxy_entry_method
@@ -808,6 +1030,10 @@ def array_ckInsert_gen(epIdx):
                 header[b'block'] = proxy.creation_future
                 header[b'bcast'] = True
                 header[b'creation'] = True
+        else:
+            # cached slices of this array (on any PE) don't include the new
+            # element. Copies of this proxy sent after this carry the new epoch
+            proxy.epoch = charm.section_cache.membershipChanged(proxy.aid)
         msg = charm.packMsg(None, args, header)
         charm.lib.CkInsert(proxy.aid, index, epIdx, onPE, msg, useAtSync)
     return array_ckInsert
@@ -843,6 +1069,7 @@ class Array(object):
             obj.thisProxy = charm.proxyClasses[ARRAY][obj.__class__](aid, len(obj.thisIndex))
         obj._contributeInfo = charm.lib.initContributeInfo(aid, obj.thisIndex, CONTRIBUTOR_TYPE_ARRAY)
         obj.migratable = True
+        obj._lb_load = 0.0  # load measured for the Python load balancer (see lb.py)
 
     @classmethod
     def __baseEntryMethods__(cls):
@@ -892,6 +1119,7 @@ class Array(object):
             M['__setstate__'] = arraysecproxy__setstate__
         proxyCls = type(proxyClassName, (), M)  # create and return proxy class
         proxyCls.issec = sectionProxy
+        proxyCls.epoch = None  # membership epoch after an insertion through the proxy (see SectionProxyCache)
         return proxyCls
 
 # ---------------------------------------------------
@@ -907,7 +1135,8 @@ for i in CHARM_TYPES:
 
 
 def charmStarting():
-    global charm, Options, Reducer, Charm4PyError, CharmRemote, profile_send_function
+    global charm, Options, Reducer, Charm4PyError, CharmRemote, profile_send_function, sliceKey
     from .charm import charm, Charm4PyError, CharmRemote, profile_send_function
+    from .sections import sliceKey
     Options = charm.options
     Reducer = charm.reducers
@@ -14,6 +14,7 @@ else:
     import pickle as cPickle
     from io import StringIO
 import inspect
+import struct
 import time
 import gc
 from collections import defaultdict
@@ -24,9 +25,11 @@ from .chare import CONTRIBUTOR_TYPE_GROUP, CONTRIBUTOR_TYPE_ARRAY
 from .chare import Chare, Mainchare, Group, ArrayMap, Array
 from . import entry_method
 from . import threads
-from .threads import Future, LocalFuture
+from .threads import Future, LocalFuture, Charm4PyTimeoutError
 from . import reduction
 from . import wait
+from . import lb
+from .timers import TimerQueue
 import array
 try:
     import numpy
@@ -37,6 +40,12 @@ except ImportError:
     numpy = NumpyDummy()
 
 
+# a node-aware section tree has up to 2*bfactor children per PE (children in
+# other hosts and in the same host), which has to be less than the max number
+# of children that the charm library can send a message to
+MAX_SECTION_BFACTOR = 49
+
+
 def SECTION_ALL(obj):
     return 0
 
@@ -100,9 +109,7 @@ class Charm(object):
         self.proxyClasses      = [{} for _ in CHARM_TYPES]  # charm_type_id -> class -> proxy class
         self.groupMsgBuf = defaultdict(list)  # gid -> list of msgs received for constrained groups that haven't been created yet
         self.section_counter = 0
-        self.rebuildFuncs = (rebuildByteArray, rebuildArray, rebuildNumpyArray)
-        self.sched_tagpool = set(range(1, 128))  # pool of tags for scheduling callables
-        self.sched_callables = {}  # tag -> (callable, args)
+        self.rebuildFuncs = (rebuildByteArray, rebuildArray, rebuildNumpyArray, rebuildReadOnlyNumpyArray)
 
         self.options = Options()
         self.options.profiling = False
@@ -112,9 +119,18 @@ class Charm(object):
         self.options.auto_flush_wait_queues = True
         self.options.quiet = False
         self.options.remote_exec = False
+        self.options.greenlet_pool_size = 64  # max number of idle greenlets kept for reuse by coroutines
+        self.options.asyncio_poll_interval = 0.001  # secs between iterations of the asyncio loop (see aio.py)
+        self.options.channel_window = 0  # default flow control window of channels (0 disables it)
+        self.options.section_cache_size = 32  # max number of section proxies obtained by slicing that are cached
+        self.options.section_bfactor = 4  # default branching factor of section spanning trees
+        self.options.section_node_aware = False  # default mode of section spanning trees (see getSectionSubtrees)
         self.options.interactive = Options()
         self.options.interactive.verbose = 1
         self.options.interactive.broadcast_imports = True
+        self.options.pool = Options()
+        self.options.pool.memo_cache_size = 1024
+        self.options.pool.snapshot = 'pickle'
 
         if 'OMPI_COMM_WORLD_SIZE' in os.environ:
             # this is needed for OpenMPI, see:
@@ -127,6 +143,7 @@ class Charm(object):
                 self.__libmpi__ = ctypes.CDLL('libmpi_ibm.so', mode=ctypes.RTLD_GLOBAL)
                 
         self.lib = load_charm_library(self)
+        self.timers = TimerQueue(self.lib)  # callables scheduled with scheduleCallableAfter
         self.ReducerType = self.lib.ReducerType
         self.CkContributeToChare = self.lib.CkContributeToChare
         self.CkContributeToGroup = self.lib.CkContributeToGroup
@@ -150,8 +167,11 @@ class Charm(object):
         # in interactive mode
         self.dynamic_register = sys.modules['__main__'].__dict__
         self.lb_requested = False
+        self.lb_strategy = None  # Python load balancing strategy (see setLBStrategy)
         self.threadMgr = threads.EntryMethodThreadManager(self)
         self.createFuture = self.Future = self.threadMgr.createFuture
+        self.when_all = self.threadMgr.whenAll
+        self.when_any = self.threadMgr.whenAny
 
     def __init_profiling__(self):
         # these are attributes used only in profiling mode
@@ -249,12 +269,23 @@ class Charm(object):
         gc.collect()
 
     def invokeEntryMethod(self, obj, ep, header, args):
+        if self.lb_strategy is not None and hasattr(obj, '_lb_load'):
+            # measure the load of the array element for the Python load balancer
+            lb.startMeasure(obj)
+            try:
+                self._invokeEntryMethod(obj, ep, header, args)
+            finally:
+                lb.stopMeasure()
+        else:
+            self._invokeEntryMethod(obj, ep, header, args)
+
+    def _invokeEntryMethod(self, obj, ep, header, args):
         em = self.entryMethods[ep]
         if (em.when_cond is not None) and (not em.when_cond.evaluateWhen(obj, args)):
             obj.__waitEnqueue__(em.when_cond, (0, em, header, args))
         else:
             em.run(obj, header, args)
-            if self.options.auto_flush_wait_queues and obj._cond_next is not None:
+            if self.options.auto_flush_wait_queues and len(obj._conds) > 0:
                 obj.__flush_wait_queues__()
 
     def recvChareMsg(self, chare_id, ep, msg, dcopy_start):
@@ -301,7 +332,10 @@ class Charm(object):
         else:
             em = self.entryMethods[ep]
             assert em.name == '__init__', 'Specified array entry method not constructor'
-            header, args = self.unpackMsg(msg, dcopy_start, None)
+            if memoryview(msg)[:5].tobytes() == b'_oob:':
+                header, args = {}, self.unpickleChare(msg)
+            else:
+                header, args = self.unpackMsg(msg, dcopy_start, None)
             if self.options.profiling:
                 self.activeChares.add((em.C, Array))
             if isinstance(args, Chare):  # obj migrating in
@@ -309,7 +343,11 @@ class Charm(object):
                 obj = args
                 obj._contributeInfo = self.lib.initContributeInfo(aid, index, CONTRIBUTOR_TYPE_ARRAY)
                 self.arrays[aid][index] = obj
+                if hasattr(obj, '_sanchors'):
+                    self.sectionMgr.elemArrived(obj)
                 em.run(obj, {}, ())
+                if hasattr(obj, '_lb_migrating'):
+                    lb.arrived(obj)
             else:
                 obj = object.__new__(em.C)   # create object but don't call __init__
                 if b'single' in header:
@@ -334,9 +372,23 @@ class Charm(object):
             if b'dcopy' in header:
                 rel_offset = dcopy_start
                 buf = memoryview(msg)
+                ch = None
+                if b'chan' in header and dest_obj is not None:
+                    # channel message, arrays can be copied into receive buffers of the channel
+                    ch, seqno, first_arg = dest_obj.__msgChannel__(header[b'chan'], args)
+                elif b'sfwd' in header:
+                    # section message, forward it before rebuilding the arguments
+                    dest_obj.forwardSectionMsg(args[0])
                 for arg_pos, typeId, rebuildArgs, size in header[b'dcopy']:
                     arg_buf = buf[rel_offset:rel_offset + size]
-                    args[arg_pos] = self.rebuildFuncs[typeId](arg_buf, *rebuildArgs)
+                    out = None
+                    if typeId >= 2 and ch is not None:
+                        out = ch.getRecvBuffer(seqno, arg_pos - first_arg, len(args) - first_arg,
+                                               *rebuildArgs)
+                    if out is None:
+                        args[arg_pos] = self.rebuildFuncs[typeId](arg_buf, *rebuildArgs)
+                    else:
+                        args[arg_pos] = rebuildNumpyArrayInto(out, arg_buf)
                     rel_offset += size
             elif b'custom_reducer' in header:
                 reducer = getattr(self.reducers, header[b'custom_reducer'])
@@ -379,6 +431,9 @@ class Charm(object):
             direct_copy_hdr = []  # goes to msg header
             args = list(msgArgs)
             if self.lib.direct_copy_supported:
+                # read-only arrays in section msgs are rebuilt as read-only
+                # (type 3), because the section members on a PE share them
+                section_msg = b'sfwd' in header
                 for i, arg in enumerate(msgArgs):
                     t = type(arg)
                     if t == bytes:
@@ -396,10 +451,11 @@ class Charm(object):
                         # memoryview, Python throws error: "memoryview: underlying buffer is not
                         # C-contiguous", which seems to be a CPython error (not cffi related)
                         nbytes = arg.nbytes
+                        typeId = 3 if section_msg and not arg.flags.writeable else 2
                         if arg.dtype.isbuiltin:
-                            direct_copy_hdr.append((i, 2, (arg.shape, arg.dtype.char), nbytes))
+                            direct_copy_hdr.append((i, typeId, (arg.shape, arg.dtype.char), nbytes))
                         else:
-                            direct_copy_hdr.append((i, 2, (arg.shape, arg.dtype.name), nbytes))
+                            direct_copy_hdr.append((i, typeId, (arg.shape, arg.dtype.name), nbytes))
                     else:
                         continue
                     args[i] = None  # will direct-copy this arg so remove from args list
@@ -553,9 +609,11 @@ class Charm(object):
             if sys.version_info < (3, 0, 0):
                 entry_method.coro(PoolScheduler.start.im_func)
                 entry_method.coro(PoolScheduler.startSingleTask.im_func)
+                entry_method.coro(PoolScheduler.startArray.im_func)
             else:
                 entry_method.coro(PoolScheduler.start)
                 entry_method.coro(PoolScheduler.startSingleTask)
+                entry_method.coro(PoolScheduler.startArray)
         self.register(PoolScheduler, (ARRAY,))
         self.register(Worker, (GROUP,))
 
@@ -657,7 +715,7 @@ class Charm(object):
                         raise Charm4PyError('Chares must not inherit from Group, Array or'
                                             ' Mainchare. Refer to new API')
 
-        for module in (chare, entry_method, wait):
+        for module in (chare, entry_method, wait, lb):
             module.charmStarting()
         self.threadMgr.start()
 
@@ -666,22 +724,72 @@ class Charm(object):
 
     def arrayElemLeave(self, aid, index):
         obj = self.arrays[aid].pop(index)
-        if hasattr(obj, '_scookies'):
-            charm.abort('Cannot migrate elements that are part of a section '
-                        '(this will be supported in a future version)')
         self.threadMgr.objMigrating(obj)
+        if hasattr(obj, '_scookies'):
+            self.sectionMgr.elemLeaving(obj)
         if hasattr(obj, '__channels__'):
             assert len(obj.__pendingChannels__) == 0, 'Cannot migrate chares that did not complete channel establishment'
         del obj._contributeInfo  # don't want to pickle this
-        pickled_chare = cPickle.dumps(({}, obj), self.options.pickle_protocol)
+        pickled_chare = self.pickleChare(obj)
         # facilitate garbage collection (especially by removing cyclical references)
         del obj._local
         del obj._local_free_head
-        del obj._active_grp_conds
-        obj._cond_next = None
-        obj._cond_last = None
+        del obj._conds
+        del obj._cond_watch
+        del obj._cond_untracked
+        del obj._cond_new
         return pickled_chare
 
+    def pickleChare(self, obj):
+        """ Serializes a migrating chare. If pickle protocol 5 can be used,
+            buffers of the chare's state that support out-of-band pickling
+            (like NumPy arrays) are not copied into the pickle stream. The
+            msg is allocated once with its final size, and the pickle and the
+            buffers are written straight into it:
+            b'_oob:' | len(pickle) | num buffers | [(size, readonly)] | pickle | buffers """
+        protocol = self.options.pickle_protocol
+        if cPickle.HIGHEST_PROTOCOL < 5 or 0 <= protocol < 5:
+            return cPickle.dumps(({}, obj), protocol)
+        buffers = []
+        data = cPickle.dumps(({}, obj), 5, buffer_callback=buffers.append)
+        if len(buffers) == 0:
+            return data
+        segments = [b.raw() for b in buffers]
+        pos = 13 + 9 * len(segments)
+        msg = bytearray(pos + len(data) + sum([m.nbytes for m in segments]))
+        buf = memoryview(msg)
+        struct.pack_into('<5sII', msg, 0, b'_oob:', len(data), len(segments))
+        for i, m in enumerate(segments):
+            struct.pack_into('<Q?', msg, 13 + 9 * i, m.nbytes, m.readonly)
+        buf[pos:pos + len(data)] = data
+        pos += len(data)
+        for m in segments:
+            buf[pos:pos + m.nbytes] = m
+            pos += m.nbytes
+            m.release()
+        buf.release()
+        return msg
+
+    def unpickleChare(self, msg):
+        """ Rebuilds a chare serialized by pickleChare. The pickle stream is
+            read in place, and each buffer is copied once from the msg into
+            memory owned by the rebuilt object (Charm++ frees the msg after
+            delivery) """
+        buf = memoryview(msg).cast('B')
+        data_size, num_segments = struct.unpack_from('<II', buf, 5)
+        pos = 13 + 9 * num_segments
+        data = buf[pos:pos + data_size]
+        pos += data_size
+        buffers = []
+        for i in range(num_segments):
+            size, readonly = struct.unpack_from('<Q?', buf, 13 + 9 * i)
+            if readonly:
+                buffers.append(bytes(buf[pos:pos + size]))
+            else:
+                buffers.append(bytearray(buf[pos:pos + size]))
+            pos += size
+        return cPickle.loads(data, buffers=buffers)[1]
+
     # Charm class contribute function used by Array, Group and Sections for reductions
     # 'section' can either be an sid (2-tuple) or a section proxy
     def contribute(self, data, reducer, target, chare, section=None):
@@ -712,10 +820,13 @@ class Charm(object):
                 redno = chare._scookies[sid]
             except:
                 raise Charm4PyError('Chare doing section reduction but is not part of a section')
-            self.sectionMgr.contrib(sid, redno, data, reducer, target)
+            if not chare.__cancelledRed__(sid, redno):
+                self.sectionMgr.contribElem(chare, sid, redno, data, reducer, target)
             chare._scookies[sid] += 1
 
-    def combine(self, *proxies):
+    # user signature is: `def combine(self, *proxies, bfactor=None, node_aware=None)`
+    def combine(self, *proxies, **kwargs):
+        tree = self.sectionTreeSpec(kwargs.get('bfactor'), kwargs.get('node_aware'))
         sid = (self._myPe, self.section_counter)
         self.section_counter += 1
         pes = set()
@@ -729,10 +840,12 @@ class Charm(object):
             pes.update(f.get()[0])
         assert len(pes) > 0
         root = min(pes)
-        self.sectionMgr.thisProxy[root].createSectionDown(sid, pes, None)
+        self.sectionMgr.thisProxy[root].createSectionDown(sid, pes, None, tree)
         return proxies[0].__getsecproxy__((root, sid))
 
-    def split(self, proxy, numsections, section_func=None, elems=None, slicing=None, cons=None):
+    def split(self, proxy, numsections, section_func=None, elems=None, slicing=None, cons=None,
+              bfactor=None, node_aware=None):
+        tree = self.sectionTreeSpec(bfactor, node_aware)
         assert (hasattr(proxy, 'gid') and proxy.elemIdx == -1) or (hasattr(proxy, 'aid') and proxy.elemIdx == ())
         sid0 = (self._myPe, self.section_counter)
         self.section_counter += numsections
@@ -759,7 +872,13 @@ class Charm(object):
                 proxy._getSectionLocations_(sid0, numsections, None, None, elems, f, secproxy)
                 section_pes = f.get()
         secProxies = []
-        # TODO if there are many many sections, should do a stateless multicast to the roots with the section info
+        gid = None
+        if not proxy.issec and hasattr(proxy, 'gid'):
+            gid = proxy.gid
+        # when creating multiple sections, the spanning trees of all sections
+        # are computed here and their edges are sent to the PEs in one pass
+        bulk = numsections > 1 and cons is None
+        descs = defaultdict(list)  # pe -> list of (sid, parent, children) for bulk creation
         for i in range(numsections):
             sid = (self._myPe, sid0[1] + i)
             pes = section_pes[i]
@@ -769,13 +888,97 @@ class Charm(object):
                 pes = set(pes)
             assert len(pes) > 0
             root = min(pes)
-            if not proxy.issec and hasattr(proxy, 'gid'):
-                self.sectionMgr.thisProxy[root].createGroupSectionDown(sid, proxy.gid, pes, None, cons)
+            if bulk:
+                for pe, (parent, children) in self.getSectionTree(root, pes, tree).items():
+                    descs[pe].append((sid, parent, children))
+            elif gid is not None:
+                self.sectionMgr.thisProxy[root].createGroupSectionDown(sid, gid, pes, None, cons, tree)
             else:
-                self.sectionMgr.thisProxy[root].createSectionDown(sid, pes, None)
+                self.sectionMgr.thisProxy[root].createSectionDown(sid, pes, None, tree)
             secProxies.append(proxy.__getsecproxy__((root, sid)))
+        if bulk:
+            # multicast the section descriptors through a spanning tree rooted
+            # at this PE, each PE only receives the descriptors of its subtree
+            self.sectionMgr.thisProxy[self._myPe].createSectionsDown(dict(descs), gid, tree)
         return secProxies
 
+    def sectionTreeSpec(self, bfactor, node_aware):
+        """ Returns the (bfactor, node_aware) specification of the spanning
+            tree of a section, using the default options for unspecified values """
+        if bfactor is None:
+            bfactor = self.options.section_bfactor
+        if node_aware is None:
+            node_aware = self.options.section_node_aware
+        if bfactor < 1 or bfactor > MAX_SECTION_BFACTOR:
+            raise Charm4PyError('Branching factor of sections must be between 1 and ' +
+                                str(MAX_SECTION_BFACTOR))
+        return (bfactor, bool(node_aware))
+
+    def getSectionTree(self, root, pes, tree=None):
+        """ Returns the spanning tree of a section with the given root and
+            pes, as a dict pe -> (parent, children). The tree is the same
+            that is built by SectionManager.createSectionDown """
+        if tree is None:
+            tree = self.sectionTreeSpec(None, None)
+        edges = {}
+        pes = [root] + sorted(pes - {root})
+        stack = [(None, pes)]
+        while len(stack) > 0:
+            parent, pes = stack.pop()
+            pe = pes[0]
+            subtrees = self.getSectionSubtrees(pe, pes, tree)
+            edges[pe] = (parent, [subtree[0] for subtree in subtrees])
+            for subtree in subtrees:
+                stack.append((pe, subtree))
+        return edges
+
+    def getSectionSubtrees(self, root_pe, pes, tree=None):
+        """ Like getTopoSubtrees, but for the spanning tree of a section given
+            by the spec *tree* (see sectionTreeSpec, the default options are
+            used if None). In node-aware mode, the tree first spans one PE per
+            host (the lowest numbered one, or the root for its own host), and
+            then fans out inside each host, so that a message crosses the
+            network once per host """
+        if tree is None:
+            tree = self.sectionTreeSpec(None, None)
+        bfactor, node_aware = tree
+        if not node_aware:
+            return self.getTopoSubtrees(root_pe, pes, bfactor)
+        getPeHost = self.getPeHost
+        myhost = getPeHost(root_pe)
+        hosts = defaultdict(list)  # host -> pes of the host (other than root_pe)
+        for pe in pes:
+            if pe != root_pe:
+                hosts[getPeHost(pe)].append(pe)
+        local_pes = hosts.pop(myhost, [])
+        subtrees = []
+        if len(hosts) > 0:
+            leaders = {}  # leader pe -> pes of its host
+            for host_pes in hosts.values():
+                leaders[min(host_pes)] = host_pes
+            for subtree in self.getTopoSubtrees(root_pe, [root_pe] + sorted(leaders), bfactor):
+                # the child gets the pes of all the hosts in its subtree
+                child = subtree[0]
+                expanded = list(leaders[child])
+                expanded.remove(child)
+                expanded.insert(0, child)
+                for leader in subtree[1:]:
+                    expanded.extend(leaders[leader])
+                subtrees.append(expanded)
+        if len(local_pes) > 0:
+            subtrees.extend(self.getTopoSubtrees(root_pe, [root_pe] + sorted(local_pes), bfactor))
+        return subtrees
+
+    def invalidateSections(self, proxy=None):
+        """ Remove the section proxies obtained by slicing *proxy* from the
+            cache of every PE (all cached section proxies if None) """
+        if proxy is None:
+            self.section_cache.invalidateAllPes()
+        elif hasattr(proxy, 'gid'):
+            self.section_cache.invalidateAllPes(proxy.gid)
+        else:
+            self.section_cache.invalidateAllPes(proxy.aid)
+
     def startQD(self, callback):
         fid = 0
         if isinstance(callback, Future):
@@ -815,23 +1018,34 @@ class Charm(object):
             proxy.creation_future.get()
             del proxy.creation_future
 
+    def setLBStrategy(self, strategy):
+        """ Use the given Python function as load balancing strategy of the
+            arrays whose elements call AtSync. The function is called on PE 0
+            as strategy(loads, placement), where loads and placement are
+            dicts index -> load (seconds spent in entry methods since the last
+            load balancing step) and index -> PE. It returns a dict
+            index -> PE with the new PE of the elements that have to move
+            (or None). Must be set on every PE (for example, before calling
+            charm.start). If strategy is None, AtSync uses the load balancers
+            of Charm++ """
+        self.lb_strategy = strategy
+
     def scheduleCallableAfter(self, callable_obj, secs, args=[]):
-        tag = self.sched_tagpool.pop()
-        self.sched_callables[tag] = (callable_obj, args)
-        self.lib.scheduleTagAfter(tag, secs * 1000)
+        """ Returns a Timer object, which can be used to cancel the call """
+        return self.timers.schedule(callable_obj, secs, args)
 
     def triggerCallable(self, tag):
         if self.options.profiling:
             self.triggerCallableEM.startMeasuringTime()
-        cb, args = self.sched_callables.pop(tag)
-        self.sched_tagpool.add(tag)
-        cb(*args)
+        self.timers.trigger(tag)
         if self.options.profiling:
             self.triggerCallableEM.stopMeasuringTime()
 
     # generator that yields objects (works for Futures and Channels) as they
-    # become ready (have a msg ready to receive immediately)
-    def iwait(self, objs):
+    # become ready (have a msg ready to receive immediately). If timeout is not
+    # None, raises Charm4PyTimeoutError if all of the objects haven't become
+    # ready after timeout seconds
+    def iwait(self, objs, timeout=None):
         n = len(objs)
         f = LocalFuture()
         for obj in objs:
@@ -840,13 +1054,25 @@ class Charm(object):
                 yield obj
             else:
                 obj.waitReady(f)
-        while n > 0:
-            obj = self.threadMgr.pauseThread()
-            n -= 1
-            yield obj
+        if timeout is None:
+            while n > 0:
+                obj = self.threadMgr.pauseThread()
+                n -= 1
+                yield obj
+        else:
+            deadline = time.time() + timeout
+            while n > 0:
+                try:
+                    obj = f.get(max(deadline - time.time(), 0))
+                except Charm4PyTimeoutError:
+                    for obj in objs:
+                        obj.cancelWaitReady(f)
+                    raise
+                n -= 1
+                yield obj
 
-    def wait(self, objs):
-        for o in self.iwait(objs):
+    def wait(self, objs, timeout=None):
+        for o in self.iwait(objs, timeout):
             pass
 
     def recordSend(self, size):
@@ -935,6 +1161,10 @@ class Charm(object):
         lineNb += 1
         self.__printTable__(table, sep)
 
+        if hasattr(self, 'poolScheduler') and self.poolScheduler.workers is not None:
+            # pool scheduler is on this PE and the pool has been used
+            self.poolScheduler.__printStats__()
+
         for i in (0, 1):
             if i == 0:
                 num_msgs = self.msg_send_stats[0]
@@ -1041,6 +1271,25 @@ class CharmRemote(Chare):
     def LBTurnInstrumentOff(self):
         charm.lib.LBTurnInstrumentOff()
 
+    def _lb_balance(self, stats):
+        lb.balance(stats)
+
+    def _lb_migrate(self, aid, moves):
+        lb.migrate(aid, moves)
+
+    def _lb_arrived(self, aid):
+        lb.migrationDone(aid)
+
+    def _lb_resume(self, aid):
+        lb.resume(aid)
+
+    def _invalidateSections(self, collections):
+        cache = charm.section_cache
+        for collection, epoch in collections:
+            if epoch is not None:
+                cache.observe(collection, epoch)
+            cache.invalidate(collection)
+
     def addReducer(self, func):
         charm.addReducer(func)
 
@@ -1078,6 +1327,23 @@ class CharmRemote(Chare):
     def _future_deposit_result(self, fid, result=None):
         charm.threadMgr.depositFuture(fid, result)
 
+    # deposit values of multiple futures that were created on this PE
+    def _future_deposit_results(self, fids, results):
+        depositFuture = charm.threadMgr.depositFuture
+        for fid, result in zip(fids, results):
+            depositFuture(fid, result)
+
+    # connect channels opened by remote_proxy with chares on this PE
+    def _channel_connect_many(self, remote_proxy, remote_window, conns):
+        from .channel import localObject
+        for proxy, remote_port in conns:
+            obj = localObject(proxy)
+            if obj is None:
+                # the chare is not here (wrong location hint or it migrated)
+                proxy._channelConnect__(remote_proxy, remote_port, remote_window)
+            else:
+                obj._channelConnect__(remote_proxy, remote_port, remote_window)
+
     def propagateException(self, error):
         if time.time() - charm.last_exception_timestamp >= 1.0:
             charm.last_exception_timestamp = time.time()
@@ -1176,5 +1442,18 @@ def rebuildNumpyArray(data, shape, dt):
     return a.copy()
 
 
+def rebuildReadOnlyNumpyArray(data, shape, dt):
+    a = rebuildNumpyArray(data, shape, dt)
+    a.flags.writeable = False
+    return a
+
+
+def rebuildNumpyArrayInto(out, data):
+    a = numpy.frombuffer(data, dtype=out.dtype)  # this does not copy
+    a.shape = out.shape
+    numpy.copyto(out, a)
+    return out
+
+
 charm = Charm()
 readonlies = __ReadOnlies()
@@ -285,6 +285,20 @@ class CharmLib(object):
         self.send_buf_sizes[i+1] = buf.nbytes
       lib.CkArrayExtSend_multi(array_id, index, len(index), ep, len(dcopy)+1, self.send_bufs, self.send_buf_sizes)
 
+  def CkArraySendMulti(self, array_id, indexes, ep, msg):
+    msg0, dcopy = msg
+    if len(dcopy) == 0:
+      for index in indexes:
+        lib.CkArrayExtSend(array_id, index, len(index), ep, msg0, len(msg0))
+    else:
+      self.send_bufs[0] = ffi.from_buffer(msg0)
+      self.send_buf_sizes[0] = len(msg0)
+      for i,buf in enumerate(dcopy):
+        self.send_bufs[i+1] = ffi.from_buffer(buf)
+        self.send_buf_sizes[i+1] = buf.nbytes
+      for index in indexes:
+        lib.CkArrayExtSend_multi(array_id, index, len(index), ep, len(dcopy)+1, self.send_bufs, self.send_buf_sizes)
+
   def sendToSection(self, gid, children):
     lib.CkForwardMulticastMsg(gid, len(children), children)
 
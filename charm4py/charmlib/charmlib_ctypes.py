@@ -266,6 +266,13 @@ class CharmLib(object):
     c_elemIdx = (c_int * ndims)(*index)  # TODO have buffer preallocated for this?
     self.lib.CkArrayExtSend(array_id, c_elemIdx, ndims, ep, msg0, len(msg0))
 
+  def CkArraySendMulti(self, array_id, indexes, ep, msg):
+    msg0, dcopy = msg
+    for index in indexes:
+      ndims = len(index)
+      c_elemIdx = (c_int * ndims)(*index)
+      self.lib.CkArrayExtSend(array_id, c_elemIdx, ndims, ep, msg0, len(msg0))
+
   def sendToSection(self, gid, children):
     c_children = (c_int * len(children))(*children)
     self.lib.CkForwardMulticastMsg(gid, len(children), c_children)
@@ -413,7 +420,12 @@ class CharmLib(object):
       if self.opts.profiling: t0 = time.time()
       if sizing:
         arrIndex = self.arrayIndexToTuple(ndims, arrayIndex)
-        self.tempData = ctypes.create_string_buffer(self.charm.arrayElemLeave(aid, arrIndex))
+        data = self.charm.arrayElemLeave(aid, arrIndex)
+        if isinstance(data, bytearray):
+          # msg with out-of-band buffers, hand it to Charm++ without copying
+          self.tempData = (c_char * len(data)).from_buffer(data)
+        else:
+          self.tempData = ctypes.create_string_buffer(data)
       else:
         #pdata[0] = ctypes.cast(data, c_void_p).value
         pdata = ctypes.cast(pdata, POINTER(POINTER(c_char)))
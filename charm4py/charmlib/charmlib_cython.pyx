@@ -463,6 +463,22 @@ class CharmLib(object):
       CkArrayExtSend_multi(array_id, c_index, ndims, ep, cur_buf, send_bufs, send_buf_sizes)
       cur_buf = 1
 
+  def CkArraySendMulti(self, int array_id, list indexes, int ep, msg not None):
+    global cur_buf
+    msg0, dcopy = msg
+    cdef int ndims
+    cdef int i = 0
+    send_bufs[0]      = <char*>msg0
+    send_buf_sizes[0] = <int>len(msg0)
+    for index in indexes:
+      ndims = len(index)
+      for i in range(ndims): c_index[i] = index[i]
+      if cur_buf <= 1:
+        CkArrayExtSend(array_id, c_index, ndims, ep, msg0, len(msg0))
+      else:
+        CkArrayExtSend_multi(array_id, c_index, ndims, ep, cur_buf, send_bufs, send_buf_sizes)
+    cur_buf = 1
+
   def sendToSection(self, int gid, list children):
     cdef int i = 0
     cdef int num_children
@@ -740,6 +756,13 @@ class CharmLib(object):
       if b'dcopy' in header:
         msg.advance(dcopy_start)
         dcopy_list = header[b'dcopy']
+        ch = None
+        if b'chan' in header and dest_obj is not None:
+          # channel message, arrays can be copied into receive buffers of the channel
+          ch, seqno, first_arg = dest_obj.__msgChannel__(header[b'chan'], args)
+        elif b'sfwd' in header:
+          # section message, forward it before rebuilding the arguments
+          dest_obj.forwardSectionMsg(args[0])
         for i in range(len(dcopy_list)):
           arg_pos, tid, rebuildArgs, size = dcopy_list[i]
           typeId = <int>tid
@@ -752,11 +775,21 @@ class CharmLib(object):
             a = array.array(typecode)
             a.frombytes(msg)
             args[arg_pos] = a
-          elif typeId == 2:
+          elif typeId == 2 or typeId == 3:
             shape, dt = rebuildArgs
             a = np.frombuffer(msg, dtype=np.dtype(dt))  # this does not copy
             a.shape = shape
-            args[arg_pos] = a.copy()
+            out = None
+            if ch is not None:
+              out = ch.getRecvBuffer(seqno, arg_pos - first_arg, shape, dt)
+            if out is None:
+              a = a.copy()
+              if typeId == 3:
+                a.flags.writeable = False
+              args[arg_pos] = a
+            else:
+              np.copyto(out, a)
+              args[arg_pos] = out
           else:
             raise Charm4PyError("unpackMsg: wrong type id received")
           msg.advance(buf_size)
@@ -786,15 +819,19 @@ class CharmLib(object):
       args = list(msgArgs)
       global cur_buf
       cur_buf = 1
+      # read-only arrays in section msgs are rebuilt as read-only (type 3),
+      # because the section members on a PE share them
+      section_msg = b'sfwd' in header
       for i in range(len(args)):
         arg = msgArgs[i]
         if isinstance(arg, np.ndarray) and not arg.dtype.hasobject:
           np_array = arg
           nbytes = np_array.nbytes
+          tid = 3 if section_msg and not arg.flags.writeable else 2
           if arg.dtype.isbuiltin:
-            direct_copy_hdr.append((i, 2, (arg.shape, arg.dtype.char), nbytes))
+            direct_copy_hdr.append((i, tid, (arg.shape, arg.dtype.char), nbytes))
           else:
-            direct_copy_hdr.append((i, 2, (arg.shape, arg.dtype.name), nbytes))
+            direct_copy_hdr.append((i, tid, (arg.shape, arg.dtype.name), nbytes))
           send_bufs[cur_buf] = <char*>np_array.data
         elif isinstance(arg, bytes):
           nbytes = len(arg)
@@ -2,6 +2,11 @@ from . import wait
 from time import time
 import sys
 from greenlet import greenlet, getcurrent
+if sys.version_info >= (3, 5, 0):
+    from inspect import iscoroutinefunction
+else:
+    def iscoroutinefunction(func):
+        return False
 
 
 class EntryMethod(object):
@@ -22,6 +27,14 @@ class EntryMethod(object):
             else:
                 self.run = self._run_th_prof
             self.thread_notify = hasattr(method, '_ck_coro_notify') and method._ck_coro_notify
+        elif iscoroutinefunction(method):
+            # 'async def' entry method, runs on the asyncio event loop of
+            # the PE (note that _run_prof calls self._run)
+            self._run = self._run_aio
+            if not profile:
+                self.run = self._run
+            else:
+                self.run = self._run_prof
         else:
             if not profile:
                 self.run = self._run
@@ -33,8 +46,6 @@ class EntryMethod(object):
             # template object specifying the 'when' condition clause
             # for this entry method
             self.when_cond = getattr(method, 'when_cond')
-            if isinstance(self.when_cond, wait.ChareStateMsgCond):
-                self.when_cond_func = self.when_cond.cond_func
 
     def _run(self, obj, header, args):
         """ run entry method of the given object in the current thread """
@@ -55,17 +66,25 @@ class EntryMethod(object):
             charm.process_em_exc(e, obj, header)
             return
         if b'block' in header:
-            blockFuture = header[b'block']
-            if b'bcast' in header:
-                sid = None
-                if b'sid' in header:
-                    sid = header[b'sid']
-                if b'bcastret' in header:
-                    charm.contribute(ret, charm.reducers.gather, blockFuture, obj, sid)
-                else:
-                    charm.contribute(None, None, blockFuture, obj, sid)
+            self.sendReturnValue(obj, header, ret)
+
+    def sendReturnValue(self, obj, header, ret):
+        blockFuture = header[b'block']
+        if b'bcast' in header:
+            sid = None
+            if b'sid' in header:
+                sid = header[b'sid']
+            if b'bcastret' in header:
+                charm.contribute(ret, charm.reducers.gather, blockFuture, obj, sid)
             else:
-                blockFuture.send(ret)  # send result back to remote
+                charm.contribute(None, None, blockFuture, obj, sid)
+        else:
+            blockFuture.send(ret)  # send result back to remote
+
+    def _run_aio(self, obj, header, args):
+        charm.last_em_exec = self
+        from . import aio
+        aio.startEntryMethod(self, obj, header, args)
 
     def _run_prof(self, obj, header, args):
         ems = getcurrent().em_callstack
@@ -87,19 +106,39 @@ class EntryMethod(object):
             raise exception
 
     def _run_th(self, obj, header, args):
-        gr = greenlet(self._run)
+        if getcurrent() == threadMgr.main_gr:
+            gr_pool = threadMgr.gr_pool
+            if len(gr_pool) > 0:
+                # reuse an idle greenlet (see EntryMethodThreadManager.greenletLoop)
+                gr = gr_pool.pop()
+                gr.task = (self, obj, header, args)
+                switch_args = ()
+            else:
+                gr = greenlet(threadMgr.greenletLoop)
+                gr.gen = 0
+                switch_args = (self, obj, header, args)
+        else:
+            # this can happen with threaded chare constructors that are called
+            # "inline" by Charm++. The greenlet needs the current greenlet as
+            # parent (see EntryMethodThreadManager.pauseThread), so don't reuse
+            gr = greenlet(self._run)
+            gr.gen = 0
+            switch_args = (obj, header, args)
         gr.obj = obj
         gr.notify = self.thread_notify
         obj._numthreads += 1
-        gr.switch(obj, header, args)
-        if gr.dead:
+        gr.switch(*switch_args)
+        if gr.dead or gr.obj is None:
             obj._numthreads -= 1
+            if obj._numthreads == 0 and obj._drain_actions is not None:
+                obj.__drained__()
 
     def _run_th_prof(self, obj, header, args):
         ems = getcurrent().em_callstack
         if len(ems) > 0:
             ems[-1].stopMeasuringTime()
         gr = greenlet(self._run)
+        gr.gen = 0
         gr.obj = obj
         gr.notify = self.thread_notify
         gr.em_callstack = [self]
@@ -112,6 +151,8 @@ class EntryMethod(object):
             exception = e
         if gr.dead:
             obj._numthreads -= 1
+            if obj._numthreads == 0 and obj._drain_actions is not None:
+                obj.__drained__()
         self.stopMeasuringTime()
         if len(ems) > 0:
             ems[-1].startMeasuringTime()
@@ -186,5 +227,6 @@ def coro_ext(event_notify=False):
 
 
 def charmStarting():
-    global charm
+    global charm, threadMgr
     from .charm import charm
+    threadMgr = charm.threadMgr
@@ -0,0 +1,110 @@
+# Load balancing with strategies written in Python (see charm.setLBStrategy).
+#
+# When a strategy is registered, array elements measure the time spent in their
+# entry methods (including resumed coroutines). Calling AtSync contributes the load and PE of the element to
+# a gather reduction that is sent to PE 0, where the strategy computes the new
+# placement of the array's elements. The elements that have to move are
+# migrated by their current PE (with CkMigrate), and every migrated element
+# notifies PE 0 when it arrives at its new PE. Once all the migrations have
+# completed, resumeFromSync is called on every element of the array.
+from collections import defaultdict
+from time import time
+
+
+pending = {}  # aid -> number of migrations that haven't completed (on PE 0)
+# array elements whose load is being measured on this PE. The last one is the
+# element that is running (time is only added to this one, so that the time of
+# an element that runs inside another is not counted twice)
+measuring = []
+measure_start = 0.0
+
+
+def startMeasure(obj):
+    global measure_start
+    now = time()
+    if len(measuring) > 0:
+        measuring[-1]._lb_load += now - measure_start
+    measuring.append(obj)
+    measure_start = now
+
+
+def stopMeasure():
+    global measure_start
+    now = time()
+    measuring.pop()._lb_load += now - measure_start
+    measure_start = now
+
+
+def atSync(obj):
+    stats = (obj.thisProxy.aid, obj.thisIndex, charm.myPe(), obj._lb_load, obj.migratable)
+    obj._lb_load = 0.0
+    obj.contribute(stats, Reducer.gather, charm.thisProxy[0]._lb_balance)
+
+
+def balance(stats):
+    aid = stats[0][0]
+    loads = {}  # index -> load
+    placement = {}  # index -> pe
+    pinned = set()  # indexes of elements that are not migratable
+    for _, index, pe, load, migratable in stats:
+        loads[index] = load
+        placement[index] = pe
+        if not migratable:
+            pinned.add(index)
+    new_placement = charm.lb_strategy(loads, placement)
+    moves = defaultdict(list)  # pe -> list of (index, dest_pe) of elements that pe has to migrate
+    num_moves = 0
+    if new_placement is not None:
+        numPes = charm.numPes()
+        for index, dest_pe in new_placement.items():
+            if index not in placement:
+                raise Charm4PyError('Load balancing strategy returned unknown element ' + str(index))
+            pe = placement[index]
+            if dest_pe == pe or index in pinned:
+                continue
+            if dest_pe < 0 or dest_pe >= numPes:
+                raise Charm4PyError('Load balancing strategy returned invalid PE ' + str(dest_pe) +
+                                    ' for element ' + str(index))
+            moves[pe].append((index, dest_pe))
+            num_moves += 1
+    if num_moves == 0:
+        charm.thisProxy._lb_resume(aid)
+    else:
+        pending[aid] = num_moves
+        for pe, pe_moves in moves.items():
+            charm.thisProxy[pe]._lb_migrate(aid, pe_moves)
+
+
+def migrate(aid, moves):
+    array = charm.arrays[aid]
+    for index, dest_pe in moves:
+        # the element notifies PE 0 when it arrives at dest_pe. If it has
+        # coroutines in progress, it migrates when they finish
+        obj = array[index]
+        obj._lb_migrating = True
+        obj.migrate(dest_pe)
+
+
+# called when an element that was migrated by the strategy arrives at its new PE
+def arrived(obj):
+    del obj._lb_migrating
+    charm.thisProxy[0]._lb_arrived(obj.thisProxy.aid)
+
+
+def migrationDone(aid):
+    pending[aid] -= 1
+    if pending[aid] == 0:
+        del pending[aid]
+        charm.thisProxy._lb_resume(aid)
+
+
+def resume(aid):
+    for obj in list(charm.arrays[aid].values()):
+        if hasattr(obj, 'resumeFromSync'):
+            charm.invokeEntryMethod(obj, obj.thisProxy.resumeFromSync.ep, {}, ())
+
+
+def charmStarting():
+    global charm, Charm4PyError, Reducer
+    from .charm import charm, Charm4PyError
+    Reducer = charm.reducers
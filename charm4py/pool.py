@@ -1,12 +1,120 @@
 from . import charm, Chare, Group, coro_ext, threads, Future
 from .charm import Charm4PyError
 from .threads import NotThreadedError
-from collections import defaultdict
+from collections import defaultdict, OrderedDict, deque
 from copy import deepcopy
+from time import time
+import hashlib
 import sys
+if sys.version_info < (3, 0, 0):
+    import cPickle
+else:
+    import pickle as cPickle
+try:
+    import numpy
+except ImportError:
+    # this is to avoid numpy dependency
+    class NumpyDummy:
+        ndarray = None
+    numpy = NumpyDummy()
 
 
 INITIAL_MAX_JOBS = 2048
+MAX_JOB_STATS = 128  # max number of completed jobs for which stats are kept
+
+
+# Functions to take a snapshot of the arguments of tasks created on PE 0 (see
+# Pool.Task). The mode is selected with charm.options.pool.snapshot
+
+def snapshot_deepcopy(obj):
+    return deepcopy(obj)
+
+
+def snapshot_pickle(obj):
+    # a pickle round-trip produces a deep copy. With pickle protocol 5, the
+    # data of objects like numpy arrays is passed out-of-band and copied
+    # directly, without going through the pickle stream
+    if sys.version_info >= (3, 8, 0):
+        buffers = []
+        data = cPickle.dumps(obj, 5, buffer_callback=buffers.append)
+        return cPickle.loads(data, buffers=[bytearray(b.raw()) for b in buffers])
+    return cPickle.loads(cPickle.dumps(obj, charm.options.pickle_protocol))
+
+
+# output arrays of map_array calls made on PE 0, where the scheduler writes the
+# results directly (tag -> array)
+array_outputs = {}
+array_outputs_next_tag = 0
+
+frozen_arrays = {}  # id(array) -> [array, number of pending jobs that froze it]
+# arrays frozen by the jobs submitted on PE 0, which the scheduler makes
+# writable again when the jobs complete (tag -> list of frozen arrays)
+frozen_jobs = {}
+frozen_jobs_next_tag = 0
+
+
+def snapshot_freeze(obj, frozen):
+    # numpy arrays are not copied, instead they are made read-only, so that
+    # the caller can't modify them in-place after submitting the tasks. The
+    # arrays that are frozen are appended to 'frozen', and become writable
+    # again when the jobs that use them complete (see thaw). Other objects
+    # are deep-copied
+    t = type(obj)
+    if t == numpy.ndarray:
+        entry = frozen_arrays.get(id(obj))
+        if entry is not None:
+            entry[1] += 1
+            frozen.append(obj)
+        elif obj.flags.writeable:
+            obj.setflags(write=False)
+            frozen_arrays[id(obj)] = [obj, 1]
+            frozen.append(obj)
+        return obj
+    elif t == list or t == tuple:
+        return t([snapshot_freeze(o, frozen) for o in obj])
+    return deepcopy(obj)
+
+
+def thaw(frozen):
+    for a in frozen:
+        entry = frozen_arrays[id(a)]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del frozen_arrays[id(a)]
+            a.setflags(write=True)
+
+
+def snapshot_none(obj):
+    return obj
+
+
+snapshot_funcs = {'deepcopy': snapshot_deepcopy, 'pickle': snapshot_pickle,
+                  'freeze': snapshot_freeze, 'none': snapshot_none}
+
+
+def snapshot(obj):
+    """ Returns the snapshot of obj, and the list of arrays that were frozen
+        (None if the mode is not 'freeze') """
+    mode = charm.options.pool.snapshot
+    if mode not in snapshot_funcs:
+        raise Charm4PyError('Invalid value for charm.options.pool.snapshot: ' +
+                            str(mode) + '. Valid values are ' + str(sorted(snapshot_funcs)))
+    if mode == 'freeze':
+        frozen = []
+        return snapshot_freeze(obj, frozen), frozen
+    return snapshot_funcs[mode](obj), None
+
+
+def registerFrozen(frozen):
+    """ Returns the tag with which the scheduler finds the arrays frozen by a
+        job (None if no arrays were frozen) """
+    global frozen_jobs_next_tag
+    if not frozen:
+        return None
+    tag = frozen_jobs_next_tag
+    frozen_jobs_next_tag += 1
+    frozen_jobs[tag] = frozen
+    return tag
 
 
 class Task(object):
@@ -30,16 +138,25 @@ class Chunk(object):
 
 class Job(object):
 
-    def __init__(self, id, func, tasks, result, ncores, chunksize):
+    def __init__(self, id, func, tasks, result, ncores, chunksize, priority=1):
         self.id = id
         self.max_cores = ncores
         self.n_avail = ncores
+        # the scheduler does weighted round-robin across jobs: in each round a
+        # job can dispatch up to 'priority' tasks before yielding to the next job
+        self.priority = priority
+        self.credits = priority
         self.func = func  # if func is not None, function is the same for all tasks in the job
         self.workers = []  # ID of workers who have executed tasks from this job
         self.chunked = chunksize > 1
         self.threaded = False
         self.failed = False
         self.single_task = False
+        # if the job is memoized, this is (results, positions of tasks that
+        # missed the cache, cache keys of those tasks)
+        self.memo = None
+        self.stats = None  # JobStats object (only in profiling mode)
+        self.frozen = None  # arrays frozen by the snapshot of this job's tasks
         assert chunksize > 0
         if func is not None:
             self.threaded = hasattr(func, '_ck_coro')
@@ -86,6 +203,124 @@ class Job(object):
         self.tasks_pending -= 1
 
 
+class JobStats(object):
+    """ Metrics of a pool job, collected by the scheduler in profiling mode.
+        Times are in seconds, sizes in bytes """
+
+    def __init__(self, func, num_tasks):
+        self.func = getattr(func, '__name__', str(func))
+        self.num_tasks = num_tasks  # number of tasks (or chunks) sent to workers
+        self.submit_time = time()
+        self.elapsed = 0.0  # time from submission to completion of the job
+        self.queue_time = 0.0  # total time that tasks waited to be dispatched
+        self.max_queue_time = 0.0
+        self.exec_time = 0.0  # total execution time of tasks on the workers
+        self.max_exec_time = 0.0
+        self.result_bytes = 0  # total size of the messages carrying results
+        self.failed = False
+
+    def taskDispatched(self):
+        t = time() - self.submit_time
+        self.queue_time += t
+        self.max_queue_time = max(t, self.max_queue_time)
+
+    def taskDone(self, exec_time, result_bytes):
+        self.exec_time += exec_time
+        self.max_exec_time = max(exec_time, self.max_exec_time)
+        self.result_bytes += result_bytes
+
+    def mean_queue_time(self):
+        return self.queue_time / max(self.num_tasks, 1)
+
+    def mean_exec_time(self):
+        return self.exec_time / max(self.num_tasks, 1)
+
+
+class WorkerStats(object):
+    """ Metrics of a pool worker, collected by the scheduler in profiling mode.
+        Times are in seconds, sizes in bytes """
+
+    def __init__(self):
+        self.num_tasks = 0  # number of tasks (or chunks) executed
+        self.busy_time = 0.0  # time executing tasks
+        self.idle_time = 0.0  # time since the pool started that was not busy
+        self.result_bytes = 0  # total size of the messages carrying results
+
+
+class PoolStats(object):
+
+    def __init__(self, jobs, workers):
+        self.jobs = jobs  # list of JobStats of the most recently completed jobs
+        self.workers = workers  # worker PE -> WorkerStats
+
+
+class MemoCache(object):
+    """ LRU cache of task results, keyed by the function of the task and a
+        hash of its pickled arguments. Results are stored pickled, so that
+        every cache hit returns a new copy of the result """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, func, args):
+        if func is None:
+            # task of charm.pool.submit: args is a (function, args) tuple
+            func, args = args
+        # the function object is part of the key (functions hash by identity),
+        # so that different functions with the same qualified name don't collide
+        return (func, hashlib.sha1(cPickle.dumps(args, charm.options.pickle_protocol)).digest())
+
+    def lookup(self, func, tasks):
+        """ Look up the tasks in the cache. Returns the memo info for the job
+            and the list of tasks that missed the cache """
+        cache = self.cache
+        results = [None] * len(tasks)
+        positions = []
+        keys = []
+        missed = []
+        for i, args in enumerate(tasks):
+            key = self.key(func, args)
+            if key in cache:
+                # move to the end (most recently used)
+                cache[key] = cache.pop(key)
+                results[i] = cPickle.loads(cache[key])
+                self.hits += 1
+            else:
+                positions.append(i)
+                keys.append(key)
+                missed.append(args)
+                self.misses += 1
+        return (results, positions, keys), missed
+
+    def update(self, memo, missed_results):
+        """ Store the results of the tasks that missed the cache, and return
+            the complete list of results of the job """
+        results, positions, keys = memo
+        cache = self.cache
+        protocol = charm.options.pickle_protocol
+        for i, key, result in zip(positions, keys, missed_results):
+            results[i] = result
+            if self.maxsize <= 0:
+                continue
+            if key in cache:
+                del cache[key]
+            elif len(cache) >= self.maxsize:
+                cache.popitem(last=False)  # evict least recently used
+            cache[key] = cPickle.dumps(result, protocol)
+        return results
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = 0.0
+        if total > 0:
+            hit_rate = self.hits / float(total)
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': hit_rate,
+                'size': len(self.cache), 'maxsize': self.maxsize}
+
+
 class PoolScheduler(Chare):
 
     def __init__(self):
@@ -97,6 +332,12 @@ class PoolScheduler(Chare):
         self.job_next = None
         self.job_last = self
         self.worker_knows = defaultdict(set)
+        self.memo_cache = MemoCache(charm.options.pool.memo_cache_size)
+        self.profiling = charm.options.profiling
+        if self.profiling:
+            self.job_stats = deque(maxlen=MAX_JOB_STATS)
+            self.worker_stats = {w: WorkerStats() for w in self.idle_workers}
+        charm.poolScheduler = self
         self.setMigratable(False)
 
     def __start__(self, func, tasks, result):
@@ -107,6 +348,7 @@ class PoolScheduler(Chare):
                   'Warning: charm.pool is experimental (API and performance '
                   'is subject to change)')
             self.workers = Group(Worker, args=[self.thisProxy])
+            self.start_time = time()
 
         if len(self.job_id_pool) == 0:
             oldSize = len(self.jobs)
@@ -136,10 +378,43 @@ class PoolScheduler(Chare):
         self.job_last = job
         job.job_next = None
 
-    def startSingleTask(self, func, future, *args):
+    def __thawJob__(self, job):
+        if job.frozen is not None:
+            thaw(job.frozen)
+            job.frozen = None
+
+    def __jobDone__(self, job):
+        self.__thawJob__(job)
+        self.jobs[job.id] = None
+        self.job_id_pool.add(job.id)
+        for worker_id in job.workers:
+            self.worker_knows[worker_id].remove(job.id)
+        if job.memo is not None:
+            job.results = self.memo_cache.update(job.memo, job.results)
+        if job.stats is not None:
+            self.__recordJobStats__(job)
+        if hasattr(job, 'future') and job.future is not None:
+            if job.single_task:
+                job.future.send(job.results[0])
+            else:
+                job.future.send(job.results)
+
+    def startSingleTask(self, func, future, priority, memoize, frozen_tag, *args):
         self.__start__(func, None, None)
-        job = Job(self.job_id_pool.pop(), func, (args,), future, self.num_workers, 1)
+        tasks = (args,)
+        memo = None
+        if memoize:
+            memo, tasks = self.memo_cache.lookup(func, tasks)
+        job = Job(self.job_id_pool.pop(), func, tasks, future, self.num_workers, 1, priority)
         job.single_task = True
+        job.memo = memo
+        if frozen_tag is not None:
+            job.frozen = frozen_jobs.pop(frozen_tag)
+        if self.profiling:
+            job.stats = JobStats(func, len(job.tasks))
+        if job.tasks_pending == 0:
+            # result was in the cache
+            return self.__jobDone__(job)
         self.__addJob__(job)
         if job.threaded:
             job.remote = self.workers.runTask_star_th
@@ -147,7 +422,7 @@ class PoolScheduler(Chare):
             job.remote = self.workers.runTask_star
         self.schedule()
 
-    def start(self, func, tasks, result, ncores, chunksize):
+    def __numCores__(self, ncores):
         assert ncores != 0
         if ncores < 0:
             ncores = self.num_workers
@@ -155,10 +430,25 @@ class PoolScheduler(Chare):
             print('charm.pool Warning: requested more cores than are '
                   'available. Using max available cores')
             ncores = self.num_workers
+        return ncores
 
+    def start(self, func, tasks, result, ncores, chunksize, priority=1, memoize=False,
+              frozen_tag=None):
+        ncores = self.__numCores__(ncores)
         self.__start__(func, tasks, result)
 
-        job = Job(self.job_id_pool.pop(), func, tasks, result, ncores, chunksize)
+        memo = None
+        if memoize:
+            memo, tasks = self.memo_cache.lookup(func, tasks)
+        job = Job(self.job_id_pool.pop(), func, tasks, result, ncores, chunksize, priority)
+        job.memo = memo
+        if frozen_tag is not None:
+            job.frozen = frozen_jobs.pop(frozen_tag)
+        if self.profiling:
+            job.stats = JobStats(func, len(job.tasks))
+        if job.tasks_pending == 0:
+            # all results were in the cache
+            return self.__jobDone__(job)
         self.__addJob__(job)
 
         if job.chunked:
@@ -186,6 +476,34 @@ class PoolScheduler(Chare):
 
         self.schedule()
 
+    def startArray(self, func, array, result, axis, blocksize, ncores, priority, out_tag=None):
+        ncores = self.__numCores__(ncores)
+        self.__start__(func, None, result)
+        # each task is a contiguous block of the array, so that it can be
+        # direct-copied to the worker
+        n = array.shape[axis]
+        index = [slice(None)] * array.ndim
+        blocks = []
+        for start in range(0, n, blocksize):
+            index[axis] = slice(start, start + blocksize)
+            blocks.append(numpy.ascontiguousarray(array[tuple(index)]))
+        job = Job(self.job_id_pool.pop(), func, blocks, result, ncores, 1, priority)
+        job.results = None  # output array, allocated when the first result arrives
+        job.array_info = (axis, blocksize, n)
+        # output array given by a caller on this PE (the results are written
+        # directly into it, and are not sent back to the caller)
+        job.array_out = None
+        if out_tag is not None:
+            job.array_out = array_outputs.pop(out_tag)
+        if self.profiling:
+            job.stats = JobStats(func, len(job.tasks))
+        self.__addJob__(job)
+        if job.threaded:
+            job.remote = self.workers.runArrayBlock_th
+        else:
+            job.remote = self.workers.runArrayBlock
+        self.schedule()
+
     def schedule(self):
         job = self.job_next
         prev = self
@@ -212,6 +530,9 @@ class PoolScheduler(Chare):
                     # faster and allows the scheduler to reuse the same proxy
                     self.workers.elemIdx = worker_id
                     job.remote(func, task.data, task.result_dest, job.id)
+                    job.credits -= 1
+                    if job.stats is not None:
+                        job.stats.taskDispatched()
 
                 if len(job.tasks) == 0:
                     prev.job_next = job.job_next
@@ -220,6 +541,17 @@ class PoolScheduler(Chare):
                     # print('Deleted job set')
                     job = None
                     break
+                if job.credits <= 0:
+                    job.credits = job.priority
+                    if job.job_next is not None:
+                        # job used up its share for this round, move it to the
+                        # end of the list so that the other jobs get their turn
+                        prev.job_next = job.job_next
+                        self.job_last.job_next = job
+                        self.job_last = job
+                        job.job_next = None
+                        job = None
+                        break
                 if len(self.idle_workers) == 0:
                     return
             # go to next job
@@ -229,11 +561,21 @@ class PoolScheduler(Chare):
             else:
                 job = prev.job_next
 
-    def taskFinished(self, worker_id, job_id, result=None):
+    def taskFinished(self, worker_id, job_id, result=None, stats=None):
         # print('Job finished')
         job = self.jobs[job_id]
         if job.failed:
             return self.taskError(worker_id, job_id, job.exception)
+        if stats is not None:
+            exec_time, result_bytes = stats
+            if result_bytes < 0:
+                # the result came in this message
+                result_bytes = charm.msg_recv_stats[4]
+            job.stats.taskDone(exec_time, result_bytes)
+            worker_stats = self.worker_stats[worker_id]
+            worker_stats.num_tasks += 1
+            worker_stats.busy_time += exec_time
+            worker_stats.result_bytes += result_bytes
         if result is not None:
             if job.chunked:
                 i, results = result
@@ -245,17 +587,73 @@ class PoolScheduler(Chare):
         self.idle_workers.add(worker_id)
         job.taskDone()
         if job.tasks_pending == 0:
-            self.jobs[job_id] = None
-            self.job_id_pool.add(job_id)
-            for worker_id in job.workers:
-                self.worker_knows[worker_id].remove(job.id)
-            if result is not None and job.future is not None:
-                if job.single_task:
-                    job.future.send(job.results[0])
-                else:
-                    job.future.send(job.results)
+            self.__jobDone__(job)
         self.schedule()
 
+    def getMemoStats(self):
+        return self.memo_cache.stats()
+
+    def __recordJobStats__(self, job):
+        job.stats.elapsed = time() - job.stats.submit_time
+        job.stats.failed = job.failed
+        self.job_stats.append(job.stats)
+
+    def getStats(self):
+        if self.workers is not None:
+            elapsed = time() - self.start_time
+            for worker_stats in self.worker_stats.values():
+                worker_stats.idle_time = max(elapsed - worker_stats.busy_time, 0.0)
+        return PoolStats(list(self.job_stats), self.worker_stats)
+
+    def __printStats__(self):
+        stats = self.getStats()
+        print('\ncharm.pool jobs (most recent ' + str(len(stats.jobs)) + '):')
+        table = [['func', 'tasks', 'elapsed', 'queue (mean / max)',
+                  'exec (mean / max)', 'result bytes']]
+        for job in stats.jobs:
+            func = job.func
+            if job.failed:
+                func += ' (failed)'
+            table.append([func, str(job.num_tasks), str(round(job.elapsed, 3)),
+                          str(round(job.mean_queue_time(), 4)) + ' / ' + str(round(job.max_queue_time, 4)),
+                          str(round(job.mean_exec_time(), 4)) + ' / ' + str(round(job.max_exec_time, 4)),
+                          str(job.result_bytes)])
+        charm.__printTable__(table, {1: '-----------------------------------------------------------'})
+        print('\ncharm.pool workers:')
+        table = [['PE', 'tasks', 'busy', 'idle', 'result bytes']]
+        for worker_id in sorted(stats.workers):
+            w = stats.workers[worker_id]
+            table.append([str(worker_id), str(w.num_tasks), str(round(w.busy_time, 3)),
+                          str(round(w.idle_time, 3)), str(w.result_bytes)])
+        charm.__printTable__(table, {1: '-----------------------------------------------------------'})
+        print('')
+
+    def clearMemoCache(self):
+        self.memo_cache.cache.clear()
+
+    def arrayBlockFinished(self, worker_id, job_id, block_idx, result, stats=None):
+        job = self.jobs[job_id]
+        if not job.failed:
+            axis, blocksize, n = job.array_info
+            start = block_idx * blocksize
+            block_len = min(blocksize, n - start)
+            out = job.array_out
+            if out is None:
+                if job.results is None and result.ndim > axis:
+                    shape = list(result.shape)
+                    shape[axis] = n
+                    job.results = numpy.empty(shape, dtype=result.dtype)
+                out = job.results
+            if out is None or result.ndim != out.ndim or result.shape[axis] != block_len or \
+                    result.shape[:axis] + result.shape[axis+1:] != out.shape[:axis] + out.shape[axis+1:]:
+                e = Charm4PyError('map_array: the results of func must have the same shape for every '
+                                  'block, and the same length as the input block along axis ' + str(axis))
+                return self.taskError(worker_id, job_id, e)
+            index = [slice(None)] * result.ndim
+            index[axis] = slice(start, start + block_len)
+            out[tuple(index)] = result
+        self.taskFinished(worker_id, job_id, None, stats)
+
     def threadPaused(self, worker_id):
         self.idle_workers.add(worker_id)
         self.schedule()
@@ -288,6 +686,9 @@ class PoolScheduler(Chare):
             self.job_id_pool.add(job_id)
             for worker_id in job.workers:
                 self.worker_knows[worker_id].remove(job.id)
+            if job.stats is not None:
+                self.__recordJobStats__(job)
+            self.__thawJob__(job)
             if hasattr(job, 'future'):
                 if job.future is not None:
                     job.future.send(job.exception)
@@ -304,6 +705,9 @@ class Worker(Chare):
         self.__addThreadEventSubscriber__(scheduler, self.thisIndex)
         # TODO: when to purge entries from this dict?
         self.funcs = {}  # job ID -> function used by this job ID
+        # if profiling, measure execution time of tasks and size of results
+        # sent to futures, and send them to the scheduler
+        self.profiling = charm.options.profiling
 
     @coro_ext(event_notify=True)
     def runTaskSingleFunc_th(self, func, args, result_destination, job_id):
@@ -322,13 +726,11 @@ class Worker(Chare):
 
     def runTask(self, func, args, result_destination, job_id):
         try:
+            t0 = None
+            if self.profiling:
+                t0 = time()
             result = func(args)
-            if isinstance(result_destination, int):
-                self.scheduler.taskFinished(self.thisIndex, job_id, (result_destination, result))
-            else:
-                # assume result_destination is a future
-                result_destination.send(result)
-                self.scheduler.taskFinished(self.thisIndex, job_id)
+            self.send_task_result(result, result_destination, job_id, t0)
         except Exception as e:
             if isinstance(e, NotThreadedError):
                 e = Charm4PyError('Function ' + str(func) + ' must be decorated with @coro to be able to suspend')
@@ -343,13 +745,11 @@ class Worker(Chare):
 
     def runTask_star(self, func, args, result_destination, job_id):
         try:
+            t0 = None
+            if self.profiling:
+                t0 = time()
             result = func(*args)
-            if isinstance(result_destination, int):
-                self.scheduler.taskFinished(self.thisIndex, job_id, (result_destination, result))
-            else:
-                # assume result_destination is a future
-                result_destination.send(result)
-                self.scheduler.taskFinished(self.thisIndex, job_id)
+            self.send_task_result(result, result_destination, job_id, t0)
         except Exception as e:
             if isinstance(e, NotThreadedError):
                 e = Charm4PyError('Function ' + str(func) + ' must be decorated with @coro to be able to suspend')
@@ -368,36 +768,97 @@ class Worker(Chare):
                 self.funcs[job_id] = func
             else:
                 func = self.funcs[job_id]
+            t0 = None
+            if self.profiling:
+                t0 = time()
             results = [func(args) for args in chunk]
-            self.send_chunk_results(results, result_destination, job_id)
+            self.send_chunk_results(results, result_destination, job_id, t0)
         except Exception as e:
             self.send_chunk_exc(e, result_destination, job_id)
 
     @coro_ext(event_notify=True)
     def runChunk_th(self, _, chunk, result_destination, job_id):
+        self.runChunk(_, chunk, result_destination, job_id)
+
+    def runChunk(self, _, chunk, result_destination, job_id):
         try:
+            t0 = None
+            if self.profiling:
+                t0 = time()
             results = [func(args) for func, args in chunk]
-            self.send_chunk_results(results, result_destination, job_id)
+            self.send_chunk_results(results, result_destination, job_id, t0)
         except Exception as e:
             self.send_chunk_exc(e, result_destination, job_id)
 
-    def runChunk(self, _, chunk, result_destination, job_id):
+    @coro_ext(event_notify=True)
+    def runArrayBlock_th(self, func, block, block_idx, job_id):
+        self.runArrayBlock(func, block, block_idx, job_id)
+
+    def runArrayBlock(self, func, block, block_idx, job_id):
+        if func is not None:
+            self.funcs[job_id] = func
+        else:
+            func = self.funcs[job_id]
         try:
-            results = [func(args) for func, args in chunk]
-            self.send_chunk_results(results, result_destination, job_id)
+            t0 = None
+            if self.profiling:
+                t0 = time()
+            result = numpy.ascontiguousarray(func(block))
+            stats = None
+            if t0 is not None:
+                stats = (time() - t0, -1)
+            # result is passed as a separate argument so that it is direct-copied
+            self.scheduler.arrayBlockFinished(self.thisIndex, job_id, block_idx, result, stats)
         except Exception as e:
-            self.send_chunk_exc(e, result_destination, job_id)
+            if isinstance(e, NotThreadedError):
+                e = Charm4PyError('Function ' + str(func) + ' must be decorated with @coro to be able to suspend')
+            charm.prepareExceptionForSend(e)
+            self.scheduler.taskError(self.thisIndex, job_id, e)
 
-    def send_chunk_results(self, results, result_destination, job_id):
+    def send_task_result(self, result, result_destination, job_id, t0):
+        # t0 is the time when the task started executing (None if not profiling)
+        stats = None
+        if isinstance(result_destination, int):
+            if t0 is not None:
+                # result size is measured by the scheduler when it receives it
+                stats = (time() - t0, -1)
+            self.scheduler.taskFinished(self.thisIndex, job_id, (result_destination, result), stats)
+        else:
+            # assume result_destination is a future
+            if t0 is not None:
+                exec_time = time() - t0
+                sent_bytes = charm.msg_send_stats[3]
+            result_destination.send(result)
+            if t0 is not None:
+                stats = (exec_time, charm.msg_send_stats[3] - sent_bytes)
+            self.scheduler.taskFinished(self.thisIndex, job_id, None, stats)
+
+    def send_chunk_results(self, results, result_destination, job_id, t0):
+        stats = None
         if isinstance(result_destination, int):
-            self.scheduler.taskFinished(self.thisIndex, job_id, (result_destination, results))
+            if t0 is not None:
+                stats = (time() - t0, -1)
+            self.scheduler.taskFinished(self.thisIndex, job_id, (result_destination, results), stats)
         else:
             # assume result_destination is a list of futures
-            # TODO: should send all results together to PE where future was created,
-            # and then send from there to destination future
-            for i, result in enumerate(results):
-                result_destination[i].send(result)
-            self.scheduler.taskFinished(self.thisIndex, job_id)
+            if t0 is not None:
+                exec_time = time() - t0
+                sent_bytes = charm.msg_send_stats[3]
+            self.send_to_futures(result_destination, results)
+            if t0 is not None:
+                stats = (exec_time, charm.msg_send_stats[3] - sent_bytes)
+            self.scheduler.taskFinished(self.thisIndex, job_id, None, stats)
+
+    def send_to_futures(self, futures, results):
+        # group results by the PE where their futures were created, and send
+        # them together (one message per PE) to be deposited there
+        dests = defaultdict(lambda: ([], []))
+        for f, result in zip(futures, results):
+            fids, values = dests[f.src]
+            fids.append(f.fid)
+            values.append(result)
+        for pe, (fids, values) in dests.items():
+            charm.thisProxy[pe]._future_deposit_results(fids, values)
 
     def send_chunk_exc(self, e, result_destination, job_id):
         if isinstance(e, NotThreadedError):
@@ -405,8 +866,7 @@ class Worker(Chare):
         charm.prepareExceptionForSend(e)
         self.scheduler.taskError(self.thisIndex, job_id, e)
         if not isinstance(result_destination, int):
-            for f in result_destination:
-                f.send(e)
+            self.send_to_futures(result_destination, [e] * len(result_destination))
 
     def check(self, func_module, func_name):
         if charm.options.remote_exec is not True:
@@ -423,7 +883,8 @@ class Pool(object):
         self.pool_scheduler = pool_scheduler
         self.mype = charm.myPe()
 
-    def Task(self, func, args, ret=False, awaitable=False):
+    def Task(self, func, args, ret=False, awaitable=False, priority=1, memoize=False):
+        assert priority >= 1, 'priority must be a positive integer'
         if self.mype == 0:
             # since the PoolScheduler is on PE 0, it will get references to the
             # same objects that the caller has when creating a Task from PE0.
@@ -432,36 +893,121 @@ class Pool(object):
             # on PE 0. But the internals of this are hidden from the user, so
             # it is not obvious. The safest thing is to copy them so users
             # don't have to worry about this special case
-            args = deepcopy(args)
+            args, frozen = snapshot(args)
+        else:
+            frozen = None
         f = None
         if ret or awaitable:
             f = Future()
-        # unpack the arguments for sending to allow benefiting from direct copy
-        self.pool_scheduler.startSingleTask(func, f, *args)
+        frozen_tag = registerFrozen(frozen)
+        try:
+            # unpack the arguments for sending to allow benefiting from direct copy
+            self.pool_scheduler.startSingleTask(func, f, priority, memoize, frozen_tag, *args)
+        except:
+            if frozen_tag is not None:
+                thaw(frozen_jobs.pop(frozen_tag, []))
+            raise
         return f
 
-    def map(self, func, iterable, chunksize=1, ncores=-1):
+    def map(self, func, iterable, chunksize=1, ncores=-1, priority=1, memoize=False):
+        assert priority >= 1, 'priority must be a positive integer'
         result = Future()
         # TODO shouldn't send task objects to a central place. what if they are large?
-        self.pool_scheduler.start(func, iterable, result, ncores, chunksize)
+        self.pool_scheduler.start(func, iterable, result, ncores, chunksize, priority, memoize)
         return result.get()
 
-    def map_async(self, func, iterable, chunksize=1, ncores=-1, multi_future=False):
+    def map_async(self, func, iterable, chunksize=1, ncores=-1, multi_future=False, priority=1,
+                  memoize=False):
+        assert priority >= 1, 'priority must be a positive integer'
+        # with multiple futures the results go directly from the workers to
+        # the futures, and the scheduler never sees them
+        assert not (memoize and multi_future), 'memoize is not supported with multi_future'
         if self.mype == 0:
-            # see deepcopy comment above (only need this for async case since
+            # see snapshot comment above (only need this for async case since
             # the sync case won't return until all the tasks have finished)
-            iterable = deepcopy(iterable)
+            iterable, frozen = snapshot(iterable)
+        else:
+            frozen = None
         if multi_future:
             result = [Future() for _ in range(len(iterable))]
         else:
             result = Future()
-        self.pool_scheduler.start(func, iterable, result, ncores, chunksize)
+        frozen_tag = registerFrozen(frozen)
+        try:
+            self.pool_scheduler.start(func, iterable, result, ncores, chunksize, priority,
+                                      memoize, frozen_tag)
+        except:
+            if frozen_tag is not None:
+                thaw(frozen_jobs.pop(frozen_tag, []))
+            raise
         return result
 
+    def map_array(self, func, array, axis=0, blocksize=None, ncores=-1, priority=1, out=None):
+        """ Applies func to blocks of the numpy array, where blocks are
+            consecutive slices of 'blocksize' elements along 'axis'. func must
+            return an array with the same length as its input block along
+            'axis'. Returns the results assembled in one array (in 'out' if
+            given) """
+        assert isinstance(array, numpy.ndarray) and not array.dtype.hasobject, \
+               'map_array requires a numpy array of non-object dtype'
+        assert priority >= 1, 'priority must be a positive integer'
+        if axis < 0:
+            axis += array.ndim
+        n = array.shape[axis]
+        assert n > 0, 'map_array requires a non-empty array'
+        if blocksize is None:
+            # one block per core
+            nblocks = charm.numPes() - 1
+            if ncores > 0:
+                nblocks = ncores
+            nblocks = max(nblocks, 1)
+            blocksize = (n + nblocks - 1) // nblocks
+        assert blocksize > 0
+        assert out is None or (out.ndim > axis and out.shape[axis] == n), \
+               'map_array: out must have the same length as array along axis'
+        result = Future()
+        out_tag = None
+        if out is not None and self.mype == 0:
+            # the scheduler runs on this PE, and writes the blocks directly into out
+            global array_outputs_next_tag
+            out_tag = array_outputs_next_tag
+            array_outputs_next_tag += 1
+            array_outputs[out_tag] = out
+        try:
+            # array is passed as a separate argument so that it is direct-copied
+            self.pool_scheduler.startArray(func, numpy.ascontiguousarray(array), result,
+                                           axis, blocksize, ncores, priority, out_tag)
+        except:
+            if out_tag is not None:
+                array_outputs.pop(out_tag, None)
+            raise
+        result = result.get()
+        if out is not None:
+            if out_tag is None:
+                out[...] = result
+            return out
+        return result
+
+    def stats(self):
+        """ Returns a PoolStats object with metrics of the most recently
+            completed jobs and of each worker. Requires profiling """
+        if not charm.options.profiling:
+            raise Charm4PyError('charm.pool.stats() requires profiling (set charm.options.profiling to True)')
+        return self.pool_scheduler.getStats(ret=True).get()
+
+    def memo_stats(self):
+        """ Returns a dict with statistics of the pool's memoization cache
+            (hits, misses, hit_rate, size and maxsize) """
+        return self.pool_scheduler.getMemoStats(ret=True).get()
+
+    def clear_memo_cache(self):
+        self.pool_scheduler.clearMemoCache(awaitable=True).get()
+
     # iterable is a sequence of (function, args) tuples
     # NOTE: this API may change in the future
-    def submit(self, iterable, chunksize=1, ncores=-1):
-        return self.map(None, iterable, chunksize, ncores)
+    def submit(self, iterable, chunksize=1, ncores=-1, priority=1, memoize=False):
+        return self.map(None, iterable, chunksize, ncores, priority, memoize)
 
-    def submit_async(self, iterable, chunksize=1, ncores=-1, multi_future=False):
-        return self.map_async(None, iterable, chunksize, ncores, multi_future)
+    def submit_async(self, iterable, chunksize=1, ncores=-1, multi_future=False, priority=1,
+                     memoize=False):
+        return self.map_async(None, iterable, chunksize, ncores, multi_future, priority, memoize)
@@ -1,5 +1,5 @@
 from . import charm, Chare, Group, Reducer, when
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 
 # Reduction Info object: holds state for an in-progress reduction
@@ -9,6 +9,109 @@ class RedInfo(object):
         self.msgs = []  # list of reduction msgs received on this PE
         self.reducer = None  # reducer function
         self.cb = None  # reduction callback
+        self.cancelled = False  # reduction was cancelled by one or more contributors
+
+
+class SectionProxyCache(object):
+    """ LRU cache of the section proxies obtained by slicing proxies, so that
+        slicing a collection repeatedly in the same way reuses the section.
+        Keys are (collection, slice spec), where collection identifies the
+        sliced proxy (array ID or group ID, and section if the proxy is a
+        section proxy).
+
+        Cached proxies are stamped with the membership epoch of their
+        collection, and are discarded when they are used after a newer epoch
+        is known on this PE. Epochs are (counter, pe) pairs, created by the PE
+        that changes the membership of the collection with a counter that is
+        higher than any known there. Array proxies carry the epoch of the last
+        insertion done through them, so a PE that receives the proxy after the
+        insertion doesn't use the sections cached before it """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.proxies = OrderedDict()  # key -> (section proxy, epoch) (least recently used first)
+        self.epochs = {}  # collection -> latest membership epoch known on this PE
+        self.pending_bcast = {}  # collection -> epoch to send to the other PEs (see invalidateAllPes)
+
+    def get(self, key, epoch=None):
+        """ Returns the cached proxy for key (None if there is none, or if it
+            is stale). *epoch* is the epoch carried by the sliced proxy """
+        collection = key[0][0]
+        if epoch is not None:
+            self.observe(collection, epoch)
+        proxies = self.proxies
+        entry = proxies.get(key)
+        if entry is None:
+            return None
+        del proxies[key]
+        if entry[1] != self.epochs.get(collection):
+            # the membership of the collection changed after the proxy was cached
+            return None
+        # move to the end (most recently used)
+        proxies[key] = entry
+        return entry[0]
+
+    def put(self, key, secproxy):
+        if self.max_size <= 0:
+            return
+        proxies = self.proxies
+        proxies.pop(key, None)
+        proxies[key] = (secproxy, self.epochs.get(key[0][0]))
+        if len(proxies) > self.max_size:
+            proxies.popitem(last=False)
+
+    def observe(self, collection, epoch):
+        """ Record a membership epoch of the collection seen on this PE """
+        current = self.epochs.get(collection)
+        if current is None or epoch > current:
+            self.epochs[collection] = epoch
+
+    def membershipChanged(self, collection):
+        """ Called when this PE changes the membership of the collection.
+            Returns the new epoch of the collection """
+        current = self.epochs.get(collection)
+        epoch = (1 if current is None else current[0] + 1, charm.myPe())
+        self.epochs[collection] = epoch
+        self.invalidateAllPes(collection, epoch)
+        return epoch
+
+    def invalidate(self, collection=None):
+        """ Remove the entries of the given collection (all if None) """
+        if collection is None:
+            self.proxies.clear()
+        else:
+            for key in [k for k in self.proxies if k[0][0] == collection]:
+                del self.proxies[key]
+
+    def invalidateAllPes(self, collection=None, epoch=None):
+        """ Remove the entries of the given collection (all if None) on every
+            PE, and send the new membership epoch of the collection (if any).
+            The entries of this PE are removed immediately. The other PEs are
+            notified with one broadcast that is sent after the current entry
+            method, so that multiple calls (for example, one per inserted
+            element) are combined """
+        self.invalidate(collection)
+        pending = self.pending_bcast
+        if len(pending) == 0:
+            charm.scheduleCallableAfter(self.sendInvalidations, 0)
+        if collection not in pending or (epoch is not None and
+                                         (pending[collection] is None or epoch > pending[collection])):
+            pending[collection] = epoch
+
+    def sendInvalidations(self):
+        collections = list(self.pending_bcast.items())
+        self.pending_bcast.clear()
+        charm.thisProxy._invalidateSections(collections)
+
+
+def sliceKey(proxy, spec):
+    if hasattr(proxy, 'gid'):
+        collection = proxy.gid
+    else:
+        collection = proxy.aid
+    if proxy.issec:
+        return ((collection, proxy.section), spec)
+    return ((collection, None), spec)
 
 
 class SectionManager(Chare):
@@ -20,6 +123,7 @@ class SectionManager(Chare):
             self.parent = None
             self.children = []  # these are PE numbers
             self.local_elems = []  # list of local chares that are part of the section
+            self.migrated = []  # (aid, index) of members that were in local_elems and migrated to other PEs
             self.buffered_msgs = []  # stores msgs received for this section before creation has completed
             self.redno = 0  # current reduction number for this section
             self.reds = []  # list of RedInfo objects for pending reductions
@@ -31,22 +135,26 @@ class SectionManager(Chare):
         self.profiling = charm.options.profiling
         self.sections = defaultdict(SectionManager.SectionEntry)  # stores section entries for this PE
         self.send_ep = self.thisProxy.sendToSection.ep
+        self.forwarded = False  # the msg being delivered to sendToSection has already been forwarded
+        charm.section_cache = SectionProxyCache(charm.options.section_cache_size)
 
-    def createSectionDown(self, sid, pes, parent=None):
+    def createSectionDown(self, sid, pes, parent=None, tree=None):
         entry = self.sections[sid]
         entry.final = True
-        assert len(entry.local_elems) > 0
+        assert len(entry.local_elems) + len(entry.migrated) > 0
         mype = charm.myPe()
+        if tree is None:
+            tree = charm.sectionTreeSpec(None, None)
         if parent is None:
             # I'm the root
             pes.discard(mype)
             pes = [mype] + sorted(pes)
         else:
             entry.parent = self.thisProxy[parent]
-        subtrees = charm.getTopoSubtrees(mype, pes, bfactor=4)
+        subtrees = charm.getSectionSubtrees(mype, pes, tree)
         for subtree in subtrees:
             child = self.thisProxy[subtree[0]]
-            child.createSectionDown(sid, subtree, mype)
+            child.createSectionDown(sid, subtree, mype, tree)
             entry.children.append(child.elemIdx)
 
         for ep, header, args in entry.buffered_msgs:
@@ -55,10 +163,12 @@ class SectionManager(Chare):
         self.releaseRed(sid, entry, entry.reds)
 
     @when('cons is not None or gid in charm.groups')
-    def createGroupSectionDown(self, sid, gid, pes, parent=None, cons=None):
+    def createGroupSectionDown(self, sid, gid, pes, parent=None, cons=None, tree=None):
         entry = self.sections[sid]
         entry.final = True
         mype = charm.myPe()
+        if tree is None:
+            tree = charm.sectionTreeSpec(None, None)
         if parent is None:
             # I'm the root
             pes.discard(mype)
@@ -69,10 +179,10 @@ class SectionManager(Chare):
         if cons is not None and parent is None:
             cons[0] = self.thisIndex  # cons[0] used to store the section root
 
-        subtrees = charm.getTopoSubtrees(mype, pes, bfactor=4)
+        subtrees = charm.getSectionSubtrees(mype, pes, tree)
         for subtree in subtrees:
             child = self.thisProxy[subtree[0]]
-            child.createGroupSectionDown(sid, gid, subtree, mype, cons)
+            child.createGroupSectionDown(sid, gid, subtree, mype, cons, tree)
             entry.children.append(child.elemIdx)
 
         if cons is not None:
@@ -98,6 +208,53 @@ class SectionManager(Chare):
         entry.buffered_msgs = []
         self.releaseRed(sid, entry, entry.reds)
 
+    # create multiple sections. descs has the section descriptors (section ID
+    # and edges of the spanning tree of the section) for every PE in the subtree
+    # rooted at this PE
+    @when('gid is None or gid in charm.groups')
+    def createSectionsDown(self, descs, gid=None, tree=None):
+        mype = charm.myPe()
+        if tree is None:
+            tree = charm.sectionTreeSpec(None, None)
+        pes = [mype] + sorted([pe for pe in descs if pe != mype])
+        for subtree in charm.getSectionSubtrees(mype, pes, tree):
+            self.thisProxy[subtree[0]].createSectionsDown({pe: descs[pe] for pe in subtree}, gid, tree)
+
+        for sid, parent, children in descs.get(mype, ()):
+            entry = self.sections[sid]
+            entry.final = True
+            if parent is not None:
+                entry.parent = self.thisProxy[parent]
+            entry.children = children
+            if gid is not None:
+                entry.local_elems = [charm.groups[gid]]
+            assert len(entry.local_elems) + len(entry.migrated) > 0
+            for ep, header, args in entry.buffered_msgs:
+                self.sendToSectionLocal(sid, ep, header, *args)
+            entry.buffered_msgs = []
+            self.releaseRed(sid, entry, entry.reds)
+
+    # called locally to send a msg to the section, when the root is on another PE.
+    # Section msgs are marked with 'sfwd' in the header, so that PEs in the
+    # spanning tree forward them before rebuilding their direct-copy arguments
+    # (see forwardSectionMsg)
+    def sendToRoot(self, root, sid, ep, header, args):
+        msg = charm.packMsg(None, [sid, ep, header] + list(args), {b'sfwd': True})
+        charm.CkGroupSend(self.thisProxy.gid, root, self.send_ep, msg)
+
+    # called locally by unpackMsg when a section msg with direct-copy arguments
+    # is received, before the arguments are rebuilt. The msg is forwarded to
+    # the children as it was received (without copying), so that large buffers
+    # travel down the tree without waiting for the rebuild at each PE
+    def forwardSectionMsg(self, sid):
+        entry = self.sections.get(sid)
+        if entry is None or not entry.final or len(entry.children) == 0:
+            return  # sendToSection will buffer or deliver the msg
+        charm.lib.sendToSection(self.thisProxy.gid, entry.children)
+        if self.profiling:
+            charm.recordSend(charm.msg_recv_stats[4])
+        self.forwarded = True
+
     # called locally
     def sendToSectionLocal(self, sid, ep, header, *args):
         entry = self.sections[sid]
@@ -110,7 +267,7 @@ class SectionManager(Chare):
             if profiling:
                 em = charm.runningEntryMethod
                 em.startMeasuringSendTime()
-            msg = charm.packMsg(None, [sid, ep, header] + list(args), {})
+            msg = charm.packMsg(None, [sid, ep, header] + list(args), {b'sfwd': True})
             charm.lib.CkGroupSendMulti(self.thisProxy.gid, entry.children,
                                        self.send_ep, msg)
             del msg
@@ -119,6 +276,8 @@ class SectionManager(Chare):
 
         for obj in entry.local_elems:
             charm.invokeEntryMethod(obj, ep, header, args)
+        if len(entry.migrated) > 0:
+            self.forwardToMigrated(entry, ep, header, args)
 
     def sendToSection(self, sid, ep, header, *args):
         entry = self.sections[sid]
@@ -126,7 +285,9 @@ class SectionManager(Chare):
             entry.buffered_msgs.append((ep, header, args))
             return
 
-        if len(entry.children) > 0:
+        if self.forwarded:
+            self.forwarded = False
+        elif len(entry.children) > 0:
             profiling = self.profiling
             if profiling:
                 em = charm.runningEntryMethod
@@ -141,8 +302,66 @@ class SectionManager(Chare):
 
         for obj in entry.local_elems:
             charm.invokeEntryMethod(obj, ep, header, args)
+        if len(entry.migrated) > 0:
+            self.forwardToMigrated(entry, ep, header, args)
+
+    # called locally. Members of a section that migrated away from the PE where
+    # they joined the section (the anchor PE) remain part of the spanning tree
+    # through the anchor: multicasts are forwarded from the anchor to their new
+    # location, and their contributions are sent to the anchor. This keeps the
+    # number of contributions expected by every PE of the tree unchanged, so
+    # that migration doesn't disrupt reductions in progress
+    def forwardToMigrated(self, entry, ep, header, args):
+        indexes = defaultdict(list)  # aid -> indexes of migrated members
+        for aid, index in entry.migrated:
+            indexes[aid].append(index)
+        for aid, aid_indexes in indexes.items():
+            # pack once per array (the packed msg can only be sent by one call)
+            msg = charm.packMsg(None, list(args), dict(header))
+            charm.lib.CkArraySendMulti(aid, aid_indexes, ep, msg)
+
+    # called locally by a section member to contribute to a section reduction
+    def contribElem(self, obj, sid, redno, data, reducer, cb, cancel=False):
+        anchors = getattr(obj, '_sanchors', None)
+        if anchors is not None and sid in anchors:
+            self.thisProxy[anchors[sid]].contrib(sid, redno, data, reducer, cb, cancel)
+        else:
+            self.contrib(sid, redno, data, reducer, cb, cancel)
 
-    def contrib(self, sid, redno, data, reducer, cb):
+    # called locally when array element obj that is part of sections migrates
+    # out of this PE
+    def elemLeaving(self, obj):
+        # _scookies only has the sections in which obj has contributed, so
+        # look for obj in every section of this PE (migration is infrequent)
+        mype = charm.myPe()
+        elem = (obj.thisProxy.aid, obj.thisIndex)
+        for sid, entry in self.sections.items():
+            local_elems = entry.local_elems
+            if obj in local_elems:
+                local_elems.remove(obj)
+                entry.migrated.append(elem)
+                if not hasattr(obj, '_sanchors'):
+                    obj._sanchors = {}
+                obj._sanchors[sid] = mype
+
+    # called locally when array element obj that is part of sections migrates
+    # into this PE
+    def elemArrived(self, obj):
+        anchors = getattr(obj, '_sanchors', None)
+        if anchors is None:
+            return
+        mype = charm.myPe()
+        elem = (obj.thisProxy.aid, obj.thisIndex)
+        for sid in [sid for sid, pe in anchors.items() if pe == mype]:
+            # back in the anchor PE
+            entry = self.sections[sid]
+            entry.migrated.remove(elem)
+            entry.local_elems.append(obj)
+            del anchors[sid]
+        if len(anchors) == 0:
+            del obj._sanchors
+
+    def contrib(self, sid, redno, data, reducer, cb, cancel=False):
         entry = self.sections[sid]
         idx = redno - entry.redno
         reds = entry.reds
@@ -150,13 +369,15 @@ class SectionManager(Chare):
             reds.append(RedInfo())
         redinfo = reds[idx]
         redinfo.msgs.append(data)
+        if cancel:
+            redinfo.cancelled = True
         if cb is not None:
             redinfo.cb = cb
         if reducer is not None:
             redinfo.reducer = reducer
         if not entry.final:
             return
-        if len(redinfo.msgs) == len(entry.children) + len(entry.local_elems):
+        if len(redinfo.msgs) == len(entry.children) + len(entry.local_elems) + len(entry.migrated):
             redinfo.ready = True
             if idx == 0:
                 self.releaseRed(sid, entry, reds)
@@ -168,7 +389,13 @@ class SectionManager(Chare):
                 reds.pop(0)
                 entry.redno += 1
                 reducer = redinfo.reducer
-                if reducer is None:  # empty reduction
+                if redinfo.cancelled:
+                    # don't reduce, the contributors discard the result
+                    if entry.parent is None:
+                        redinfo.cb(None)
+                    else:
+                        entry.parent.contrib(sid, entry.redno - 1, None, None, None, True)
+                elif reducer is None:  # empty reduction
                     if entry.parent is None:
                         redinfo.cb(None)
                     else:
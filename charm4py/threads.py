@@ -1,4 +1,6 @@
+import sys
 from greenlet import getcurrent
+from . import lb
 
 
 # Future IDs (fids) are sometimes carried as reference numbers inside
@@ -13,6 +15,42 @@ class NotThreadedError(Exception):
         self.message = msg
 
 
+if sys.version_info >= (3, 3, 0):
+    _TimeoutBase = TimeoutError
+else:
+    _TimeoutBase = Exception
+
+
+class Charm4PyTimeoutError(_TimeoutBase):
+    def __init__(self, msg):
+        super(Charm4PyTimeoutError, self).__init__(msg)
+        self.message = msg
+
+
+class WaitTimer(object):
+    """ Scheduled (with charm.scheduleCallableAfter) when a thread blocks
+        with a timeout. Resumes the thread when the timeout expires, unless
+        the wait has finished before """
+
+    def __init__(self, gr, timeout):
+        self.gr = gr
+        self.gen = gr.gen
+        self.pending = True
+        self.expired = False
+        self.timer = charm.scheduleCallableAfter(self, timeout)
+
+    def cancel(self):
+        """ Called when the wait finishes before the timeout """
+        self.pending = False
+        self.timer.cancel()
+
+    def __call__(self):
+        if self.pending:
+            self.pending = False
+            self.expired = True
+            threadMgr.resumeThread(self.gr, None, self.gen)
+
+
 # NOTE: currently objects with active threads cannot migrate (they have to
 # finish their threaded entry methods to do so). So, we can assume that
 # the result of a non-collective future can be sent to the PE where the future
@@ -28,21 +66,42 @@ class Future(object):
     def __init__(self, fid, gr, src, num_vals):
         self.fid = fid  # unique future ID within the process that created it
         self.gr = gr  # greenlet that created the future
+        self.gen = gr.gen if gr is not None else None  # generation of gr (see greenletLoop)
         self.src = src  # PE where the future was created (not used for collective futures)
         self.nvals = num_vals  # number of values that the future expects to receive
         self.values = []  # values of the future
         self.blocked = False  # flag to check if creator thread is blocked on the future
         self.gotvalues = False  # flag to check if expected number of values have been received
         self.error = None  # if the future receives an Exception, it is set here
+        self.callbacks = None  # functions called when the future becomes ready (see addCallback)
+        self.timedout = False  # True if a call to get() timed out (values are discarded)
 
-    def get(self):
+    def get(self, timeout=None):
         """ Blocking call on current entry method's thread to obtain the values of the
             future. If the values are already available then they are returned immediately.
+            If timeout (in seconds) is not None and the values are not received in that
+            time, raises Charm4PyTimeoutError. In that case the future is abandoned:
+            values received later are discarded, and calling get() again raises
+            Charm4PyTimeoutError.
         """
+        if self.timedout:
+            raise Charm4PyTimeoutError('Future timed out')
         if not self.gotvalues:
             self.blocked = True
             self.gr = getcurrent()
-            self.values = threadMgr.pauseThread()
+            self.gen = self.gr.gen
+            if timeout is None:
+                self.values = threadMgr.pauseThread()
+            else:
+                timer = WaitTimer(self.gr, timeout)
+                values = threadMgr.pauseThread()
+                if timer.expired:
+                    self.blocked = False
+                    self.timedout = True
+                    threadMgr.abandonFuture(self)
+                    raise Charm4PyTimeoutError('Future timed out')
+                timer.cancel()
+                self.values = values
 
         if self.error is not None:
             raise self.error
@@ -51,12 +110,56 @@ class Future(object):
             return self.values[0]
         return self.values
 
+    def __await__(self):
+        """ Obtain the values of the future from an asyncio coroutine,
+            with 'await future' """
+        from . import aio
+        return aio.waitFuture(self).__await__()
+
     def ready(self):
         return self.gotvalues
 
+    def addCallback(self, callback):
+        """ Call callback(self) on the main thread when the future becomes
+            ready (immediately if it is already ready) """
+        if self.gotvalues:
+            callback(self)
+        elif self.callbacks is None:
+            self.callbacks = [callback]
+        else:
+            self.callbacks.append(callback)
+
+    def then(self, callback):
+        """ Call callback(value) when the future receives its value(s), without
+            suspending the caller. Returns a new future that receives the value
+            returned by the callback (or the exception raised by it). If this
+            future receives an exception, the callback is not called and the
+            exception is passed to the returned future """
+        f = threadMgr.createFuture()
+
+        def continuation(src):
+            if src.error is not None:
+                result = src.error
+            else:
+                try:
+                    if src.nvals == 1:
+                        result = callback(src.values[0])
+                    else:
+                        result = callback(src.values)
+                except Exception as e:
+                    result = e
+            threadMgr.depositFuture(f.fid, result)
+
+        self.addCallback(continuation)
+        return f
+
     def waitReady(self, f):
         self.blocked = 2
 
+    def cancelWaitReady(self, f):
+        if self.blocked == 2:
+            self.blocked = False
+
     def send(self, result=None):
         """ Send a value to this future. """
         charm.thisProxy[self.src]._future_deposit_result(self.fid, result)
@@ -78,14 +181,23 @@ class Future(object):
         return False
 
     def resume(self, threadMgr):
+        if self.callbacks is not None:
+            callbacks = self.callbacks
+            self.callbacks = None
+            for callback in callbacks:
+                callback(self)
         if self.blocked == 2:
             # someone is waiting for future to become ready, signal by sending myself
             self.blocked = False
-            threadMgr.resumeThread(self.gr, self)
+            threadMgr.resumeThread(self.gr, self, self.gen)
+        elif self.blocked == 3:
+            # an asyncio coroutine is waiting on the future
+            self.blocked = False
+            self.waiter.send(self)
         elif self.blocked:
             self.blocked = False
             # someone is waiting on the future, signal by sending the values
-            threadMgr.resumeThread(self.gr, self.values)
+            threadMgr.resumeThread(self.gr, self.values, self.gen)
 
     def __getstate__(self):
         return (self.fid, self.src)
@@ -106,6 +218,17 @@ class CollectiveFuture(Future):
     def send(self, result=None):
         self.proxy._coll_future_deposit_result(self.fid, result)
 
+    def cancel(self):
+        """ Cancel the reduction for all of the participating chares. Their
+            futures receive None (resuming any coroutine waiting on them), and
+            the result of the operation is discarded """
+        if self.gotvalues:
+            return
+        if isinstance(self.fid, tuple):
+            self.proxy._coll_future_cancel(self.fid, self.proxy)
+        else:
+            self.proxy._coll_future_cancel(self.fid, None)
+
 
 # LocalFuture is a future meant to be used strictly locally. It should not be
 # be sent to other PEs. It is more lightweight than a regular future: creation,
@@ -114,12 +237,23 @@ class LocalFuture(object):
 
     def __init__(self):
         self.gr = getcurrent()  # greenlet that created the future
+        self.gen = self.gr.gen
 
     def send(self, result=None):
-        threadMgr.resumeThread(self.gr, result)
-
-    def get(self):
-        return threadMgr.pauseThread()
+        if self.gr is not None:  # gr is None if get() timed out
+            threadMgr.resumeThread(self.gr, result, self.gen)
+
+    def get(self, timeout=None):
+        if timeout is None:
+            return threadMgr.pauseThread()
+        timer = WaitTimer(self.gr, timeout)
+        result = threadMgr.pauseThread()
+        if timer.expired:
+            # discard values sent after the timeout
+            self.gr = None
+            raise Charm4PyTimeoutError('LocalFuture timed out')
+        timer.cancel()
+        return result
 
 
 class EntryMethodThreadManager(object):
@@ -133,9 +267,17 @@ class EntryMethodThreadManager(object):
         self.lastfid = 0  # future ID of the last future created on this PE
         self.futures = {}  # future ID -> Future object
         self.coll_futures = {}  # (future ID, obj) -> CollectiveFuture object
+        self.cancelled_coll_futures = set()  # (future ID, obj) of cancelled collective futures whose result hasn't arrived
+        self.abandoned_futures = {}  # future ID -> number of values still expected by a future whose get() timed out
+        self.in_asyncio = False  # True while running the asyncio event loop (see aio.py)
 
     def start(self):
         self.main_gr = getcurrent()  # main greenlet
+        self.main_gr.obj = None
+        self.main_gr.gen = 0
+        # idle greenlets that can be reused to run coroutine entry methods
+        self.gr_pool = []
+        self.gr_pool_size = self.options.greenlet_pool_size
         if not self.options.profiling:
             self.resumeThread = self._resumeThread
         else:
@@ -147,9 +289,12 @@ class EntryMethodThreadManager(object):
 
     def objMigrating(self, obj):
         if obj._numthreads > 0:
-            raise Charm4PyError('Migration of chares with active threads is not currently supported')
+            raise Charm4PyError('Cannot migrate chares with coroutines in progress. Call AtSync or '
+                                'migrate and the chare will migrate once its coroutines finish')
 
     def throwNotThreadedError(self):
+        if self.in_asyncio:
+            raise NotThreadedError('Cannot block the asyncio event loop, use await instead')
         raise NotThreadedError("Method '" + charm.last_em_exec.C.__name__ + "." +
                                charm.last_em_exec.name +
                                "' must be a couroutine to be able to suspend (decorate it with @coro)")
@@ -163,8 +308,10 @@ class EntryMethodThreadManager(object):
         main_gr = self.main_gr
         if gr == main_gr:
             self.throwNotThreadedError()  # verify that not running on main thread
+        obj = gr.obj
+        if obj is not None and obj._drain_actions is not None:
+            obj.__checkDrainCaller__(gr)
         if gr.notify:
-            obj = gr.obj
             obj._thread_notify_target.threadPaused(obj._thread_notify_data)
         if gr.parent != main_gr:
             # this can happen with threaded chare constructors that are called
@@ -177,39 +324,84 @@ class EntryMethodThreadManager(object):
         else:
             return main_gr.switch()
 
-    def _resumeThread(self, gr, arg):
+    def _resumeThread(self, gr, arg, gen=None):
         """ Deposit a result or signal that a local entry method thread is waiting on,
             and resume it. This executes on the main thread.
+            gen is the generation of the greenlet when the waiter started waiting
+            (see greenletLoop). If the greenlet has moved on to another task since
+            then, the wait is stale and the greenlet is not resumed.
         """
         #assert getcurrent() == self.main_gr
+        if gen is not None and gr.gen != gen:
+            return
+        obj = gr.obj
         if gr.notify:
-            obj = gr.obj
             obj._thread_notify_target.threadResumed(obj._thread_notify_data)
-        gr.switch(arg)
-        if gr.dead:
-            gr.obj._numthreads -= 1
-
-    def resumeThread_prof(self, gr, arg):
+        if charm.lb_strategy is not None and hasattr(obj, '_lb_load'):
+            # measure the load of the array element for the Python load balancer
+            lb.startMeasure(obj)
+            try:
+                gr.switch(arg)
+            finally:
+                lb.stopMeasure()
+        else:
+            gr.switch(arg)
+        if (gr.dead or gr.obj is None) and obj is not None:
+            # the entry method finished
+            obj._numthreads -= 1
+            if obj._numthreads == 0 and obj._drain_actions is not None:
+                obj.__drained__()
+
+    def greenletLoop(self, em, obj, header, args):
+        """ Main function of greenlets created to run coroutine entry methods.
+            After running an entry method, the greenlet goes back to the pool
+            of idle greenlets and waits to be reused for another entry method
+            (if the pool is full, the greenlet finishes instead) """
+        gr = getcurrent()
+        main_gr = self.main_gr
+        gr_pool = self.gr_pool
+        while True:
+            em._run(obj, header, args)
+            if len(gr_pool) >= self.gr_pool_size:
+                return
+            # waiters of the entry method that just finished (for example an
+            # abandoned charm.iwait) can still try to resume the greenlet. They
+            # record the generation of the greenlet when they start waiting,
+            # and a different generation means that their wait is stale
+            gr.gen += 1
+            # gr.obj = None marks the greenlet as idle
+            gr.obj = None
+            gr.notify = False
+            gr.task = None
+            gr_pool.append(gr)
+            main_gr.switch()
+            em, obj, header, args = gr.task
+            gr.task = None
+
+    def resumeThread_prof(self, gr, arg, gen=None):
+        if gen is not None and gr.gen != gen:
+            return
         ems = getcurrent().em_callstack
         if len(ems) > 0:
             ems[-1].stopMeasuringTime()
         gr.em_callstack[-1].startMeasuringTime()
-        self._resumeThread(gr, arg)
+        self._resumeThread(gr, arg, gen)
         gr.em_callstack[-1].stopMeasuringTime()
         if len(ems) > 0:
             ems[-1].startMeasuringTime()
 
     def createFuture(self, num_vals=1):
-        """ Creates a new Future object by obtaining a unique (local) future ID. """
+        """ Creates a new Future object by obtaining a unique (local) future ID.
+            Futures can be created on the main thread (to consume them with
+            then, whenAll or whenAny), but only coroutines can block on them """
         gr = getcurrent()
-        if gr == self.main_gr:
-            self.throwNotThreadedError()
         # get a unique local Future ID
         global FIDMAXVAL
         futures = self.futures
-        assert len(futures) < FIDMAXVAL, 'Too many pending futures, cannot create more'
+        abandoned = self.abandoned_futures
+        assert len(futures) + len(abandoned) < FIDMAXVAL, 'Too many pending futures, cannot create more'
         fid = (self.lastfid % FIDMAXVAL) + 1
-        while fid in futures:
+        while fid in futures or fid in abandoned:
             fid = (fid % FIDMAXVAL) + 1
         self.lastfid = fid
         f = Future(fid, gr, charm._myPe, num_vals)
@@ -219,9 +411,8 @@ class EntryMethodThreadManager(object):
     def createCollectiveFuture(self, fid, obj, proxy):
         """ fid is supplied in this case and has to be the same for all distributed chares """
         gr = getcurrent()
-        if gr == self.main_gr:
-            self.throwNotThreadedError()
         f = CollectiveFuture(fid, gr, proxy, 1)
+        f.obj = obj
         self.coll_futures[(fid, obj)] = f
         return f
 
@@ -231,6 +422,14 @@ class EntryMethodThreadManager(object):
         try:
             f = futures[fid]
         except KeyError:
+            remaining = self.abandoned_futures.get(fid)
+            if remaining is not None:
+                # the future was abandoned after a get() timeout, discard the value
+                if remaining == 1:
+                    del self.abandoned_futures[fid]
+                else:
+                    self.abandoned_futures[fid] = remaining - 1
+                return
             raise Charm4PyError('No pending future with fid=' + str(fid) + '. A common reason is '
                                 'sending to a future that already received its value(s)')
         if f.deposit(result):
@@ -240,16 +439,88 @@ class EntryMethodThreadManager(object):
             f.resume(self)
             # this is necessary because the result is being deposited from an
             # entry method of CharmRemote, not the object that we resumed
-            if self.options.auto_flush_wait_queues and obj._cond_next is not None:
-                obj.__flush_wait_queues__()
+            if obj is not None and self.options.auto_flush_wait_queues and len(obj._conds) > 0:
+                if charm.lb_strategy is not None and hasattr(obj, '_lb_load'):
+                    lb.startMeasure(obj)
+                    try:
+                        obj.__flush_wait_queues__()
+                    finally:
+                        lb.stopMeasure()
+                else:
+                    obj.__flush_wait_queues__()
 
     def depositCollectiveFuture(self, fid, result, obj):
-        f = self.coll_futures[(fid, obj)]
+        key = (fid, obj)
+        f = self.coll_futures.get(key)
+        if f is None:
+            # the future was cancelled, discard the result
+            self.cancelled_coll_futures.remove(key)
+            return
         if f.deposit(result):
             del self.coll_futures[(fid, obj)]
             del f.proxy
             f.resume(self)
 
+    def whenAll(self, futures):
+        """ Returns a future that receives the list of values of the given
+            futures once all of them are ready (or the first exception
+            received by any of them). This doesn't suspend the caller """
+        result = self.createFuture()
+        values = [None] * len(futures)
+        pending = [len(futures)]
+        if pending[0] == 0:
+            self.depositFuture(result.fid, values)
+            return result
+
+        def callback(f, i):
+            if pending[0] == 0:
+                return  # the result future already received an exception
+            if f.error is not None:
+                pending[0] = 0
+                self.depositFuture(result.fid, f.error)
+                return
+            if f.nvals == 1:
+                values[i] = f.values[0]
+            else:
+                values[i] = f.values
+            pending[0] -= 1
+            if pending[0] == 0:
+                self.depositFuture(result.fid, values)
+
+        for i, f in enumerate(futures):
+            f.addCallback(lambda f, i=i: callback(f, i))
+        return result
+
+    def whenAny(self, futures):
+        """ Returns a future that receives the first of the given futures to
+            become ready (the future object, not its value). This doesn't
+            suspend the caller """
+        result = self.createFuture()
+        done = [False]
+
+        def callback(f):
+            if not done[0]:
+                done[0] = True
+                self.depositFuture(result.fid, f)
+
+        for f in futures:
+            f.addCallback(callback)
+        return result
+
+    def abandonFuture(self, f):
+        """ Called when get() on future f times out. The future is deregistered,
+            and the values that arrive for it later are discarded. Its ID can't
+            be reused until all of its values have arrived """
+        if isinstance(f, CollectiveFuture):
+            key = (f.fid, f.obj)
+            if self.coll_futures.pop(key, None) is not None:
+                # the result of the collective operation will still arrive
+                self.cancelled_coll_futures.add(key)
+        elif self.futures.pop(f.fid, None) is not None:
+            self.abandoned_futures[f.fid] = f.nvals - len(f.values)
+        f.values = []
+        f.callbacks = None
+
     def cancelFuture(self, f):
         fid = f.fid
         del self.futures[fid]
@@ -257,5 +528,16 @@ class EntryMethodThreadManager(object):
         f.values = [None] * f.nvals
         f.resume(self)
 
-    # TODO: method to cancel collective future. the main issue with this is
-    # that the future would need to be canceled on every chare waiting on it
+    def cancelCollectiveFuture(self, fid, obj):
+        """ Cancel the pending collective future of obj with the given fid.
+            Returns False if obj doesn't have such a future """
+        key = (fid, obj)
+        f = self.coll_futures.pop(key, None)
+        if f is None:
+            return False
+        # the result of the collective operation will still arrive
+        self.cancelled_coll_futures.add(key)
+        f.gotvalues = True
+        f.values = [None] * f.nvals
+        f.resume(self)
+        return True
@@ -0,0 +1,96 @@
+import heapq
+from time import time
+
+
+# Tags identify the Charm++ timers (CcdCallFnAfter) that are pending. Their
+# value is carried as a C int
+MAX_TAG = 2 ** 31 - 1
+INF = float('inf')
+
+
+class Timer(object):
+    """ Handle of a callable scheduled with charm.scheduleCallableAfter """
+
+    def __init__(self, queue, callable_obj, args):
+        self.queue = queue
+        self.callable = callable_obj  # None if the timer fired or was cancelled
+        self.args = args
+
+    def cancel(self):
+        """ Cancel the timer. Has no effect if the timer has already fired """
+        if self.callable is not None:
+            self.callable = self.args = None
+            self.queue.timerCancelled()
+
+
+class TimerQueue(object):
+    """ Heap of timers of a PE (ordered by deadline), multiplexed onto Charm++
+        timers. Only one Charm++ timer needs to be pending at any time (for
+        the earliest deadline). Since Charm++ timers can't be cancelled, a
+        new one is scheduled when a timer earlier than all the pending Charm++
+        timers is inserted, and the others fire with nothing to do """
+
+    def __init__(self, lib):
+        self.lib = lib
+        self.heap = []  # (deadline, seqno, Timer)
+        self.seqno = 0  # insertion order, to break ties between deadlines
+        self.num_cancelled = 0  # number of cancelled timers in the heap
+        self.lasttag = 0
+        self.armed = {}  # tag -> deadline of pending Charm++ timers
+        self.next_armed = INF  # earliest deadline of pending Charm++ timers
+
+    def __len__(self):
+        return len(self.heap) - self.num_cancelled
+
+    def schedule(self, callable_obj, secs, args):
+        t = Timer(self, callable_obj, args)
+        deadline = time() + secs
+        self.seqno += 1
+        heapq.heappush(self.heap, (deadline, self.seqno, t))
+        if deadline < self.next_armed:
+            self.arm(deadline, secs)
+        return t
+
+    def arm(self, deadline, secs):
+        tag = self.lasttag = self.lasttag % MAX_TAG + 1
+        self.armed[tag] = deadline
+        self.next_armed = deadline
+        self.lib.scheduleTagAfter(tag, max(secs, 0) * 1000)
+
+    def timerCancelled(self):
+        self.num_cancelled += 1
+        heap = self.heap
+        if self.num_cancelled > 64 and self.num_cancelled > len(heap) // 2:
+            # remove cancelled timers so that the heap doesn't grow unbounded
+            self.heap = [entry for entry in heap if entry[2].callable is not None]
+            heapq.heapify(self.heap)
+            self.num_cancelled = 0
+
+    def trigger(self, tag):
+        """ Called when the Charm++ timer with the given tag fires. Calls
+            the callables of the timers that have expired """
+        armed = self.armed
+        del armed[tag]
+        if len(armed) > 0:
+            self.next_armed = min(armed.values())
+        else:
+            self.next_armed = INF
+        heap = self.heap
+        now = time()
+        while len(heap) > 0 and heap[0][0] <= now:
+            t = heapq.heappop(heap)[2]
+            callable_obj = t.callable
+            if callable_obj is None:
+                self.num_cancelled -= 1
+                continue
+            args = t.args
+            t.callable = t.args = None
+            callable_obj(*args)
+            # callables can schedule or cancel timers (and the heap can be rebuilt)
+            heap = self.heap
+        while len(heap) > 0 and heap[0][2].callable is None:
+            heapq.heappop(heap)
+            self.num_cancelled -= 1
+        if len(heap) > 0 and heap[0][0] < self.next_armed:
+            deadline = heap[0][0]
+            self.arm(deadline, deadline - time())
@@ -1,5 +1,6 @@
-from collections import defaultdict
+from collections import defaultdict, deque
 import ast
+import sys
 from importlib import import_module
 
 
@@ -17,6 +18,7 @@ class MsgTagCond(object):
         self.cond_str    = cond_str
         self.attrib_name = attrib_name
         self.arg_idx     = arg_idx
+        self.deps        = (attrib_name,)
 
     def evaluateWhen(self, obj, args):
         return args[self.arg_idx] == getattr(obj, self.attrib_name)
@@ -26,6 +28,7 @@ class MsgTagCond(object):
         c.cond_str    = self.cond_str
         c.attrib_name = self.attrib_name
         c.arg_idx     = self.arg_idx
+        c.deps        = self.deps
         c.wait_queue  = defaultdict(list)
         return c
 
@@ -33,7 +36,7 @@ class MsgTagCond(object):
         elem_type, em, header, args = elem
         self.wait_queue[args[self.arg_idx]].append((em, header, args))
 
-    def check(self, obj):
+    def check(self, obj, stale):
         dequeued = False
         while True:
             attrib = getattr(obj, self.attrib_name)
@@ -51,24 +54,110 @@ class MsgTagCond(object):
         return dequeued, len(self.wait_queue) == 0
 
 
+# This condition object is used for conditions that compare (for equality) an
+# expression of the chare's state with an expression of the message arguments.
+# Messages are indexed by the value of the message expression
+# Example:
+#           @when("self.iteration == iter + 1")
+#           def method(self, iter, x, y, z)
+#               # invoke method only if self.iteration == iter + 1
+class MsgEqCond(object):
+
+    group = True
+
+    def __init__(self, cond_str, state_func, key_func, deps):
+        self.cond_str   = cond_str
+        self.state_func = state_func
+        self.key_func   = key_func
+        # names of the chare attributes that the state expression reads (None
+        # if it reads other state)
+        self.deps       = deps
+
+    def evaluateWhen(self, obj, args):
+        return self.state_func(obj) == self.key_func(args)
+
+    def createWaitCondition(self):
+        c = object.__new__(MsgEqCond)
+        c.cond_str   = self.cond_str
+        c.state_func = self.state_func
+        c.key_func   = self.key_func
+        c.deps       = self.deps
+        c.wait_queue = defaultdict(deque)  # msgs with the same key are delivered in order of arrival
+        c.unindexed  = []  # msgs with unhashable keys
+        return c
+
+    def enqueue(self, elem):
+        elem_type, em, header, args = elem
+        key = self.key_func(args)
+        try:
+            self.wait_queue[key].append((em, header, args))
+        except TypeError:
+            self.unindexed.append((key, em, header, args))
+
+    def check(self, obj, stale):
+        dequeued = False
+        while True:
+            value = self.state_func(obj)
+            try:
+                msgs = self.wait_queue.get(value)
+            except TypeError:
+                msgs = None
+            if msgs is None:
+                for i, (key, em, header, args) in enumerate(self.unindexed):
+                    if key == value:
+                        del self.unindexed[i]
+                        em.run(obj, header, args)
+                        dequeued = True
+                        break
+                else:
+                    # no msg waiting for this value
+                    break
+            else:
+                em, header, args = msgs.popleft()
+                em.run(obj, header, args)
+                if len(msgs) == 0:
+                    del self.wait_queue[value]
+                dequeued = True
+        return dequeued, len(self.wait_queue) == 0 and len(self.unindexed) == 0
+
+    def __getstate__(self):
+        return self.cond_str, self.wait_queue, self.unindexed, self.seq
+
+    def __setstate__(self, state):
+        self.cond_str, self.wait_queue, self.unindexed, self.seq = state
+        for msgs in self.wait_queue.values():
+            em = msgs[0][0]
+            break
+        else:
+            em = self.unindexed[0][1]
+        self.state_func = em.when_cond.state_func
+        self.key_func = em.when_cond.key_func
+        self.deps = em.when_cond.deps
+
+
 # Manage a conditional statement involving a chare's state and the contents of a message
 # Example:
-#           @when("self.check == x + y")
+#           @when("self.check > x + y")
 #           def method(self, x, y, z)
-#               # invoke method only if self.check == x + y
+#               # invoke method only if self.check > x + y
 class ChareStateMsgCond(object):
 
-    # these condition objects don't group elements because each can have different msg arguments
-    group = False
+    group = True
 
-    def __init__(self, cond_str, cond_func):
+    def __init__(self, cond_str, cond_func, deps):
         self.cond_str  = cond_str
         self.cond_func = cond_func
+        # names of the chare attributes that the condition reads (None if the
+        # condition reads other state)
+        self.deps = deps
 
     def createWaitCondition(self):
         c = object.__new__(ChareStateMsgCond)
         c.cond_str  = self.cond_str
         c.cond_func = self.cond_func
+        c.deps = self.deps
+        c.wait_queue = []
+        c.num_checked = 0  # number of msgs checked since the attributes in deps last changed
         return c
 
     def evaluateWhen(self, obj, args):
@@ -76,23 +165,40 @@ class ChareStateMsgCond(object):
         return self.cond_func(obj, args)
 
     def enqueue(self, elem):
-        self.elem = elem
-
-    def check(self, obj):
-        t, em, header, args = self.elem
-        #if eval(me.cond_str):    # eval is very slow
-        if self.cond_func(obj, args):
-            em.run(obj, header, args)
-            return True, True
-        return False, False
+        elem_type, em, header, args = elem
+        self.wait_queue.append((em, header, args))
+
+    def check(self, obj, stale):
+        queue = self.wait_queue
+        i = 0
+        if not stale:
+            # the condition is false for the msgs that were already checked
+            # with the current value of the attributes, only check new msgs
+            i = self.num_checked
+        dequeued = False
+        while i < len(queue):
+            em, header, args = queue[i]
+            #if eval(me.cond_str):    # eval is very slow
+            if self.cond_func(obj, args):
+                del queue[i]
+                em.run(obj, header, args)
+                dequeued = True
+            else:
+                i += 1
+        # if msgs were dequeued, the state could have changed while checking,
+        # in which case the next flush checks all of them again
+        self.num_checked = len(queue)
+        return dequeued, len(queue) == 0
 
     def __getstate__(self):
-        return self.cond_str, self.elem, self._cond_next
+        return self.cond_str, self.wait_queue, self.seq
 
     def __setstate__(self, state):
-        self.cond_str, self.elem, self._cond_next = state
-        em = self.elem[1]
-        self.cond_func = em.when_cond_func
+        self.cond_str, self.wait_queue, self.seq = state
+        em = self.wait_queue[0][0]
+        self.cond_func = em.when_cond.cond_func
+        self.deps = em.when_cond.deps
+        self.num_checked = 0
 
 
 # Conditional statements involving only a chare's state
@@ -116,11 +222,13 @@ class ChareStateCond(object):
         self.globals_module_name = module_name
         self.cond_func = eval('lambda self: ' + cond_str,
                               import_module(module_name).__dict__)
+        self.deps = get_dependencies(ast.parse(cond_str, filename='<string>', mode='eval'), False)
 
     def createWaitCondition(self):
         c = object.__new__(ChareStateCond)
         c.cond_str   = self.cond_str
         c.cond_func  = self.cond_func
+        c.deps       = self.deps
         c.wait_queue = []
         return c
 
@@ -131,7 +239,7 @@ class ChareStateCond(object):
     def enqueue(self, elem):
         self.wait_queue.append(elem)
 
-    def check(self, obj):
+    def check(self, obj, stale):
         dequeued = False
         #while eval(me.cond_str):   # eval is very slow
         while self.cond_func(obj):
@@ -150,12 +258,13 @@ class ChareStateCond(object):
         return dequeued, len(self.wait_queue) == 0
 
     def __getstate__(self):
-        return self.cond_str, self.wait_queue, self._cond_next, self.globals_module_name
+        return self.cond_str, self.wait_queue, self.seq, self.globals_module_name
 
     def __setstate__(self, state):
-        self.cond_str, self.wait_queue, self._cond_next, self.globals_module_name = state
+        self.cond_str, self.wait_queue, self.seq, self.globals_module_name = state
         self.cond_func = eval('lambda self: ' + self.cond_str,
                               import_module(self.globals_module_name).__dict__)
+        self.deps = get_dependencies(ast.parse(self.cond_str, filename='<string>', mode='eval'), False)
 
 
 def is_tag_cond(root_ast):
@@ -236,6 +345,108 @@ class MsgArgsTransformer(ast.NodeTransformer):
             return node
 
 
+# names that a condition can use without depending on state other than the
+# chare's attributes and the message arguments
+SAFE_NAMES = {'len', 'abs', 'min', 'max', 'all', 'any', 'sum', 'int', 'float',
+              'bool', 'str', 'tuple', 'True', 'False', 'None'}
+
+if sys.version_info < (3, 0, 0):
+    IMMUTABLE_TYPES = {int, long, float, bool, str, unicode, type(None)}
+else:
+    IMMUTABLE_TYPES = {int, float, bool, str, bytes, type(None)}
+
+class Missing(object):
+    """ Value of attributes that a chare doesn't have """
+
+    def __reduce__(self):
+        # pickled by reference, so that it's the same object after migration
+        return 'MISSING'
+
+
+MISSING = Missing()
+
+
+def get_dependencies(tree, has_args):
+    """ Analyze the AST of a condition. Returns the (sorted) tuple of names of
+        the chare attributes that the condition reads (with `self.xyz`), or
+        None if the condition can depend on other state (globals, method
+        calls, etc.) and has to be evaluated every time """
+    attribs = set()
+    self_nodes = set()  # 'self' nodes that are the base of an attribute
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) \
+           and node.value.id == 'self':
+            attribs.add(node.attr)
+            self_nodes.add(id(node.value))
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+             and isinstance(node.func.value, ast.Name) and node.func.value.id == 'self':
+            return None  # calls a method of the chare
+        elif isinstance(node, (ast.Lambda, ast.ListComp, ast.SetComp,
+                               ast.DictComp, ast.GeneratorExp)):
+            return None
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id == 'self':
+                if id(node) not in self_nodes:
+                    return None
+            elif node.id not in SAFE_NAMES and not (has_args and node.id == 'args'):
+                return None
+    return tuple(sorted(attribs))
+
+
+def changed(old, new):
+    """ Returns True if an attribute could have changed from value old to new.
+        This is always True for mutable values, since a change to their
+        contents can't be detected """
+    if type(new) not in IMMUTABLE_TYPES:
+        return new is not MISSING or old is not MISSING
+    return type(new) is not type(old) or new != old
+
+
+def cond_seq(cond):
+    return cond.seq
+
+
+def uses_name(tree, name):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == name:
+            return True
+    return False
+
+
+def compile_func(expr, params, module_name):
+    tree = ast.parse('lambda ' + params + ': x', filename='<string>', mode='eval')
+    tree.body.body = expr
+    tree = ast.fix_missing_locations(tree)
+    return eval(compile(tree, '<string>', 'eval'), import_module(module_name).__dict__)
+
+
+def is_eq_cond(root_ast):
+    """ Determine if the AST corresponds to a 'when' condition of the form
+        `<expression of self> == <expression of args>`. If True, returns the
+        two expressions (state expression first). Otherwise returns None """
+    compare = root_ast.body
+    if not isinstance(compare, ast.Compare) or len(compare.ops) != 1 or \
+       not isinstance(compare.ops[0], ast.Eq):
+        return None
+    left, right = compare.left, compare.comparators[0]
+    if uses_name(right, 'self') and not uses_name(right, 'args'):
+        left, right = right, left
+    if uses_name(left, 'self') and not uses_name(left, 'args') and \
+       uses_name(right, 'args') and not uses_name(right, 'self'):
+        return left, right
+    return None
+
+
+def cond_key(tree, cond_str):
+    # the key identifies the condition in a chare's active wait conditions.
+    # It is given by the transformed AST, because the same condition string
+    # can refer to arguments in different positions of different methods
+    if hasattr(ast, 'unparse'):
+        return ast.unparse(tree)
+    return cond_str + ' ' + ast.dump(tree)
+
+
 #import astunparse
 
 def parse_cond_str(cond_str, module_name, method_arguments={}):
@@ -257,13 +468,18 @@ def parse_cond_str(cond_str, module_name, method_arguments={}):
     if tag_cond is not None:
         return MsgTagCond(*tag_cond)
 
+    t = ast.fix_missing_locations(t)
+    key = cond_key(t, cond_str)
+    eq_cond = is_eq_cond(t)
+    if eq_cond is not None:
+        state_expr, args_expr = eq_cond
+        return MsgEqCond(key, compile_func(state_expr, 'self', module_name),
+                         compile_func(args_expr, 'args', module_name),
+                         get_dependencies(state_expr, False))
+
     # compile AST to code, then eval to a lambda function
-    new_tree = ast.parse("lambda self, args: x", filename='<string>', mode='eval')
-    new_tree.body.body = t.body
-    new_tree = ast.fix_missing_locations(new_tree)
-    lambda_func = eval(compile(new_tree, '<string>', 'eval'),
-                       import_module(module_name).__dict__)
-    return ChareStateMsgCond(cond_str, lambda_func)
+    lambda_func = compile_func(t.body, 'self, args', module_name)
+    return ChareStateMsgCond(key, lambda_func, get_dependencies(t, True))
 
 
 def charmStarting():
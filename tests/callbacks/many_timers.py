@@ -0,0 +1,46 @@
+from charm4py import charm, Chare, Group, coro
+from time import time
+
+
+NUM_SLEEPERS = 2000
+
+
+class Test(Chare):
+
+    def __init__(self):
+        self.fired = []
+
+    @coro
+    def sleeper(self, secs):
+        t0 = time()
+        charm.sleep(secs)
+        assert time() - t0 >= secs * 0.9
+
+    def record(self, i):
+        self.fired.append(i)
+
+    @coro
+    def run(self):
+        # many concurrent timers (more than the number of tags that Charm4py
+        # used to have for scheduling callables)
+        futures = [self.thisProxy[charm.myPe()].sleeper((i % 20) * 0.01, ret=True)
+                   for i in range(NUM_SLEEPERS)]
+        charm.wait(futures)
+
+        # timers fire in order of deadline, cancelled timers don't fire
+        timers = [charm.scheduleCallableAfter(self.record, (100 - i) * 0.002, [i])
+                  for i in range(100)]
+        for i in range(0, 100, 2):
+            timers[i].cancel()
+        charm.sleep(0.5)
+        assert self.fired == list(range(99, 0, -2)), self.fired
+        timers[1].cancel()  # has already fired, no effect
+        assert len(charm.timers) == 0
+
+
+def main(args):
+    Group(Test).run(awaitable=True).get()
+    exit()
+
+
+charm.start(main)
@@ -0,0 +1,54 @@
+from charm4py import charm, Chare, Array, Group, Channel, ChannelGroup, coro
+import numpy as np
+
+
+NUM_ITER = 50
+
+
+class Test(Chare):
+
+    def __init__(self, numchares):
+        if isinstance(self.thisIndex, tuple):
+            myidx = self.thisIndex[0]
+        else:
+            myidx = self.thisIndex
+        nbs = [self.thisProxy[(myidx + 1) % numchares], self.thisProxy[(myidx - 1) % numchares]]
+        self.myidx = myidx
+        self.channels = [Channel(self, remote=nb) for nb in nbs]
+        self.group = ChannelGroup(self.channels)
+
+    @coro
+    def work(self, numchares):
+        out = np.zeros(20)
+        for i in range(NUM_ITER):
+            self.group.send(self.myidx, i, np.arange(20) * self.myidx + i)
+            nb_idxs = [(self.myidx - 1) % numchares, (self.myidx + 1) % numchares]
+            if i % 2 == 0:
+                msgs = self.group.recv()
+                for nb_idx, (idx, it, data) in zip(nb_idxs, msgs):
+                    assert idx == nb_idx and it == i
+                    np.testing.assert_array_equal(data, np.arange(20) * nb_idx + i)
+            else:
+                for ch in self.group.iwait():
+                    idx, it, data = ch.recv_into([None, None, out])
+                    assert it == i and data is out
+                    np.testing.assert_array_equal(out, np.arange(20) * idx + i)
+        # channels of a group can also be used individually
+        for ch in self.group:
+            ch.send('done')
+        for ch in self.group:
+            assert ch.recv() == 'done'
+
+
+def main(args):
+    numchares = charm.numPes() * 4
+    a = Array(Test, numchares, args=[numchares])
+    a.work(numchares, awaitable=True).get()
+    if charm.numPes() >= 3:
+        g = Group(Test, args=[charm.numPes()])
+        g.work(charm.numPes(), awaitable=True).get()
+    print('channel group test done')
+    exit()
+
+
+charm.start(main)
@@ -0,0 +1,48 @@
+from charm4py import charm, Chare, Array, Channel, coro
+
+
+NUM_MSGS = 50000  # more than the number of messages that channels used to buffer
+WINDOW = 64
+
+
+class Test(Chare):
+
+    def __init__(self, window):
+        other = self.thisProxy[1 - self.thisIndex[0]]
+        self.ch = Channel(self, remote=other, window=window)
+        self.max_buffered = 0
+
+    @coro
+    def produce(self):
+        for i in range(NUM_MSGS):
+            self.ch.send(i)
+        self.ch.send('done')
+
+    @coro
+    def consume(self, window):
+        i = 0
+        while True:
+            if i % 1000 == 0:
+                charm.sleep(0.01)  # slow consumer
+            self.max_buffered = max(self.max_buffered, len(self.ch.data))
+            msg = self.ch.recv()
+            if msg == 'done':
+                break
+            assert msg == i
+            i += 1
+        assert i == NUM_MSGS
+        if window > 0:
+            assert self.max_buffered <= window, self.max_buffered
+        else:
+            assert self.max_buffered > WINDOW
+
+
+def main(args):
+    for window in (WINDOW, 0):
+        a = Array(Test, 2, args=[window])
+        a[0].produce()
+        a[1].consume(window, awaitable=True).get()
+    exit()
+
+
+charm.start(main)
@@ -0,0 +1,56 @@
+from charm4py import charm, Chare, Array, Group, Channel, coro
+
+
+NUM_ITER = 5
+
+
+class Test(Chare):
+
+    def __init__(self, numchares, use_hints):
+        if isinstance(self.thisIndex, tuple):
+            self.myidx = self.thisIndex[0]
+        else:
+            self.myidx = self.thisIndex
+        others = [i for i in range(numchares) if i != self.myidx]
+        remotes = [self.thisProxy[i] for i in others]
+        pes = None
+        if use_hints:
+            # some of the hints are wrong
+            pes = [i % charm.numPes() for i in others]
+        self.channels = Channel.open_many(self, remotes, pes=pes)
+        # channels to the same remote are matched in order of creation
+        self.channels += Channel.open_many(self, remotes)
+        self.others = others + others
+
+    @coro
+    def work(self):
+        for i in range(NUM_ITER):
+            for j, ch in enumerate(self.channels):
+                ch.send(self.myidx, j, i)
+            half = len(self.channels) // 2
+            for j, ch in enumerate(self.channels):
+                idx, k, it = ch.recv()
+                assert idx == self.others[j] and it == i
+                # position of the remote's channel to me in its list of channels
+                expected = (j // half) * half
+                if self.myidx < idx:
+                    expected += self.myidx
+                else:
+                    expected += self.myidx - 1
+                assert k == expected
+        assert len(self.__pendingChannels__) == 0
+
+
+def main(args):
+    numchares = charm.numPes() * 8
+    for use_hints in (False, True):
+        a = Array(Test, numchares, args=[numchares, use_hints])
+        a.work(awaitable=True).get()
+    if charm.numPes() > 1:
+        g = Group(Test, args=[charm.numPes(), False])
+        g.work(awaitable=True).get()
+    print('open_many test done')
+    exit()
+
+
+charm.start(main)
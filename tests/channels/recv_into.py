@@ -0,0 +1,75 @@
+from charm4py import charm, Chare, Array, Channel, coro
+from charm4py.charm import Charm4PyError
+import numpy as np
+
+
+NUM_ITER = 20
+
+
+class Test(Chare):
+
+    def __init__(self):
+        other = self.thisProxy[1 - self.thisIndex[0]]
+        self.ch = Channel(self, remote=other)
+
+    @coro
+    def produce(self):
+        for i in range(NUM_ITER):
+            self.ch.send(np.arange(100, dtype='float64') + i)
+        for i in range(NUM_ITER):
+            self.ch.send(np.arange(50, dtype='int64') + i, 'x', np.ones((3, 4)) * i)
+        self.ch.recv()  # wait until consumer has received all messages
+        for i in range(NUM_ITER):
+            self.ch.send(np.arange(100, dtype='float64') - i)
+        self.ch.recv()
+        self.ch.send(np.ones(100), 'y')
+
+
+    @coro
+    def consume(self):
+        out = np.zeros(100, dtype='float64')
+        for i in range(NUM_ITER):
+            if i % 2 == 0:
+                charm.sleep(0.01)  # some messages are buffered before they are received
+            a = self.ch.recv_into(out)
+            assert a is out
+            np.testing.assert_array_equal(out, np.arange(100, dtype='float64') + i)
+
+        out1 = np.zeros(50, dtype='int64')
+        out2 = np.zeros((3, 4))
+        for i in range(NUM_ITER):
+            a, s, b = self.ch.recv_into([out1, None, out2])
+            assert a is out1 and b is out2 and s == 'x'
+            np.testing.assert_array_equal(out1, np.arange(50, dtype='int64') + i)
+            np.testing.assert_array_equal(out2, np.ones((3, 4)) * i)
+
+        self.ch.send('ready')
+        charm.sleep(0.1)  # all the messages are buffered
+        for i in range(NUM_ITER):
+            self.ch.recv_into(out)
+            np.testing.assert_array_equal(out, np.arange(100, dtype='float64') - i)
+        for bufs in self.ch.buf_pool.values():
+            for buf in bufs:
+                assert buf is not out
+
+        # a single output array can't receive a message with two arguments
+        out[:] = 0
+        self.ch.send('ready')
+        try:
+            self.ch.recv_into(out)
+            assert False
+        except Charm4PyError:
+            pass
+        assert not out.any()
+
+def main(args):
+    a = Array(Test, 2)
+    charm.awaitCreation(a)
+    f = a[1].consume(awaitable=True)
+    a[0].produce()
+    f.get()
+    print('recv_into test done')
+    exit()
+
+
+charm.start(main)
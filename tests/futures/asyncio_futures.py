@@ -0,0 +1,53 @@
+from charm4py import charm, Chare, Array, Channel, coro
+import asyncio
+
+
+class Test(Chare):
+
+    def __init__(self):
+        n = charm.numPes() * 2
+        self.partner = self.thisProxy[(self.thisIndex[0] + 1) % n]
+        self.ch = Channel(self, remote=self.thisProxy[(self.thisIndex[0] - 1) % n])
+        self.ch_out = Channel(self, remote=self.partner)
+
+    def square(self, x):
+        return x * x
+
+    @coro
+    def sendValues(self, values):
+        for v in values:
+            self.ch_out.send(v)
+
+    async def compute(self, x):
+        await asyncio.sleep(0.01)
+        f = self.partner.square(x, ret=True)
+        y = await f
+        received = []
+        for _ in range(3):
+            received.append(await self.ch)
+        return y + sum(received)
+
+    async def fail(self):
+        await asyncio.sleep(0)
+        raise ValueError('asyncio error')
+
+    def check(self):
+        assert self._numthreads == 0
+
+
+def main(args):
+    a = Array(Test, charm.numPes() * 2)
+    charm.awaitCreation(a)
+    results = a.compute(3, ret=True)
+    a.sendValues([1, 2, 3])
+    assert results.get() == [9 + 6] * charm.numPes() * 2
+    try:
+        a[0].fail(ret=True).get()
+        assert False
+    except ValueError as e:
+        assert str(e) == 'asyncio error'
+    a.check(awaitable=True).get()
+    exit()
+
+
+charm.start(main)
@@ -0,0 +1,63 @@
+from charm4py import charm, Chare, Group, Future
+
+
+class Test(Chare):
+
+    def work(self, x):
+        if x < 0:
+            raise ValueError('negative')
+        return x * 2
+
+    # None of these methods are coroutines: futures are consumed with callbacks
+
+    def sumAll(self, done):
+        futures = [self.thisProxy[pe].work(pe, ret=True) for pe in range(charm.numPes())]
+        charm.when_all(futures).then(sum).then(done)
+
+    def chain(self, x, done):
+        self.thisProxy[0].work(x, ret=True).then(lambda y: y + 1).then(lambda y: y * 10).then(done)
+
+    def first(self, done):
+        futures = [self.thisProxy[pe].work(pe, ret=True) for pe in range(charm.numPes())]
+        charm.when_any(futures).then(lambda f: f.get() in [2 * pe for pe in range(charm.numPes())]).then(done)
+
+    def failing(self, done):
+        futures = [self.thisProxy[0].work(1, ret=True), self.thisProxy[0].work(-1, ret=True)]
+        f = charm.when_all(futures).then(lambda values: 'callback should not run')
+        # when_any passes the future itself, so its exception can be obtained
+        charm.when_any([f]).then(lambda f: done.send(f.error))
+
+
+def main(args):
+    g = Group(Test)
+    n = charm.numPes()
+
+    done = Future()
+    g[n - 1].sumAll(done)
+    assert done.get() == sum(2 * pe for pe in range(n))
+
+    done = Future()
+    g[n - 1].chain(4, done)
+    assert done.get() == (4 * 2 + 1) * 10
+
+    done = Future()
+    g[n - 1].first(done)
+    assert done.get() is True
+
+    done = Future()
+    g[n - 1].failing(done)
+    try:
+        done.get()
+        assert False
+    except ValueError as e:
+        assert str(e) == 'negative'
+
+    # futures consumed by the coroutine that created them
+    f = Future()
+    f.send(3)
+    assert charm.when_all([f]).then(lambda values: values[0] + 1).get() == 4
+    assert charm.when_all([]).get() == []
+    exit()
+
+
+charm.start(main)
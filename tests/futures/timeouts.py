@@ -0,0 +1,89 @@
+from charm4py import charm, Chare, Array, Channel, Future, coro, Charm4PyTimeoutError
+
+
+class Test(Chare):
+
+    def __init__(self):
+        other = self.thisProxy[1 - self.thisIndex[0]]
+        self.ch = Channel(self, remote=other)
+
+    @coro
+    def sendLater(self, f, value, secs):
+        charm.sleep(secs)
+        f.send(value)
+
+    @coro
+    def sendOnChannel(self, value, secs):
+        charm.sleep(secs)
+        self.ch.send(value)
+
+    @coro
+    def recvTimeout(self):
+        try:
+            self.ch.recv(timeout=0.1)
+            assert False
+        except Charm4PyTimeoutError:
+            pass
+        # a message arriving after the timeout is received by the next recv
+        return self.ch.recv()
+
+
+def main(args):
+    a = Array(Test, 2)
+    charm.awaitCreation(a)
+
+    # lost producer: get times out
+    f = Future()
+    try:
+        f.get(timeout=0.1)
+        assert False
+    except Charm4PyTimeoutError:
+        pass
+
+    # late result is discarded, and doesn't corrupt other futures
+    f = Future()
+    a[0].sendLater(f, 'late', 0.5)
+    try:
+        f.get(timeout=0.1)
+        assert False
+    except Charm4PyTimeoutError:
+        pass
+    # the abandoned future is deregistered
+    assert f.fid not in charm.threadMgr.futures
+    for i in range(10):
+        g = Future()
+        a[0].sendLater(g, i, 0.1)
+        assert g.get() == i
+    try:
+        f.get()
+        assert False
+    except Charm4PyTimeoutError:
+        pass
+
+    # a result that arrives in time is returned
+    f = Future()
+    a[1].sendLater(f, 7, 0)
+    assert f.get(timeout=10) == 7
+
+    # channels
+    result = a[1].recvTimeout(ret=True)
+    charm.sleep(0.3)
+    a[0].sendOnChannel(33, 0)
+    assert result.get() == 33
+
+    # charm.wait
+    f1, f2 = Future(), Future()
+    a[0].sendLater(f1, 1, 0)
+    try:
+        charm.wait([f1, f2], timeout=0.2)
+        assert False
+    except Charm4PyTimeoutError:
+        pass
+    assert f1.ready() and f1.get() == 1
+    f2.send(2)
+    charm.wait([f2], timeout=10)
+    assert f2.get() == 2
+    exit()
+
+
+charm.start(main)
@@ -0,0 +1,62 @@
+from charm4py import charm, Chare, Array, Reducer
+import numpy as np
+import pickle
+
+
+# test migration of chares whose state has large NumPy arrays (which are
+# serialized out-of-band when possible)
+
+NUM_MIGRATIONS = 3
+
+
+def expectedState(idx):
+    grid = np.arange(1000000, dtype='float64') * (idx + 1)
+    fgrid = np.asfortranarray(np.arange(200 * 300, dtype='int32').reshape(200, 300) + idx)
+    ro = np.full(1000, idx, dtype='int16')
+    ro.flags.writeable = False
+    return grid, fgrid, ro
+
+
+class Test(Chare):
+
+    def __init__(self):
+        idx = self.thisIndex[0]
+        self.grid, fgrid, ro = expectedState(idx)
+        self.nested = {'fgrid': fgrid, 'list': [ro, b'bytes', 'str']}
+        self.view = self.grid[::2]  # non-contiguous
+        self.num_migrations = 0
+
+    def check(self):
+        grid, fgrid, ro = expectedState(self.thisIndex[0])
+        np.testing.assert_array_equal(self.grid, grid)
+        np.testing.assert_array_equal(self.nested['fgrid'], fgrid)
+        assert self.nested['fgrid'].flags.f_contiguous
+        np.testing.assert_array_equal(self.nested['list'][0], ro)
+        if charm.options.pickle_protocol in (-1, 5) and pickle.HIGHEST_PROTOCOL >= 5:
+            assert not self.nested['list'][0].flags.writeable
+        assert self.nested['list'][1:] == [b'bytes', 'str']
+        np.testing.assert_array_equal(self.view, grid[::2])
+        # the rebuilt arrays can be modified
+        self.grid += 1
+        self.grid -= 1
+
+    def start(self):
+        self.migrate((charm.myPe() + 1) % charm.numPes())
+
+    def migrated(self):
+        self.check()
+        self.num_migrations += 1
+        if self.num_migrations < NUM_MIGRATIONS:
+            self.thisProxy[self.thisIndex].start()
+        else:
+            self.contribute(1, Reducer.sum, charm.thisProxy[0].exit)
+
+
+def main(args):
+    if charm.numPes() == 1:
+        charm.abort('Run program with more than 1 PE')
+    a = Array(Test, charm.numPes() * 2)
+    a.start()
+
+
+charm.start(main)
@@ -0,0 +1,84 @@
+from charm4py import charm, Chare, Array, Reducer, Future, coro
+from charm4py.charm import Charm4PyError
+
+
+# test that chares with coroutines in progress migrate once their coroutines
+# have finished, when migration is requested with migrate() or by a (Python)
+# load balancing strategy at AtSync
+
+
+def shiftStrategy(loads, placement):
+    return {index: (pe + 1) % charm.numPes() for index, pe in placement.items()}
+
+
+class Test(Chare):
+
+    def __init__(self):
+        self.phase = 0
+
+    @coro
+    def waitRelease(self, ready, done):
+        # suspend with a migration request pending
+        self.f = Future()
+        self.contribute(None, None, ready)
+        self.origPe = charm.myPe()
+        self.done = done
+        value = self.f.get()
+        assert charm.myPe() == self.origPe  # hasn't migrated yet
+        self.value = value
+
+    def requestMigration(self):
+        self.migrate((charm.myPe() + 1) % charm.numPes())
+
+    def release(self, value):
+        self.f.send(value)
+
+    def migrated(self):
+        assert charm.myPe() != self.origPe
+        if self.phase == 0:
+            self.contribute(self.value, Reducer.sum, self.done)
+
+    @coro
+    def atSyncFromCoroutine(self, done):
+        self.phase = 1
+        self.done = done
+        self.origPe = charm.myPe()
+        charm.sleep(0.01)
+        # the chare migrates after this coroutine finishes, so the coroutine
+        # can't suspend again
+        self.AtSync()
+        try:
+            charm.sleep(0.01)
+            assert False
+        except Charm4PyError:
+            pass
+        assert charm.myPe() == self.origPe
+
+    def resumeFromSync(self):
+        assert charm.myPe() == (self.origPe + 1) % charm.numPes()
+        self.contribute(1, Reducer.sum, self.done)
+
+
+def main(args):
+    npes = charm.numPes()
+    n = npes * 2
+    a = Array(Test, n, useAtSync=True)
+    charm.awaitCreation(a)
+    ready = Future()
+    done = Future()
+    a.waitRelease(ready, done)
+    ready.get()
+    a.requestMigration(awaitable=True).get()
+    charm.sleep(0.1)
+    a.release(2)
+    assert done.get() == n * 2
+
+    done = Future()
+    a.atSyncFromCoroutine(done)
+    assert done.get() == n
+    print('drain coroutines test done')
+    exit()
+
+
+charm.setLBStrategy(shiftStrategy)
+charm.start(main)
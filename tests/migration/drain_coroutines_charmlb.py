@@ -0,0 +1,71 @@
+from charm4py import charm, Chare, Array, Reducer, Future, coro
+from charm4py.charm import Charm4PyError
+
+
+# test that chares with coroutines in progress are ready for load balancing
+# with the load balancers of Charm++ (run with +balancer) once their
+# coroutines have finished
+
+class Test(Chare):
+
+    def __init__(self):
+        self.value = None
+
+    @coro
+    def waitRelease(self, ready):
+        self.f = Future()
+        self.contribute(None, None, ready)
+        self.value = self.f.get()
+
+    def startLB(self, done):
+        self.done = done
+        self.AtSync()
+
+    def release(self, value):
+        self.f.send(value)
+
+    @coro
+    def atSyncAndWait(self, done):
+        self.done = done
+        self.value = 1
+        self.AtSync()
+        # waiting here would deadlock (the chare can't migrate until this
+        # coroutine finishes), so it raises an error instead
+        try:
+            charm.sleep(0.01)
+            assert False
+        except Charm4PyError:
+            pass
+
+    def resumeFromSync(self):
+        assert self._numthreads == 0
+        assert self.value is not None
+        self.contribute(self.value, Reducer.sum, self.done)
+        self.value = None
+
+
+def main(args):
+    n = charm.numPes() * 4
+    a = Array(Test, n, useAtSync=True)
+    charm.awaitCreation(a)
+
+    # AtSync is called while the elements have a coroutine in progress
+    ready = Future()
+    done = Future()
+    a.waitRelease(ready)
+    ready.get()
+    a.startLB(done, awaitable=True).get()
+    charm.sleep(0.1)
+    assert not done.ready()
+    a.release(2)
+    assert done.get() == n * 2
+
+    # AtSync is called from a coroutine
+    done = Future()
+    a.atSyncAndWait(done)
+    assert done.get() == n
+    print('drain coroutines (Charm++ LB) test done')
+    exit()
+
+
+charm.start(main)
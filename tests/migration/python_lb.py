@@ -0,0 +1,78 @@
+from charm4py import charm, Chare, Array, Reducer, Future
+import time
+
+
+# test load balancing with a strategy written in Python
+
+NUM_STEPS = 3
+last_placement = None  # placement computed by the strategy in the last step (PE 0)
+
+
+def greedyStrategy(loads, placement):
+    # assign the heaviest elements first to the least loaded PE
+    global last_placement
+    assert set(loads.keys()) == set(placement.keys())
+    pe_loads = [0.0] * charm.numPes()
+    new_placement = {}
+    for index in sorted(loads, key=lambda idx: (-loads[idx], idx)):
+        if index == (0,):
+            pe = placement[index]  # not migratable
+        else:
+            pe = min(range(len(pe_loads)), key=lambda p: (pe_loads[p], p))
+        pe_loads[pe] += loads[index]
+        new_placement[index] = pe
+    last_placement = new_placement
+    return new_placement
+
+
+class Test(Chare):
+
+    def __init__(self):
+        self.step = 0
+        if self.thisIndex == (0,):
+            self.setMigratable(False)
+
+    def getPe(self, f):
+        self.contribute((self.thisIndex, charm.myPe(), self.step), Reducer.gather, f)
+
+    def work(self, f):
+        self.f = f
+        # elements with larger index do more work
+        t0 = time.time()
+        while time.time() - t0 < 0.001 * (self.thisIndex[0] + 1):
+            pass
+        self.AtSync()
+
+    def resumeFromSync(self):
+        self.step += 1
+        self.contribute((self.thisIndex, charm.myPe(), self.step), Reducer.gather, self.f)
+
+
+def main(args):
+    npes = charm.numPes()
+    a = Array(Test, npes * 4, useAtSync=True)
+    charm.awaitCreation(a)
+    initial_pe = dict((index, pe) for index, pe, _ in getPlacement(a))
+    for step in range(1, NUM_STEPS + 1):
+        f = Future()
+        a.work(f)
+        result = f.get()
+        assert len(result) == npes * 4
+        for index, pe, elem_step in result:
+            assert elem_step == step
+            assert pe == last_placement[index]
+        placement = dict((index, pe) for index, pe, _ in result)
+        assert placement[(0,)] == initial_pe[(0,)]
+    print('python load balancing test done')
+    exit()
+
+
+def getPlacement(a):
+    f = Future()
+    a.getPe(f)
+    return f.get()
+
+
+# the strategy has to be set on every PE
+charm.setLBStrategy(greedyStrategy)
+charm.start(main)
@@ -0,0 +1,74 @@
+from charm4py import charm, Chare, Array, Reducer, Future
+
+
+# test migration of array elements that are part of sections. Elements
+# migrate between broadcasts and reductions to the sections (including while
+# reductions are in progress), and can migrate back to their original PE
+
+NUM_ITER = 6
+
+
+class Test(Chare):
+
+    def __init__(self):
+        self.count = 0
+
+    def setSecProxy(self, secproxy, f):
+        self.secproxy = secproxy
+        self.contribute(None, None, f, section=secproxy)
+
+    def work(self, f, migrate):
+        self.count += 1
+        # contribute first, then migrate. Other members contribute after
+        # this element has left
+        self.reduce(f, self.thisIndex[0], Reducer.sum, section=self.secproxy)
+        if migrate:
+            self.migrate((charm.myPe() + 1) % charm.numPes())
+
+    def allreduce_work(self, f):
+        self.count += 1
+        result = self.allreduce(1, Reducer.sum, section=self.secproxy).get()
+        self.contribute(result, Reducer.max, f, section=self.secproxy)
+
+    def getCount(self):
+        return (self.thisIndex[0], self.count)
+
+
+def evens(obj):
+    if obj.thisIndex[0] % 2 == 0:
+        return 0
+    return -1
+
+
+def main(args):
+    npes = charm.numPes()
+    n = npes * 4
+    a = Array(Test, n)
+    charm.awaitCreation(a)
+    sec = charm.split(a, 1, evens)[0]
+    f = Future()
+    sec.setSecProxy(sec, f)
+    f.get()
+    members = [i for i in range(n) if i % 2 == 0]
+    for i in range(NUM_ITER):
+        f = Future()
+        sec.work(f, True)
+        assert f.get() == sum(members)
+        charm.waitQD()
+        # elements are now on a different PE than the one where they joined
+        # the section (on iteration npes-1 they are back on their original PE)
+        f = Future()
+        sec.allreduce_work(f)
+        assert f.get() == len(members)
+        sec.work(awaitable=True, f=Future(), migrate=False).get()
+    counts = dict(a.getCount(ret=True).get())
+    for i in range(n):
+        if i % 2 == 0:
+            assert counts[i] == NUM_ITER * 3
+        else:
+            assert counts[i] == 0
+    print('section migration test done')
+    exit()
+
+
+charm.start(main)
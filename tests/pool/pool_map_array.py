@@ -0,0 +1,61 @@
+from charm4py import charm, coro
+import numpy as np
+
+
+def double(block):
+    return block * 2
+
+
+@coro
+def double_coro(block):
+    charm.sleep(0.001)
+    return block * 2
+
+
+def row_sums(block):
+    return block.sum(axis=1)
+
+
+def bad_shape(block):
+    return block[:1]
+
+
+def main(args):
+
+    assert charm.numPes() >= 2, "Run this test with at least 2 PEs"
+
+    a = np.arange(1000 * 30, dtype='float64').reshape(1000, 30)
+    for func in (double, double_coro):
+        for blocksize in (None, 1, 7, 64, 1000, 5000):
+            result = charm.pool.map_array(func, a, blocksize=blocksize)
+            assert result.shape == a.shape
+            assert np.array_equal(result, a * 2)
+
+    # non-contiguous blocks
+    result = charm.pool.map_array(double, a, axis=1, blocksize=4)
+    assert np.array_equal(result, a * 2)
+    result = charm.pool.map_array(double, a.T, axis=-1, blocksize=100, ncores=1)
+    assert np.array_equal(result, a.T * 2)
+
+    # results with a different shape than the input blocks
+    out = np.zeros(1000, dtype='float64')
+    result = charm.pool.map_array(row_sums, a, blocksize=32, out=out)
+    assert result is out
+    assert np.array_equal(out, a.sum(axis=1))
+    # the results are written directly into out, which can be a view
+    out = np.zeros(2000, dtype='float64')[::2]
+    assert charm.pool.map_array(row_sums, a, blocksize=100, out=out) is out
+    assert np.array_equal(out, a.sum(axis=1))
+
+    b = np.arange(100, dtype='int32')
+    assert np.array_equal(charm.pool.map_array(double, b, blocksize=9), b * 2)
+
+    try:
+        charm.pool.map_array(bad_shape, a, blocksize=10)
+        assert False
+    except Exception:
+        pass
+    exit()
+
+
+charm.start(main)
@@ -0,0 +1,51 @@
+from charm4py import charm
+
+
+charm.options.pool.memo_cache_size = 500
+
+
+def square(x):
+    return x ** 2
+
+
+def add_val(x):
+    return x + 5
+
+
+def main(args):
+
+    assert charm.numPes() >= 2, "Run this test with at least 2 PEs"
+
+    tasks = list(range(200))
+    for chunksize in (1, 8):
+        charm.pool.clear_memo_cache()
+        stats0 = charm.pool.memo_stats()
+        assert stats0['size'] == 0
+        assert charm.pool.map(square, tasks, chunksize=chunksize, memoize=True) == [square(x) for x in tasks]
+        stats = charm.pool.memo_stats()
+        assert stats['misses'] - stats0['misses'] == len(tasks)
+        assert stats['size'] == len(tasks)
+        # second time all tasks should be found in the cache
+        assert charm.pool.map(square, tasks, chunksize=chunksize, memoize=True) == [square(x) for x in tasks]
+        stats = charm.pool.memo_stats()
+        assert stats['hits'] - stats0['hits'] == len(tasks)
+        # partial hits, and same args with different function
+        tasks2 = list(range(100, 300))
+        assert charm.pool.map(square, tasks2, chunksize=chunksize, memoize=True) == [square(x) for x in tasks2]
+        assert charm.pool.map(add_val, tasks2, chunksize=chunksize, memoize=True) == [add_val(x) for x in tasks2]
+        stats = charm.pool.memo_stats()
+        assert stats['hits'] - stats0['hits'] == len(tasks) + 100
+        assert stats['size'] == 500  # cache is full
+
+    # submit and single tasks
+    tasks = [(square, 3), (add_val, 3)]
+    assert charm.pool.submit(tasks, memoize=True) == [9, 8]
+    assert charm.pool.submit(tasks, memoize=True) == [9, 8]
+    assert charm.pool.Task(square, [7], ret=True, memoize=True).get() == 49
+    hits = charm.pool.memo_stats()['hits']
+    assert charm.pool.Task(square, [7], ret=True, memoize=True).get() == 49
+    assert charm.pool.memo_stats()['hits'] == hits + 1
+    exit()
+
+
+charm.start(main)
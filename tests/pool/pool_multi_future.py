@@ -0,0 +1,55 @@
+from charm4py import charm, Chare, Group, coro
+
+
+def square(x):
+    return x ** 2
+
+
+def check_negative(x):
+    if x < 0:
+        raise ValueError('negative value')
+    return x
+
+
+class Submitter(Chare):
+
+    @coro
+    def run(self, num_tasks):
+        # the futures of these tasks are created on this PE, so the workers
+        # send their results here in one message per chunk
+        tasks = list(range(charm.myPe() * 1000, charm.myPe() * 1000 + num_tasks))
+        for chunksize in (1, 7, 32):
+            futures = charm.pool.map_async(square, tasks, chunksize=chunksize, multi_future=True)
+            assert len(futures) == num_tasks
+            for f, x in zip(futures, tasks):
+                assert f.get() == square(x)
+
+
+def main(args):
+
+    assert charm.numPes() >= 3, "Run this test with at least 3 PEs"
+    num_tasks = (charm.numPes() - 1) * 50
+
+    # submit jobs concurrently from every PE
+    submitters = Group(Submitter)
+    done = submitters.run(num_tasks, awaitable=True)
+
+    tasks = list(range(num_tasks))
+    futures = charm.pool.map_async(square, tasks, chunksize=16, multi_future=True)
+    assert [f.get() for f in futures] == [square(x) for x in tasks]
+
+    # every future of a chunk that fails receives the exception
+    tasks = [1] * 10 + [-1] + [1] * 9
+    futures = charm.pool.map_async(check_negative, tasks, chunksize=len(tasks), multi_future=True)
+    for f in futures:
+        try:
+            f.get()
+            assert False
+        except ValueError:
+            pass
+
+    done.get()
+    exit()
+
+
+charm.start(main)
@@ -0,0 +1,42 @@
+from charm4py import charm
+import time
+
+
+def square(x):
+    return x ** 2
+
+
+def slow_square(x):
+    time.sleep(0.002)
+    return x ** 2
+
+
+def main(args):
+
+    assert charm.numPes() >= 4, "Run this test with at least 4 PEs"
+
+    # a large low-priority job should not starve jobs submitted after it
+    tasks1 = list(range(2000))
+    tasks2 = list(range(20))
+    results1 = charm.pool.map_async(slow_square, tasks1, priority=1)
+    results2 = charm.pool.map_async(square, tasks2, priority=8)
+    f = charm.pool.Task(square, [5], ret=True, priority=4)
+    # charm.iwait yields the futures in the order in which they complete
+    completed = list(charm.iwait([results2, f, results1]))
+    assert completed[-1] is results1
+    assert f.get() == 25
+    assert results2.get() == [square(x) for x in tasks2]
+    assert results1.get() == [square(x) for x in tasks1]
+
+    # concurrent jobs with different priorities, chunksizes and ncores
+    futures = []
+    for i, chunksize in enumerate((1, 4, 8)):
+        tasks = list(range(i * 100, (i + 1) * 300))
+        futures.append((charm.pool.map_async(square, tasks, chunksize=chunksize,
+                                             ncores=i + 1, priority=i + 1), tasks))
+    for f, tasks in futures:
+        assert f.get() == [square(x) for x in tasks]
+    exit()
+
+
+charm.start(main)
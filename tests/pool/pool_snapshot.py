@@ -0,0 +1,56 @@
+from charm4py import charm
+import numpy as np
+
+
+def array_sum(a):
+    return a.sum()
+
+
+def scale(a, factor):
+    return a * factor
+
+
+def writable(a):
+    return a.flags.writeable
+
+
+def main(args):
+
+    assert charm.numPes() >= 2, "Run this test with at least 2 PEs"
+    assert charm.myPe() == 0
+
+    for mode in ('pickle', 'deepcopy', 'freeze', 'none'):
+        charm.options.pool.snapshot = mode
+        arrays = [np.arange(1000, dtype='float64') * i for i in range(20)]
+        expected = [a.sum() for a in arrays]
+        a = np.ones(100)
+        result = charm.pool.map_async(array_sum, arrays, chunksize=4)
+        f = charm.pool.Task(scale, [a, 2], ret=True)
+        if mode in ('pickle', 'deepcopy'):
+            # modifying inputs after submitting must not affect the tasks
+            for arr in arrays:
+                arr[:] = -1
+            a[:] = -1
+        elif mode == 'freeze':
+            for arr in arrays + [a]:
+                assert not arr.flags.writeable
+                try:
+                    arr[0] = -1
+                    assert False
+                except ValueError:
+                    pass
+        assert result.get() == expected
+        assert np.array_equal(f.get(), np.ones(100) * 2)
+        if mode == 'freeze':
+            # arrays are writable again when the jobs complete, and workers
+            # always receive writable arrays
+            for arr in arrays + [a]:
+                assert arr.flags.writeable
+            b = np.ones(10)
+            assert charm.pool.map_async(writable, [b, b]).get() == [True, True]
+            assert charm.pool.Task(writable, [b], ret=True).get()
+            assert b.flags.writeable
+    exit()
+
+
+charm.start(main)
@@ -0,0 +1,49 @@
+from charm4py import charm, coro
+
+
+charm.options.profiling = True
+
+
+def square(x):
+    return x ** 2
+
+
+@coro
+def square_coro(x):
+    charm.sleep(0.001)
+    return x ** 2
+
+
+def main(args):
+
+    assert charm.numPes() >= 2, "Run this test with at least 2 PEs"
+
+    tasks = list(range(100))
+    assert charm.pool.map(square, tasks) == [square(x) for x in tasks]
+    assert charm.pool.map(square_coro, tasks, chunksize=10) == [square(x) for x in tasks]
+    futures = charm.pool.map_async(square, tasks, chunksize=5, multi_future=True)
+    assert [f.get() for f in futures] == [square(x) for x in tasks]
+    # with multi_future the results reach the futures before the workers
+    # report to the scheduler, so wait until the last job is recorded
+    stats = charm.pool.stats()
+    while len(stats.jobs) < 3:
+        charm.sleep(0.01)
+        stats = charm.pool.stats()
+    assert len(stats.jobs) == 3
+    for job, num_tasks in zip(stats.jobs, (100, 10, 20)):
+        assert job.num_tasks == num_tasks
+        assert not job.failed
+        assert job.elapsed > 0 and job.exec_time > 0 and job.result_bytes > 0
+        assert job.max_queue_time <= job.elapsed
+        assert job.mean_exec_time() <= job.max_exec_time
+    assert stats.jobs[0].func == 'square'
+    assert stats.jobs[1].exec_time >= 0.1
+    assert sorted(stats.workers.keys()) == list(range(1, charm.numPes()))
+    assert sum(w.num_tasks for w in stats.workers.values()) == 130
+    for w in stats.workers.values():
+        assert w.idle_time >= 0.0
+    charm.printStats()
+    exit()
+
+
+charm.start(main)
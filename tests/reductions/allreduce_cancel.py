@@ -0,0 +1,57 @@
+from charm4py import charm, Chare, Array, coro, Reducer
+
+
+class Test(Chare):
+
+    @coro
+    def work(self, numchares, secproxy):
+        # speculative allreduce that element 1 abandons. Element 0 joins it
+        # late (normally after receiving the cancellation), and like the other
+        # participants gets None
+        if self.thisIndex[0] == 0:
+            charm.sleep(0.5)
+        f = self.allreduce(1, Reducer.sum, section=secproxy)
+        if self.thisIndex[0] == 1:
+            charm.sleep(0.1)
+            f.cancel()
+        assert f.get() is None
+        # subsequent allreduces are not affected
+        for i in range(10):
+            result = self.allreduce(i, Reducer.sum, section=secproxy).get()
+            assert result == i * numchares
+
+    @coro
+    def workNoSection(self, numchares):
+        # same for a reduction over the whole array. Element 0 still
+        # contributes when it joins late, but gets None
+        if self.thisIndex[0] == 0:
+            charm.sleep(0.5)
+        f = self.allreduce(1, Reducer.sum)
+        if self.thisIndex[0] == 1:
+            charm.sleep(0.1)
+            f.cancel()
+        assert f.get() is None
+        for i in range(10):
+            result = self.allreduce(i, Reducer.sum).get()
+            assert result == i * numchares
+
+    def verify(self):
+        assert len(charm.threadMgr.coll_futures) == 0
+        assert len(charm.threadMgr.cancelled_coll_futures) == 0
+        assert not hasattr(self, '_scancelled')
+        assert self._numthreads == 0
+
+
+def main(args):
+    numchares = charm.numPes() * 4
+    a = Array(Test, numchares)
+    a.workNoSection(numchares, awaitable=True).get()
+    for size in (numchares, numchares // 2):
+        asec = a[0:size]  # section that contains elements 0 and 1
+        asec.work(size, asec, awaitable=True).get()
+    charm.sleep(0.1)
+    a.verify(awaitable=True).get()
+    exit()
+
+
+charm.start(main)
@@ -0,0 +1,69 @@
+from charm4py import charm, Chare, Array, Reducer, Future
+import numpy as np
+
+
+# broadcast large NumPy arrays to sections (including deep spanning trees), and
+# check that read-only arrays are received read-only and shared by the members
+# on each PE. Outside of sections, arrays are always received writable
+
+received = {}  # iteration -> array received by the members on this PE
+
+
+class Test(Chare):
+
+    def recv(self, it, a, b, readonly, secproxy, f):
+        assert a.flags.writeable != readonly
+        assert b.flags.writeable
+        if readonly:
+            prev = received.get(it)
+            if prev is not None:
+                assert prev is a
+            received[it] = a
+        self.reduce(f, float(a.sum() + b.sum()), Reducer.max, section=secproxy)
+
+    def recvDirect(self, a, f):
+        # msgs from PE 0 to the elements on PE 0 are delivered without copying
+        assert charm.myPe() == 0 or a.flags.writeable
+        self.contribute(float(a.sum()), Reducer.max, f)
+
+
+def allElems(obj):
+    return 0
+
+
+def notOnPe0(obj):
+    if charm.myPe() > 0:
+        return 0
+    return -1
+
+
+def main(args):
+    npes = charm.numPes()
+    arr = Array(Test, npes * 8)
+    charm.awaitCreation(arr)
+    # section rooted at PE 0 and section that doesn't include PE 0
+    secs = [charm.split(arr, 1, allElems, bfactor=2)[0],
+            charm.split(arr, 1, notOnPe0, bfactor=1)[0]]
+    it = 0
+    for sec in secs:
+        for size in (10, 1000000):
+            for readonly in (False, True):
+                a = np.arange(size, dtype='float64')
+                b = np.ones(size // 2)
+                if readonly:
+                    a.flags.writeable = False
+                for _ in range(3):
+                    f = Future()
+                    sec.recv(it, a, b, readonly, sec, f)
+                    assert f.get() == a.sum() + b.sum()
+                    it += 1
+    a = np.arange(1000, dtype='float64')
+    a.flags.writeable = False
+    f = Future()
+    arr.recvDirect(a, f)
+    assert f.get() == a.sum()
+    print('section large args test done')
+    exit()
+
+
+charm.start(main)
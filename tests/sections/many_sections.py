@@ -0,0 +1,63 @@
+from charm4py import charm, Chare, Group, Array, Reducer, Future
+
+
+# split a 2D array into row and column sections (like the row and column
+# communicators of 2D decompositions)
+
+class Test(Chare):
+
+    def __init__(self, n):
+        self.n = n
+        self.total = 0
+
+    def recv(self, value, f):
+        self.total += value
+        self.reduce(f, 1, Reducer.sum, section=self.secproxy)
+
+    def setSecProxy(self, secproxy, f):
+        self.secproxy = secproxy
+        self.contribute(None, None, f, section=secproxy)
+
+    def getTotal(self):
+        return self.total
+
+
+def rowcol(obj):
+    i, j = obj.thisIndex
+    return [i, obj.n + j]
+
+
+def main(args):
+    n = charm.numPes() * 4
+    a = Array(Test, (n, n), args=[n])
+    charm.awaitCreation(a)
+    secs = charm.split(a, 2 * n, rowcol)
+    assert len(secs) == 2 * n
+
+    for i, sec in enumerate(secs):
+        f = Future()
+        sec.setSecProxy(sec, f)
+        f.get()
+        f = Future()
+        sec.recv(i, f)
+        assert f.get() == n
+    totals = a.getTotal(ret=True).get()
+    assert sorted(totals) == sorted([i + n + j for i in range(n) for j in range(n)])
+
+    # group split using elems
+    g = Group(Test, args=[n])
+    npes = charm.numPes()
+    secs = charm.split(g, npes, elems=[[pe] for pe in range(npes)])
+    for pe, sec in enumerate(secs):
+        f = Future()
+        sec.setSecProxy(sec, f)
+        f.get()
+        f = Future()
+        sec.recv(pe, f)
+        assert f.get() == 1
+    assert sorted(g.getTotal(ret=True).get()) == list(range(npes))
+    print('many sections test done')
+    exit()
+
+
+charm.start(main)
@@ -0,0 +1,82 @@
+from charm4py import charm, Chare, Group, Array, coro
+
+
+class Test(Chare):
+
+    def __init__(self):
+        self.count = 0
+
+    def work(self):
+        self.count += 1
+
+    def getCount(self):
+        return self.count
+
+
+class Slicer(Chare):
+
+    @coro
+    def cache(self, proxy):
+        self.s = proxy[0:4]
+
+    @coro
+    def isCached(self, proxy):
+        return proxy[0:4] is self.s
+
+
+def main(args):
+    numPes = charm.numPes()
+    a = Array(Test, numPes * 4)
+    g = Group(Test)
+    charm.awaitCreation(a, g)
+
+    # repeated slicing reuses the same section
+    for _ in range(10):
+        a[0:numPes * 2].work(awaitable=True).get()
+        g[0:numPes:2].work(awaitable=True).get()
+    assert a[0:numPes * 2] is a[0:numPes * 2]
+    assert g[::2] is g[0:numPes:2]
+    assert a[0:numPes * 2] is not a[0:numPes * 2:2]
+    counts = a.getCount(ret=True).get()
+    assert counts == [10] * (numPes * 2) + [0] * (numPes * 2), counts
+    counts = g.getCount(ret=True).get()
+    assert counts == [10 if pe % 2 == 0 else 0 for pe in range(numPes)], counts
+
+    # LRU bound
+    s = a[0:1]
+    for i in range(2, 6):
+        a[0:i]
+    assert a[0:1] is not s
+    assert len(charm.section_cache.proxies) == 4
+
+    # invalidation
+    s = a[0:2]
+    charm.invalidateSections(a)
+    assert a[0:2] is not s
+    s = g[0:1]
+    charm.invalidateSections()
+    assert len(charm.section_cache.proxies) == 0
+    assert g[0:1] is not s
+    s.work(awaitable=True).get()  # old section proxies still work
+
+    # slices cached before inserting elements in an array are not used after
+    if numPes > 1:
+        d = Array(Test, ndims=1)
+        for i in range(4):
+            d.ckInsert(i)
+        slicers = Group(Slicer)
+        charm.awaitCreation(slicers)
+        slicers[1].cache(d, awaitable=True).get()
+        assert slicers[1].isCached(d, ret=True).get()
+        d.ckInsert(4)
+        d.ckDoneInserting()
+        # the proxy sent to PE 1 carries the membership epoch of the array
+        # after the insertion, so the slice cached there before it is not used
+        assert d.epoch is not None
+        assert not slicers[1].isCached(d, ret=True).get()
+    print('slice cache test done')
+    exit()
+
+
+charm.options.section_cache_size = 4
+charm.start(main)
@@ -0,0 +1,79 @@
+from charm4py import charm, Chare, Group, Array, Reducer, Future
+
+
+# create sections with spanning trees of different branching factors, and
+# node-aware trees, and check that broadcasts and reductions work
+
+class Test(Chare):
+
+    def __init__(self):
+        self.count = 0
+
+    def setSecProxy(self, secproxy, f):
+        self.secproxy = secproxy
+        self.contribute(None, None, f, section=secproxy)
+
+    def recv(self, f):
+        self.count += 1
+        self.reduce(f, charm.myPe(), Reducer.gather, section=self.secproxy)
+
+    def getCount(self):
+        return self.count
+
+
+def check(secproxy, pes):
+    f = Future()
+    secproxy.setSecProxy(secproxy, f)
+    f.get()
+    f = Future()
+    secproxy.recv(f)
+    assert sorted(f.get()) == sorted(pes)
+
+
+def main(args):
+    npes = charm.numPes()
+    g = Group(Test)
+    num_bcasts = 0
+    for bfactor in (1, 2, 4, 49):
+        for node_aware in (False, True):
+            pes = list(range(0, npes, 2))
+            sec = charm.split(g, 1, elems=[pes], bfactor=bfactor, node_aware=node_aware)[0]
+            check(sec, pes)
+            pes = list(range(1, npes))
+            secs = charm.split(g, 2, elems=[pes, pes[::-1]], bfactor=bfactor, node_aware=node_aware)
+            for sec in secs:
+                check(sec, pes)
+            num_bcasts += 1
+    counts = g.getCount(ret=True).get()
+    for pe in range(npes):
+        expected = 0
+        if pe % 2 == 0:
+            expected += num_bcasts
+        if pe > 0:
+            expected += 2 * num_bcasts
+        assert counts[pe] == expected
+
+    try:
+        charm.split(g, 1, elems=[[0]], bfactor=0)
+        assert False
+    except Exception:
+        pass
+
+    # default tree options are used by slicing and combine
+    charm.options.section_bfactor = 2
+    charm.options.section_node_aware = True
+    check(g[1:], list(range(1, npes)))
+    a = Array(Test, npes * 3)
+    charm.awaitCreation(a)
+    combined = charm.combine(g, a, bfactor=3)
+    f = Future()
+    combined.setSecProxy(combined, f)
+    f.get()
+    f = Future()
+    combined.recv(f)
+    assert len(f.get()) == npes * 4
+    print('section tree options test done')
+    exit()
+
+
+charm.start(main)
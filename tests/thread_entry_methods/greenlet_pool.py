@@ -0,0 +1,85 @@
+from charm4py import charm, Chare, Group, coro, Future
+from greenlet import getcurrent
+
+
+charm.options.greenlet_pool_size = 4
+
+
+class Test(Chare):
+
+    def __init__(self):
+        self.greenlets = set()
+        self.pending = []
+
+    @coro
+    def work(self, x):
+        self.greenlets.add(id(getcurrent()))
+        mype = charm.myPe()
+        assert charm.thisProxy[mype].myPe(ret=True).get() == mype
+        return x * 2
+
+    @coro
+    def wait(self):
+        f = Future()
+        self.pending.append(f)
+        return f.get()
+
+    @coro
+    def abandonWait(self):
+        f1 = Future()
+        self.stale = Future()
+        f1.send(1)
+        # stop waiting for self.stale, which stays registered with this greenlet
+        for f in charm.iwait([f1, self.stale]):
+            break
+        return f.get()
+
+    @coro
+    def reuse(self):
+        self.greenlets.add(id(getcurrent()))
+        # the stale wait must not resume the greenlet while it waits for myPe
+        self.stale.send('stale')
+        mype = charm.myPe()
+        assert charm.thisProxy[mype].myPe(ret=True).get() == mype
+        return mype
+
+    def release(self):
+        for i, f in enumerate(self.pending):
+            f.send(i)
+        self.pending = []
+
+    def check(self, max_greenlets):
+        assert self._numthreads == 0
+        assert len(self.greenlets) <= max_greenlets, len(self.greenlets)
+        assert len(charm.threadMgr.gr_pool) <= charm.options.greenlet_pool_size
+
+
+def main(args):
+    g = Group(Test)
+    charm.awaitCreation(g)
+    # sequential invocations should reuse the same greenlet
+    for i in range(100):
+        assert g[1 % charm.numPes()].work(i, ret=True).get() == i * 2
+    g[1 % charm.numPes()].check(1, awaitable=True).get()
+
+    # more concurrent coroutines than the size of the pool
+    futures = [g.wait(ret=True) for _ in range(10)]
+    charm.sleep(0.1)
+    g.release(awaitable=True).get()
+    results = sorted(sum([f.get() for f in futures], []))
+    assert results == sorted(list(range(10)) * charm.numPes())
+    g.check(1, awaitable=True).get()
+    futures = [g.work(i, ret=True) for i in range(10)]
+    for i, f in enumerate(futures):
+        assert f.get() == [i * 2] * charm.numPes()
+    g.check(10, awaitable=True).get()
+
+    # waits abandoned by a coroutine don't affect the next coroutine that
+    # runs on the same greenlet
+    for _ in range(3):
+        assert g.abandonWait(ret=True).get() == [1] * charm.numPes()
+        assert sorted(g.reuse(ret=True).get()) == list(range(charm.numPes()))
+    exit()
+
+
+charm.start(main)
@@ -25,6 +25,7 @@ def main(args):
     assert isinstance(cond, wait.MsgTagCond)
     assert cond.attrib_name == 'iterations'
     assert cond.arg_idx == 0
+    assert cond.deps == ('iterations',)
 
     when_cond = 'self.x == x'
     method    = '(self, iter, x, y)'
@@ -43,7 +44,33 @@ def main(args):
     when_cond = 'self.x == x + y'
     method    = '(self, iter, x, y)'
     cond = wait.parse_cond_str(when_cond, __name__, parseMethodArgs(method))
+    assert isinstance(cond, wait.MsgEqCond)
+    assert cond.key_func([1, 2, 3]) == 5
+    assert cond.deps == ('x',)
+
+    when_cond = 'x * 2 == self.x + self.y'
+    method    = '(self, iter, x, y)'
+    cond = wait.parse_cond_str(when_cond, __name__, parseMethodArgs(method))
+    assert isinstance(cond, wait.MsgEqCond)
+    assert cond.deps == ('x', 'y')
+
+    when_cond = 'self.x == x + self.y'
+    method    = '(self, iter, x, y)'
+    cond = wait.parse_cond_str(when_cond, __name__, parseMethodArgs(method))
+    assert isinstance(cond, wait.ChareStateMsgCond)
+    assert cond.deps == ('x', 'y')
+
+    when_cond = 'self.x > x and self.ready'
+    method    = '(self, iter, x, y)'
+    cond = wait.parse_cond_str(when_cond, __name__, parseMethodArgs(method))
+    assert isinstance(cond, wait.ChareStateMsgCond)
+    assert cond.deps == ('ready', 'x')
+
+    when_cond = 'self.x > x and self.isReady()'
+    method    = '(self, iter, x, y)'
+    cond = wait.parse_cond_str(when_cond, __name__, parseMethodArgs(method))
     assert isinstance(cond, wait.ChareStateMsgCond)
+    assert cond.deps is None
 
     when_cond = 'x < y'
     method    = '(self, iter, x, y)'
@@ -74,6 +101,13 @@ def main(args):
     method    = '(self, iter, x, y)'
     cond = wait.parse_cond_str(when_cond, __name__, parseMethodArgs(method))
     assert isinstance(cond, wait.ChareStateCond)
+    assert cond.deps is None  # depends on global 'error'
+
+    when_cond = 'self.x > len(self.y)'
+    method    = '(self, iter, x, y)'
+    cond = wait.parse_cond_str(when_cond, __name__, parseMethodArgs(method))
+    assert isinstance(cond, wait.ChareStateCond)
+    assert cond.deps == ('x', 'y')
 
     exit()
 
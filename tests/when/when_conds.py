@@ -0,0 +1,73 @@
+from charm4py import charm, Chare, Group, when
+import random
+
+
+NUM_MSGS = 200
+
+
+class Test(Chare):
+
+    def __init__(self):
+        self.iteration = 0
+        self.base = 0
+        self.total = 0
+        self.stage = -1
+        self.received = []
+
+    # indexed by the value of 'it - 1'
+    @when('self.iteration == it - 1')
+    def recvOrdered(self, it, done):
+        assert self.iteration == it - 1
+        self.iteration = it
+        if it == NUM_MSGS:
+            done()
+
+    # evaluated only when self.base or self.total change
+    @when('self.base >= lo + self.total')
+    def recvRange(self, lo, done):
+        assert self.base >= lo + self.total
+        self.total += 1
+        if self.total == NUM_MSGS:
+            done()
+
+    def setBase(self, base):
+        self.base = base
+
+    # msgs with the same key are delivered in order of arrival
+    @when('self.stage == stage - 1')
+    def recvStage(self, stage, seq, done):
+        self.received.append(seq)
+        if len(self.received) == 3:
+            done(self.received)
+
+    def setStage(self, stage):
+        self.stage = stage
+
+
+def main(args):
+    g = Group(Test)
+    its = list(range(1, NUM_MSGS + 1))
+    random.shuffle(its)
+    f = charm.createFuture()
+    for it in its:
+        g[0].recvOrdered(it, f)
+    f.get()
+
+    f = charm.createFuture()
+    for lo in range(NUM_MSGS):
+        g[0].recvRange(-lo, f)
+    for base in range(NUM_MSGS):
+        g[0].setBase(base)
+    f.get()
+
+    # g[0] is on this PE, so the msgs arrive in the order in which they are sent
+    f = charm.createFuture()
+    for seq in range(3):
+        g[0].recvStage(1, seq, f)
+    g[0].setStage(0)
+    assert f.get() == [0, 1, 2]
+    print('when conditions test done')
+    exit()
+
+
+charm.start(main)
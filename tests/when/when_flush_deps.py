@@ -0,0 +1,96 @@
+from charm4py import charm, Chare
+from charm4py import wait
+
+
+# This program tests that flushing the wait queues of a chare only checks the
+# conditions that read attributes that changed, and the new elements of the
+# other conditions
+
+# NOTE: this is not a parallel program
+
+class EntryMethod(object):
+
+    def __init__(self):
+        self.delivered = []
+
+    def run(self, obj, header, args):
+        self.delivered.append(args[0])
+
+
+def countingCond(cond_str, counter):
+    cond = wait.parse_cond_str(cond_str, __name__, {'x': 0})
+    assert isinstance(cond, wait.ChareStateMsgCond)
+    cond_func = cond.cond_func
+
+    def func(obj, args):
+        counter[0] += 1
+        return cond_func(obj, args)
+
+    cond.cond_func = func
+    return cond
+
+
+def main(args):
+    obj = Chare()
+    obj.a = 0
+    obj.b = 0
+    na, nb = [0], [0]
+    cond_a = countingCond('self.a >= x', na)
+    cond_b = countingCond('self.b >= x', nb)
+    em_a, em_b = EntryMethod(), EntryMethod()
+    obj.__waitEnqueue__(cond_a, (0, em_a, {}, [5]))
+    obj.__waitEnqueue__(cond_b, (0, em_b, {}, [5]))
+    assert sorted(obj._cond_watch) == ['a', 'b']
+
+    # new msgs are checked once
+    obj.__flush_wait_queues__()
+    assert na[0] == 1 and nb[0] == 1
+    obj.__flush_wait_queues__()
+    assert na[0] == 1 and nb[0] == 1
+
+    # only the condition that reads 'a' is checked
+    obj.a = 3
+    obj.__flush_wait_queues__()
+    assert na[0] == 2 and nb[0] == 1
+
+    # 'b' has the same value as in the last check
+    obj.b = 1
+    obj.b = 0
+    obj.__flush_wait_queues__()
+    assert na[0] == 2 and nb[0] == 1
+
+    obj.a = 5
+    obj.__flush_wait_queues__()
+    assert na[0] == 3 and nb[0] == 1
+    assert em_a.delivered == [5]
+    assert sorted(obj._cond_watch) == ['b'] and len(obj._conds) == 1
+
+    # a new msg is checked without checking the old ones again
+    obj.__waitEnqueue__(cond_b, (0, em_b, {}, [7]))
+    obj.__flush_wait_queues__()
+    assert nb[0] == 2
+
+    # msgs are delivered in order of arrival
+    obj.b = 10
+    obj.__flush_wait_queues__()
+    assert em_b.delivered == [5, 7]
+    assert len(obj._conds) == 0 and len(obj._cond_watch) == 0 and len(obj._cond_new) == 0
+
+    # conditions that read mutable attributes are checked in every flush
+    obj.c = []
+    nc = [0]
+    cond_c = countingCond('len(self.c) >= x', nc)
+    em_c = EntryMethod()
+    obj.__waitEnqueue__(cond_c, (0, em_c, {}, [1]))
+    obj.__flush_wait_queues__()
+    obj.__flush_wait_queues__()
+    assert nc[0] == 2
+    obj.c.append(1)
+    obj.__flush_wait_queues__()
+    assert em_c.delivered == [1]
+    assert len(obj._conds) == 0
+
+    exit()
+
+
+charm.start(main)